@@ -138,16 +138,16 @@ class ChatRTX:
             self._logger.error(f"Failed to init clip model object: Error {str(e)}")
             return False
 
-    def generate_clip_engine(self, image_data_dir , force_rewrite = True):
+    def generate_clip_engine(self, image_data_dir , force_rewrite = False):
         if self.clip_inference is not None:
-            return self.clip_inference.generate_clip_engine(image_data_dir , force_rewrite = True)
+            return self.clip_inference.generate_clip_engine(image_data_dir , force_rewrite = force_rewrite)
         else:
             self._logger.error("No clip inferance object")
             return False
 
-    def generate_clip_response(self, input_text, top_matches_path, min_clip_score):
+    def generate_clip_response(self, input_text, top_matches_path, min_clip_score, **kwargs):
         if self.clip_inference is not None:
-            return self.clip_inference.generate_clip_response(input_text, top_matches_path, min_clip_score)
+            return self.clip_inference.generate_clip_response(input_text, top_matches_path, min_clip_score, **kwargs)
         else:
             self._logger.error("No clip inferance object")
             return False
@@ -20,15 +20,23 @@
 # DEALINGS IN THE SOFTWARE.
 
 from ChatRTX.rags.llama_index.trtllm_api import TrtLlmAPI
+from ChatRTX.rags.llama_index.hybrid_retriever import HybridRetriever
+from ChatRTX.rags.llama_index.rerank_retriever import CrossEncoderScorer, CrossEncoderRerankRetriever, collect_stage_timings
+from ChatRTX.rags.llama_index.fanout_retriever import FanOutRetriever
+from ChatRTX.rags.bm25_index import BM25Index
+from ChatRTX.rags.dedup import ChunkDeduplicator, source_files, set_source_files
+from ChatRTX.rags.index_registry import IndexRegistry
 from ChatRTX.inference.trtllm.utils import (read_model_name)
 from llama_index.core import SimpleDirectoryReader, VectorStoreIndex, Settings, StorageContext, load_index_from_storage
 from llama_index.embeddings.huggingface import HuggingFaceEmbedding
 from llama_index.vector_stores.faiss import FaissVectorStore
 from llama_index.core.node_parser import SentenceSplitter
+from llama_index.core.query_engine import RetrieverQueryEngine
 from ChatRTX.llm_prompt_templates import LLMPromptTemplate
 import faiss
 import os, json
 import gc, torch
+import time
 from ChatRTX.logger import ChatRTXLogger
 import shutil
 import logging
@@ -42,6 +50,11 @@ class ChatRTXRag:
     TOKENIZER_DIR = "tokenizer_local_dir"
     VOCAB_DIR = "vocab_local_dir"
     VOCAB_FILE_KEY = "vocab_file"
+    DOCUMENT_EXTENSIONS = [".pdf", ".doc", ".docx", ".txt", ".xml"]
+    # Event types of the structured stream returned by generate_stream_response
+    STREAM_SOURCES = "sources"
+    STREAM_TOKEN = "token"
+    STREAM_USAGE = "usage"
 
     def __init__(self, models_info_map, model_download_dir):
         """
@@ -54,11 +67,16 @@ class ChatRTXRag:
         self._llm = None
         self._embedding_model = None
         self._embedding_dim = None
+        self._rerank_scorer = None
         ChatRTXLogger(log_level=logging.INFO, log_file='chatRTX.log')
         self._logger = ChatRTXLogger.get_logger()
         self._logger.info("ChatRTX RAG mode initialized with model directory: %s", self._model_directory)
         app_config = os.path.join(os.path.dirname(os.path.abspath(__file__)), "./config/app_config.json")
         self._app_config_info = self._load_config(app_config)
+        memory_budget_mb = self._app_config_info.get("index_registry_memory_budget_mb", None)
+        self._index_registry = IndexRegistry(
+            max_indexes=self._app_config_info.get("index_registry_max_indexes", None),
+            memory_budget_bytes=memory_budget_mb * 1024 * 1024 if memory_budget_mb is not None else None)
 
     def init_llamaIndex_llm(self, model_id, backend="TRTLLM", **kwargs):
         """
@@ -137,6 +155,20 @@ class ChatRTXRag:
         except Exception as e:
             self._logger.error("Failed to set embedding model: Error %s", str(e), exc_info=True)
 
+    def set_rerank_model(self, model_name, batch_size=16):
+        """
+        Set the cross-encoder model used by the optional rerank stage.
+
+        :param model_name: The name or local path of the cross-encoder model.
+        :param batch_size: The number of (query, chunk) pairs scored per batch.
+        """
+        self._logger.debug("Setting rerank model with name: %s", model_name)
+        try:
+            self._rerank_scorer = CrossEncoderScorer(model_name, device="cpu", batch_size=batch_size)
+            self._logger.debug("Rerank model set successfully.")
+        except Exception as e:
+            self._logger.error("Failed to set rerank model: Error %s", str(e), exc_info=True)
+
     def set_rag_setting(self, **kwargs): #, chunk_size=1024, chunk_overlap=20, num_output=1024, context_window=3900):
         """
         Set the RAG (Retrieval-Augmented Generation) settings for the language model.
@@ -174,36 +206,8 @@ class ChatRTXRag:
         :return: The query engine object.
         """
         try:
-            persist_dir = f"{folder_path}_vector_embedding"
-            if force_rewrite:
-                if os.path.exists(persist_dir):
-                    self._logger.info("Force rewrite enabled. Deleting existing directory for a fresh start.")
-                    self.delete_persist_dir(persist_dir)
-
-            if os.path.exists(persist_dir) and os.listdir(persist_dir):
-                self._logger.info("Using the persisted value from %s", persist_dir)
-                vector_store = FaissVectorStore.from_persist_dir(persist_dir)
-                storage_context = StorageContext.from_defaults(
-                    vector_store=vector_store, persist_dir=persist_dir
-                )
-                index = load_index_from_storage(storage_context=storage_context)
-            else:
-                self._logger.info("Generating new values")
-                torch.cuda.empty_cache()
-                gc.collect()
-                documents = self._load_documents(folder_path)
-
-                # Initialize FAISS index and load documents
-                faiss_index = faiss.IndexFlatL2(self._embedding_dim)
-                vector_store = FaissVectorStore(faiss_index=faiss_index)
-                storage_context = StorageContext.from_defaults(vector_store=vector_store)
-
-                # Create and return the query engine
-                index = VectorStoreIndex.from_documents(documents, storage_context=storage_context)
-                index.storage_context.persist(persist_dir=persist_dir)
-
-            query_engine = index.as_query_engine(streaming=streaming,
-                                                 similarity_top_k=self._app_config_info["similarity_top_k"])
+            index, bm25_index = self._get_index(folder_path, force_rewrite)
+            query_engine = self._build_query_engine([(index, bm25_index)], streaming)
             self._logger.debug("Query engine generated successfully.")
             torch.cuda.empty_cache()
             gc.collect()
@@ -213,6 +217,304 @@ class ChatRTXRag:
             self._logger.error("Failed to generate the llama-index query engine: Error %s", str(e), exc_info=True)
             raise Exception("Failed to generate the llama-index query engine")
 
+    def generate_multi_query_engine(self, folder_paths, streaming: bool = False):
+        """
+        Generate a query engine that fans queries out across the indexes of several folders and
+        merges their results into one top-k.
+
+        :param folder_paths: The paths to the folders containing data.
+        :param streaming: Whether to enable streaming mode. Default is False.
+        :return: The query engine object.
+        """
+        try:
+            indexes = [self._get_index(folder_path) for folder_path in folder_paths]
+            query_engine = self._build_query_engine(indexes, streaming)
+            self._logger.debug("Query engine generated successfully for %d folders.", len(indexes))
+            torch.cuda.empty_cache()
+            gc.collect()
+            return query_engine
+
+        except Exception as e:
+            self._logger.error("Failed to generate the llama-index query engine: Error %s", str(e), exc_info=True)
+            raise Exception("Failed to generate the llama-index query engine")
+
+    def _get_index(self, folder_path, force_rewrite=False):
+        """
+        Get the index of a folder from the index registry, or load it from its persistence directory,
+        or build it, and keep it resident in the registry.
+
+        :param folder_path: The path to the folder containing data.
+        :param force_rewrite: Whether to forcefully rewrite existing data. Default is False.
+        :return: A tuple of the vector store index and its BM25 index.
+        """
+        dataset_id = self._dataset_id(folder_path)
+        persist_dir = f"{folder_path}_vector_embedding"
+        if force_rewrite:
+            self._index_registry.remove(dataset_id)
+            if os.path.exists(persist_dir):
+                self._logger.info("Force rewrite enabled. Deleting existing directory for a fresh start.")
+                self.delete_persist_dir(persist_dir)
+        else:
+            resident_index = self._index_registry.get(dataset_id)
+            if resident_index is not None:
+                self._logger.info("Using the resident index of %s", folder_path)
+                return resident_index
+
+        if os.path.exists(persist_dir) and os.listdir(persist_dir):
+            self._logger.info("Using the persisted value from %s", persist_dir)
+            vector_store = FaissVectorStore.from_persist_dir(persist_dir)
+            storage_context = StorageContext.from_defaults(
+                vector_store=vector_store, persist_dir=persist_dir
+            )
+            index = load_index_from_storage(storage_context=storage_context)
+            bm25_index = self._load_bm25_index(index, persist_dir)
+        else:
+            self._logger.info("Generating new values")
+            torch.cuda.empty_cache()
+            gc.collect()
+            documents = self._deduplicate_nodes(self._load_documents(folder_path))
+            nodes = self._deduplicate_nodes(Settings.node_parser.get_nodes_from_documents(documents))
+
+            # Initialize FAISS index and load documents
+            faiss_index = faiss.IndexFlatL2(self._embedding_dim)
+            vector_store = FaissVectorStore(faiss_index=faiss_index)
+            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+
+            # Create the index over the unique chunks
+            index = VectorStoreIndex(nodes, storage_context=storage_context)
+            index.storage_context.persist(persist_dir=persist_dir)
+
+            # Build the keyword index over the same nodes
+            bm25_index = self._build_bm25_index(index)
+            bm25_index.save(persist_dir)
+
+        self._register_index(dataset_id, index, bm25_index)
+        return index, bm25_index
+
+    def _register_index(self, dataset_id, index, bm25_index):
+        """
+        Keep an index resident in the index registry. Its memory is estimated from the FAISS
+        vectors and the node texts.
+
+        :param dataset_id: The dataset id, see _dataset_id.
+        :param index: The vector store index.
+        :param bm25_index: The BM25 index built over the same nodes.
+        """
+        faiss_index = index.vector_store.client
+        size_bytes = faiss_index.ntotal * faiss_index.d * 4
+        size_bytes += sum(len(node.get_content()) for node in index.docstore.docs.values())
+        self._index_registry.put(dataset_id, (index, bm25_index), size_bytes)
+
+    @staticmethod
+    def _dataset_id(folder_path):
+        return os.path.normcase(os.path.abspath(folder_path))
+
+    def update_query_engine(self, folder_path: str, changed_files, streaming: bool = False):
+        """
+        Incrementally update the persisted index of a folder after some of its files changed, and
+        generate a new query engine for it. Only the chunks of the changed files are re-embedded,
+        the vectors of all other chunks are reused from the FAISS index.
+
+        :param folder_path: The path to the folder containing data.
+        :param changed_files: Paths of the files that were added, modified or deleted. A path ending
+                              with a separator stands for a whole directory that was removed.
+        :param streaming: Whether to enable streaming mode. Default is False.
+        :return: The query engine object.
+        """
+        try:
+            persist_dir = f"{folder_path}_vector_embedding"
+            if not (os.path.exists(persist_dir) and os.listdir(persist_dir)):
+                return self.generate_query_engine(folder_path, streaming)
+
+            start = time.perf_counter()
+            vector_store = FaissVectorStore.from_persist_dir(persist_dir)
+            storage_context = StorageContext.from_defaults(
+                vector_store=vector_store, persist_dir=persist_dir
+            )
+            index = load_index_from_storage(storage_context=storage_context)
+            bm25_index = self._load_bm25_index(index, persist_dir)
+
+            changed_paths = {os.path.normcase(os.path.abspath(path)) for path in changed_files}
+            changed_dirs = tuple(os.path.normcase(os.path.abspath(path)) + os.sep
+                                 for path in changed_files if path.endswith(os.sep))
+
+            def is_changed(filename):
+                filename = os.path.normcase(os.path.abspath(filename))
+                return filename in changed_paths or filename.startswith(changed_dirs)
+
+            # FAISS ids are the keys of nodes_dict, reconstruct all vectors in one call
+            faiss_index = vector_store.client
+            vectors = faiss_index.reconstruct_n(0, faiss_index.ntotal) if faiss_index.ntotal else None
+            kept_nodes = []
+            removed_node_ids = []
+            renamed_nodes = []
+            for faiss_id, node_id in index.index_struct.nodes_dict.items():
+                node = index.docstore.get_node(node_id, raise_error=False)
+                if node is None:
+                    continue
+                filenames = source_files(node)
+                remaining_filenames = [filename for filename in filenames if not is_changed(filename)]
+                if not remaining_filenames:
+                    removed_node_ids.append(node_id)
+                    continue
+                if len(remaining_filenames) < len(filenames):
+                    # A deduplicated chunk is kept as long as one of its source files is unchanged
+                    set_source_files(node, remaining_filenames)
+                    renamed_nodes.append(node)
+                node.embedding = vectors[int(faiss_id)].tolist()
+                kept_nodes.append(node)
+
+            new_nodes = Settings.node_parser.get_nodes_from_documents(
+                self._deduplicate_nodes(self._load_changed_documents(folder_path, changed_files)))
+            # New chunks that duplicate kept ones are merged into them
+            unique_nodes = self._deduplicate_nodes(kept_nodes + new_nodes)
+            unique_node_ids = {node.node_id for node in unique_nodes}
+            removed_node_ids.extend(node.node_id for node in kept_nodes if node.node_id not in unique_node_ids)
+            kept_node_ids = {node.node_id for node in kept_nodes}
+            new_nodes = [node for node in unique_nodes if node.node_id not in kept_node_ids]
+            kept_nodes = [node for node in unique_nodes if node.node_id in kept_node_ids]
+
+            # IndexFlatL2 does not support removal, so a new index is filled with the reused and new vectors
+            faiss_index = faiss.IndexFlatL2(self._embedding_dim)
+            vector_store = FaissVectorStore(faiss_index=faiss_index)
+            storage_context = StorageContext.from_defaults(vector_store=vector_store)
+            index = VectorStoreIndex(kept_nodes + new_nodes, storage_context=storage_context)
+            index.storage_context.persist(persist_dir=persist_dir)
+
+            bm25_index.remove_documents(removed_node_ids)
+            bm25_index.add_documents(self._bm25_documents(
+                new_nodes + [node for node in renamed_nodes if node.node_id in unique_node_ids]))
+            bm25_index.save(persist_dir)
+
+            self._logger.info("Index updated in %.0f ms: %d chunks removed, %d added, %d reused",
+                              (time.perf_counter() - start) * 1000, len(removed_node_ids),
+                              len(new_nodes), len(kept_nodes))
+            self._register_index(self._dataset_id(folder_path), index, bm25_index)
+            query_engine = self._build_query_engine([(index, bm25_index)], streaming)
+            torch.cuda.empty_cache()
+            gc.collect()
+            return query_engine
+
+        except Exception as e:
+            self._logger.error("Failed to update the llama-index query engine: Error %s", str(e), exc_info=True)
+            raise Exception("Failed to update the llama-index query engine")
+
+    def _build_query_engine(self, indexes, streaming):
+        """
+        Build the query engine over one or more indexes, fusing dense and BM25 results when hybrid retrieval
+        is enabled and reranking the candidates with a cross-encoder when reranking is enabled. Results of
+        several indexes are merged into one top-k.
+
+        :param indexes: A list of (vector store index, BM25 index) tuples.
+        :param streaming: Whether to enable streaming mode.
+        :return: The query engine object.
+        """
+        similarity_top_k = self._app_config_info["similarity_top_k"]
+        rerank_enabled = self._app_config_info.get("rerank_enabled", False)
+        if rerank_enabled and self._rerank_scorer is None:
+            self.set_rerank_model(self._app_config_info["rerank_model"],
+                                  self._app_config_info.get("rerank_batch_size", 16))
+            rerank_enabled = self._rerank_scorer is not None
+        retrieve_top_k = self._app_config_info.get("rerank_candidate_top_k", similarity_top_k) \
+            if rerank_enabled else similarity_top_k
+
+        retrievers = [self._build_retriever(index, bm25_index, retrieve_top_k) for index, bm25_index in indexes]
+        retriever = retrievers[0] if len(retrievers) == 1 else FanOutRetriever(
+            retrievers=retrievers,
+            similarity_top_k=retrieve_top_k,
+            rrf_k=self._app_config_info.get("rrf_k", 60)
+        )
+
+        if rerank_enabled:
+            # Keep the prompt within the input length the engine was built for
+            token_budget = self._llm.metadata.context_window - self._app_config_info.get("rerank_token_reserve", 1024)
+            retriever = CrossEncoderRerankRetriever(
+                base_retriever=retriever,
+                scorer=self._rerank_scorer,
+                token_budget=token_budget,
+                token_counter=self._llm.count_tokens,
+                top_n=self._app_config_info.get("rerank_top_n", None)
+            )
+        return RetrieverQueryEngine.from_args(retriever, streaming=streaming)
+
+    def _build_retriever(self, index, bm25_index, similarity_top_k):
+        """
+        Build the retriever for one index, fusing dense and BM25 results when hybrid retrieval is enabled.
+
+        :param index: The vector store index.
+        :param bm25_index: The BM25 index built over the same nodes.
+        :param similarity_top_k: The number of nodes to retrieve.
+        :return: The retriever.
+        """
+        retriever = index.as_retriever(similarity_top_k=similarity_top_k)
+        if self._app_config_info.get("hybrid_retrieval", False):
+            retriever = HybridRetriever(
+                vector_retriever=retriever,
+                bm25_index=bm25_index,
+                docstore=index.docstore,
+                similarity_top_k=similarity_top_k,
+                sparse_top_k=max(self._app_config_info.get("bm25_top_k", similarity_top_k), similarity_top_k),
+                rrf_k=self._app_config_info.get("rrf_k", 60)
+            )
+        return retriever
+
+    def _deduplicate_nodes(self, nodes):
+        """
+        Collapse duplicate documents or chunks into one node that lists all of their source files,
+        when deduplication is enabled.
+
+        :param nodes: The documents or chunks to deduplicate.
+        :return: A list of unique nodes, in input order.
+        """
+        nodes = list(nodes)
+        if not self._app_config_info.get("dedup_enabled", False):
+            return nodes
+        deduplicator = ChunkDeduplicator(near_duplicates=self._app_config_info.get("near_dedup_enabled", False),
+                                         max_distance=self._app_config_info.get("near_dedup_max_distance", 3))
+        unique_nodes = deduplicator.deduplicate(nodes)
+        if len(unique_nodes) < len(nodes):
+            self._logger.info("Deduplication collapsed %d of %d nodes.", len(nodes) - len(unique_nodes), len(nodes))
+        return unique_nodes
+
+    def _build_bm25_index(self, index):
+        """
+        Build a BM25 index over all nodes stored in the docstore of a vector index.
+
+        :param index: The vector store index.
+        :return: The BM25 index.
+        """
+        bm25_index = BM25Index()
+        bm25_index.add_documents(self._bm25_documents(index.docstore.docs.values()))
+        self._logger.debug("BM25 index built with %d nodes.", len(bm25_index))
+        return bm25_index
+
+    def _bm25_documents(self, nodes):
+        """
+        Convert nodes into (node_id, text) tuples for the BM25 index. The file name is indexed
+        together with the text so that queries naming a document match it.
+
+        :param nodes: The nodes to convert.
+        :return: A generator of (node_id, text) tuples.
+        """
+        for node in nodes:
+            filename = os.path.basename(node.metadata.get("filename", ""))
+            yield node.node_id, f"{filename}\n{node.get_content()}"
+
+    def _load_bm25_index(self, index, persist_dir):
+        """
+        Load the persisted BM25 index, building it from the docstore if the persist directory predates it.
+
+        :param index: The vector store index loaded from persist_dir.
+        :param persist_dir: The persistence directory.
+        :return: The BM25 index.
+        """
+        bm25_index = BM25Index.load(persist_dir)
+        if bm25_index is None:
+            self._logger.info("No BM25 index found in %s. Building it from the docstore.", persist_dir)
+            bm25_index = self._build_bm25_index(index)
+            bm25_index.save(persist_dir)
+        return bm25_index
+
     def _load_documents(self, folder_path):
         """
         Load documents from the specified folder path.
@@ -225,7 +527,7 @@ class ChatRTXRag:
                 file_metadata = lambda x: {"filename": x}
                 documents = SimpleDirectoryReader(folder_path, file_metadata=file_metadata,
                                                   recursive=True,
-                                                  required_exts=[".pdf", ".doc", ".docx", ".txt", ".xml"]).load_data()
+                                                  required_exts=ChatRTXRag.DOCUMENT_EXTENSIONS).load_data()
             else:
                 self._logger.info("No files found in the directory. Initializing an empty index.")
                 documents = []
@@ -234,6 +536,29 @@ class ChatRTXRag:
             documents = []
         return documents
 
+    def _load_changed_documents(self, folder_path, changed_files):
+        """
+        Load the changed files that still exist and would be picked up by _load_documents.
+
+        :param folder_path: The path to the folder containing data.
+        :param changed_files: Paths of the changed files.
+        :return: A list of loaded documents.
+        """
+        folder_abs_path = os.path.abspath(folder_path)
+        input_files = []
+        for path in changed_files:
+            relative_path = os.path.relpath(os.path.abspath(path), folder_abs_path)
+            if (not os.path.isfile(path) or relative_path.startswith(os.pardir)
+                    or os.path.splitext(path)[1].lower() not in ChatRTXRag.DOCUMENT_EXTENSIONS
+                    or any(part.startswith(".") for part in relative_path.split(os.sep))):
+                continue
+            # Keep the file names in the same form as the ones stored by the full index build
+            input_files.append(os.path.join(folder_path, relative_path))
+        if not input_files:
+            return []
+        file_metadata = lambda x: {"filename": x}
+        return SimpleDirectoryReader(input_files=input_files, file_metadata=file_metadata).load_data()
+
     def delete_persist_dir(self, persist_dir):
         """
         Delete the persistence directory.
@@ -271,17 +596,70 @@ class ChatRTXRag:
         """
         Generate a streaming response for a given query using the provided query engine.
 
+        The stream is made of events, each a dictionary with a "type" key:
+            - "sources": emitted first, before generation starts. "sources" holds a list of
+              {"file": path, "score": score} dictionaries, deduplicated by file and ordered by rank.
+            - "token": one per generated text delta, carried in "text".
+            - "usage": emitted last. "usage" holds the completion token count and "timings" the
+              retrieval, time to first token, generation and total latencies in milliseconds.
+
         :param query: The query string for which to generate a streaming response.
         :param query_engine: The query engine object to use for generating the streaming response.
-        :yields: Tokens and source nodes from the streaming response.
+        :return: A generator of stream events.
         """
         try:
-            response = query_engine.query(query)
-            return response
+            start = time.perf_counter()
+            # Stage timings reported by the retrievers of this query, e.g. by the rerank stage
+            with collect_stage_timings() as stage_timings:
+                response = query_engine.query(query)
+            retrieval_time = time.perf_counter()
         except Exception as e:
             self._logger.error("Failed to generate stream response: Error %s", str(e), exc_info=True)
             raise Exception(f"Failed to generate the stream response: {str(e)}")
 
+        def gen():
+            yield {"type": ChatRTXRag.STREAM_SOURCES, "sources": self._get_sources(response.source_nodes)}
+
+            text = ""
+            first_token_time = None
+            for token in response.response_gen:
+                if first_token_time is None:
+                    first_token_time = time.perf_counter()
+                text += token
+                yield {"type": ChatRTXRag.STREAM_TOKEN, "text": token}
+            end = time.perf_counter()
+
+            timings = {
+                "retrieval_ms": (retrieval_time - start) * 1000,
+                "time_to_first_token_ms": ((first_token_time or end) - start) * 1000,
+                "generation_ms": (end - retrieval_time) * 1000,
+                "total_ms": (end - start) * 1000,
+            }
+            timings.update(stage_timings)
+            yield {"type": ChatRTXRag.STREAM_USAGE,
+                   "usage": {"completion_tokens": self._llm.count_tokens(text) if text else 0},
+                   "timings": timings}
+
+        return gen()
+
+    def _get_sources(self, source_nodes):
+        """
+        Collect the source files of the retrieved nodes, deduplicated and in rank order.
+
+        :param source_nodes: The retrieved nodes with scores.
+        :return: A list of {"file": path, "score": score} dictionaries.
+        """
+        sources = []
+        seen_files = set()
+        for node in source_nodes:
+            # Deduplicated chunks list every file they were found in
+            for file in source_files(node):
+                if file in seen_files:
+                    continue
+                seen_files.add(file)
+                sources.append({"file": file, "score": node.score})
+        return sources
+
     def unload_llm(self):
         """
         Unload the currently loaded language model, if any.
@@ -0,0 +1,71 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+# Measures CLIP image embedding throughput by batch size, e.g.
+#   python clip_benchmark.py --model_path ../model/models/clip_model --device cpu --batch_sizes 1 8 32
+
+import argparse
+import logging
+import os
+import sys
+import time
+from ChatRTX.inference.pytorch.CLIP import ClipInference, CLIPEmbeddingStorageEngine
+from ChatRTX.logger import ChatRTXLogger
+
+ChatRTXLogger(log_level=logging.INFO, log_file='chatRTX.log')
+logger = ChatRTXLogger.get_logger()
+
+parser = argparse.ArgumentParser(description="CLIP image embedding benchmark")
+parser.add_argument("--model_path", required=True, help="Directory of the CLIP model")
+parser.add_argument("--image_data_dir", default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                             "..", "sample_data", "images_dataset"))
+parser.add_argument("--device", default=None, help="cuda or cpu. Defaults to cuda when available")
+parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 4, 8, 16, 32, 64])
+parser.add_argument("--num_workers", type=int, default=None)
+parser.add_argument("--repeats", type=int, default=3)
+args = parser.parse_args()
+
+clip_inference = ClipInference()
+if not clip_inference.load_model(args.model_path, device=args.device):
+    logger.error(f"Failed to load the clip model from {args.model_path}")
+    sys.exit(1)
+
+image_paths = sorted(os.path.join(root, filename) for root, _, filenames in os.walk(args.image_data_dir)
+                     for filename in filenames if filename.lower().endswith(CLIPEmbeddingStorageEngine.IMAGE_EXTENSIONS))
+if not image_paths:
+    logger.error(f"No images found in {args.image_data_dir}")
+    sys.exit(1)
+
+print(f"{len(image_paths)} images, device {next(clip_inference.clip_model.parameters()).device}")
+print(f"{'batch size':>10} {'images/sec':>12} {'best sec':>10}")
+for batch_size in args.batch_sizes:
+    engine = CLIPEmbeddingStorageEngine(args.image_data_dir, args.model_path, clip_inference.clip_model,
+                                        clip_inference.clip_processor, batch_size=batch_size,
+                                        num_workers=args.num_workers)
+    # Warm up, then keep the best of the timed runs
+    engine.embed_images(image_paths[:batch_size])
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        engine.embed_images(image_paths)
+        timings.append(time.perf_counter() - start)
+    best = min(timings)
+    print(f"{batch_size:>10} {len(image_paths) / best:>12.1f} {best:>10.2f}")
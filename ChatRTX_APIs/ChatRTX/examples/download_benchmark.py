@@ -0,0 +1,172 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+# Downloads generated files from a local HTTP server with range support: one stream per file with
+# 1 KiB reads, as model files used to be downloaded, against the DownloadManager. The server can drop
+# connections part way, to check that an interrupted download resumes from its .part file, e.g.
+#   python download_benchmark.py --files 3 --size_mb 256 --drop_after_mb 40
+
+import argparse
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from ChatRTX.model_manager.download_manager import DownloadManager
+
+parser = argparse.ArgumentParser(description="Model download benchmark")
+parser.add_argument("--files", type=int, default=3)
+parser.add_argument("--size_mb", type=int, default=128, help="Size of every generated file")
+parser.add_argument("--drop_after_mb", type=float, default=0, help="Close every response after this many MB. 0 disables")
+parser.add_argument("--rate_mb", type=float, default=0, help="Limit every connection to this many MB/s. 0 disables")
+parser.add_argument("--segments_per_file", type=int, default=4)
+parser.add_argument("--max_files", type=int, default=2)
+args = parser.parse_args()
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Serves files with single range requests, throttled and dropped as configured."""
+
+    served_bytes = 0
+    drop_after = int(args.drop_after_mb * 1024 * 1024) or None
+    lock = threading.Lock()
+
+    def log_message(self, *_):
+        pass
+
+    def do_GET(self):
+        path = self.translate_path(self.path.split("?", 1)[0])
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        self.end_headers()
+        limit = RangeRequestHandler.drop_after
+        sent = 0
+        with open(path, "rb") as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                block = f.read(min(256 * 1024, remaining))
+                if limit is not None and sent + len(block) > limit:
+                    # drop the connection part way
+                    self.wfile.write(block[:limit - sent])
+                    self.close_connection = True
+                    return
+                try:
+                    self.wfile.write(block)
+                except OSError:
+                    return
+                sent += len(block)
+                remaining -= len(block)
+                with RangeRequestHandler.lock:
+                    RangeRequestHandler.served_bytes += len(block)
+                if args.rate_mb:
+                    time.sleep(len(block) / (args.rate_mb * 1024 * 1024))
+
+
+def file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.file_digest(f, "sha256").hexdigest()
+
+
+def single_stream(url, destination):
+    with requests.get(url, stream=True) as r:
+        r.raise_for_status()
+        with open(destination, "wb") as f:
+            for data in r.iter_content(1024):
+                f.write(data)
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    serve_dir = os.path.join(temp_dir, "serve")
+    os.makedirs(serve_dir)
+    digests = {}
+    for i in range(args.files):
+        name = f"rank{i}.safetensors"
+        with open(os.path.join(serve_dir, name), "wb") as f:
+            f.write(os.urandom(args.size_mb * 1024 * 1024))
+        digests[name] = file_digest(os.path.join(serve_dir, name))
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), partial(RangeRequestHandler, directory=serve_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    total_mb = args.files * args.size_mb
+
+    if not args.drop_after_mb:
+        out_dir = os.path.join(temp_dir, "single")
+        os.makedirs(out_dir)
+        start = time.perf_counter()
+        for name in digests:
+            single_stream(f"{base_url}/{name}?download=true", os.path.join(out_dir, name))
+        elapsed = time.perf_counter() - start
+        print(f"single stream : {elapsed:.2f} s, {total_mb / elapsed:.1f} MB/s")
+
+    out_dir = os.path.join(temp_dir, "manager")
+    files = [(f"{base_url}/{name}?download=true", os.path.join(out_dir, name)) for name in digests]
+    last_stats = {}
+    RangeRequestHandler.served_bytes = 0
+    start = time.perf_counter()
+    with DownloadManager(max_files=args.max_files, segments_per_file=args.segments_per_file,
+                         min_segment_size=4 * 1024 * 1024, retries=100,
+                         progress_callback=last_stats.update) as download_manager:
+        results = download_manager.download(files)
+    elapsed = time.perf_counter() - start
+    print(f"download manager : {elapsed:.2f} s, {total_mb / elapsed:.1f} MB/s, "
+          f"{RangeRequestHandler.served_bytes / (1024 * 1024):.1f} MB served")
+    print(f"last progress event: {last_stats}")
+    for name, digest in digests.items():
+        path = os.path.join(out_dir, name)
+        ok = results[path] and file_digest(path) == digest
+        print(f"{name}: {'ok' if ok else 'MISMATCH'}")
+
+    # resume in a later run: the first run gives up on the dropped connections after
+    # half of the file, the second one starts from its .part file
+    os.remove(files[0][1])
+    size = args.size_mb * 1024 * 1024
+    RangeRequestHandler.drop_after = size // (2 * args.segments_per_file)
+    with DownloadManager(segments_per_file=args.segments_per_file, min_segment_size=4 * 1024 * 1024,
+                         retries=1) as download_manager:
+        download_manager.download(files[:1])
+    RangeRequestHandler.drop_after = None
+    RangeRequestHandler.served_bytes = 0
+    with DownloadManager(segments_per_file=args.segments_per_file,
+                         min_segment_size=4 * 1024 * 1024) as download_manager:
+        results = download_manager.download(files[:1])
+    resumed_mb = RangeRequestHandler.served_bytes / (1024 * 1024)
+    ok = results[files[0][1]] and file_digest(files[0][1]) == digests[os.path.basename(files[0][1])]
+    print(f"resumed download : {resumed_mb:.1f} of {args.size_mb} MB fetched again, {'ok' if ok else 'MISMATCH'}")
+    server.shutdown()
@@ -21,7 +21,7 @@
 
 from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetMemoryInfo
 from ChatRTX.inference.trtllm.whisper.trt_whisper import WhisperTRTLLM, decode_audio_file
-from ChatRTX.inference.trtllm.whisper.whisper_utils import process_input_audio
+from ChatRTX.inference.trtllm.whisper.whisper_utils import load_audio
 import time
 
 
@@ -68,10 +68,10 @@ def mic_recording_done_handler(audio_path):
     if checks_left_for_model_loading == 0:
         return ""
 
-    new_file_path = process_input_audio(audio_path)
+    audio = load_audio(audio_path)
     language = "english"
     if selected_ChatGLM: language = "chinese"
-    transcription = decode_audio_file( new_file_path, whisper_model, language=language, mel_filters_dir=asr_assets_path)
+    transcription = decode_audio_file( audio, whisper_model, language=language, mel_filters_dir=asr_assets_path)
 
     if whisper_model is not None:        
         whisper_model.unload_model()
@@ -0,0 +1,85 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+# Compares the time to prepare a recorded utterance for Whisper: the old temp WAV round trip
+# (FFT resample, write whisper_audio_input.wav, read it back) against the in-memory load_audio, e.g.
+#   python whisper_audio_benchmark.py --sample_rate 48000 --seconds 10
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import scipy.signal as sps
+import soundfile
+from scipy.io import wavfile
+from ChatRTX.inference.trtllm.whisper.whisper_utils import SAMPLE_RATE, load_audio
+
+parser = argparse.ArgumentParser(description="Whisper audio preprocessing benchmark")
+parser.add_argument("--audio_path", default=None, help=".wav file to use. Defaults to generated speech-band noise")
+parser.add_argument("--sample_rate", type=int, default=48000, help="Sample rate of the generated audio")
+parser.add_argument("--seconds", type=float, default=10.0, help="Length of the generated audio")
+parser.add_argument("--repeats", type=int, default=10)
+args = parser.parse_args()
+
+
+def temp_wav_round_trip(audio_path):
+    current_sampling_rate, data = wavfile.read(audio_path)
+    number_of_samples = round(len(data) * float(SAMPLE_RATE) / current_sampling_rate)
+    data = sps.resample(data, number_of_samples)
+    new_file_path = os.path.join(os.path.dirname(audio_path), "whisper_audio_input.wav")
+    wavfile.write(new_file_path, SAMPLE_RATE, data.astype(np.int16))
+    waveform, _ = soundfile.read(new_file_path)
+    return waveform.astype(np.float32)
+
+
+def best_time(fn, audio):
+    fn(audio)
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        fn(audio)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    audio_path = args.audio_path
+    if audio_path is None:
+        rng = np.random.default_rng(0)
+        noise = rng.standard_normal(int(args.sample_rate * args.seconds))
+        b, a = sps.butter(4, [300, 3400], btype="bandpass", fs=args.sample_rate)
+        speech_band = sps.lfilter(b, a, noise)
+        speech_band = speech_band / np.abs(speech_band).max() * 0.5
+        audio_path = os.path.join(temp_dir, "utterance.wav")
+        wavfile.write(audio_path, args.sample_rate, (speech_band * 32767).astype(np.int16))
+    with open(audio_path, "rb") as f:
+        audio_bytes = f.read()
+
+    round_trip = best_time(temp_wav_round_trip, audio_path)
+    from_path = best_time(load_audio, audio_path)
+    from_bytes = best_time(load_audio, audio_bytes)
+
+print(f"{'pipeline':>24} {'best ms':>10}")
+print(f"{'temp wav round trip':>24} {round_trip * 1000:>10.1f}")
+print(f"{'load_audio(path)':>24} {from_path * 1000:>10.1f}")
+print(f"{'load_audio(bytes)':>24} {from_bytes * 1000:>10.1f}")
+print(f"saved per utterance: {(round_trip - from_bytes) * 1000:.1f} ms ({round_trip / from_bytes:.1f}x)")
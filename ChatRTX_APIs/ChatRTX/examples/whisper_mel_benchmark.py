@@ -0,0 +1,69 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+# Compares log_mel_spectrogram called per waveform against log_mel_spectrogram_batch on the CPU, and
+# checks that the batched spectrograms match the single ones, e.g.
+#   python whisper_mel_benchmark.py --mel_filters_dir ../model/whisper/whisper_assets --batch_sizes 1 4 8
+
+import argparse
+import time
+
+import numpy as np
+import torch
+from ChatRTX.inference.trtllm.whisper.whisper_utils import (N_SAMPLES, log_mel_spectrogram,
+                                                            log_mel_spectrogram_batch)
+
+parser = argparse.ArgumentParser(description="Whisper log-Mel spectrogram benchmark")
+parser.add_argument("--mel_filters_dir", default=None, help="Directory of mel_filters.npz")
+parser.add_argument("--n_mels", type=int, default=80)
+parser.add_argument("--batch_sizes", type=int, nargs="+", default=[1, 2, 4, 8])
+parser.add_argument("--threads", type=int, default=None, help="torch CPU threads")
+parser.add_argument("--repeats", type=int, default=5)
+args = parser.parse_args()
+
+if args.threads:
+    torch.set_num_threads(args.threads)
+
+rng = np.random.default_rng(0)
+
+
+def best_time(fn):
+    fn()
+    timings = []
+    for _ in range(args.repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+print(f"{'batch size':>10} {'single ms':>10} {'batch ms':>10} {'speedup':>8} {'max diff':>10}")
+for batch_size in args.batch_sizes:
+    # waveforms of different lengths and loudness, so per item normalization matters
+    waveforms = [(rng.standard_normal(int(rng.integers(N_SAMPLES // 10, N_SAMPLES))) * rng.uniform(0.01, 0.5))
+                 .astype(np.float32) for _ in range(batch_size)]
+    single = lambda: [log_mel_spectrogram(waveform, args.n_mels, device='cpu', mel_filters_dir=args.mel_filters_dir)
+                      for waveform in waveforms]
+    batch = lambda: log_mel_spectrogram_batch(waveforms, args.n_mels, device='cpu',
+                                              mel_filters_dir=args.mel_filters_dir)
+    max_diff = (torch.stack(single()) - batch()).abs().max().item()
+    single_time, batch_time = best_time(single), best_time(batch)
+    print(f"{batch_size:>10} {single_time * 1000:>10.1f} {batch_time * 1000:>10.1f} "
+          f"{single_time / batch_time:>7.2f}x {max_diff:>10.2e}")
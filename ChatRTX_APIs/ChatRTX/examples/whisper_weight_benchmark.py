@@ -0,0 +1,204 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+# Checks the Whisper engine builder's weight conversion on the CPU against a reference version of
+# build_files/weight.py, with a random checkpoint and a stand-in for the TRT-LLM model that records
+# every array assigned to a parameter. Each loader runs in its own process, the way build.py uses it
+# (a full torch.load and an up-front cast for the reference, load_checkpoint and per-tensor casts
+# for the current one), so the conversion time and peak RSS of the two can be compared, e.g.
+#   git show <revision>:ChatRTX_APIs/ChatRTX/inference/trtllm/whisper/build_files/weight.py > weight_reference.py
+#   python whisper_weight_benchmark.py --reference weight_reference.py --n_state 1280 --n_layer 32
+
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+parser = argparse.ArgumentParser(description="Whisper builder weight conversion check")
+parser.add_argument("--reference", required=True, help="The weight.py to compare with")
+parser.add_argument("--n_state", type=int, default=384, help="Width of the generated model")
+parser.add_argument("--n_layer", type=int, default=4, help="Encoder and decoder layers of the generated model")
+parser.add_argument("--n_vocab", type=int, default=51865)
+parser.add_argument("--checkpoint_dtype", default="float16", choices=["float16", "float32"])
+parser.add_argument("--weight_workers", type=int, default=None)
+parser.add_argument("--run", default=None, help=argparse.SUPPRESS)
+parser.add_argument("--checkpoint", default=None, help=argparse.SUPPRESS)
+parser.add_argument("--quant", default=None, help=argparse.SUPPRESS)
+parser.add_argument("--output", default=None, help=argparse.SUPPRESS)
+args = parser.parse_args()
+
+# weight-only quantization and whether the gemm plugin takes the quantized weights
+QUANT_MODES = {"none": (False, True), "int8_plugin": (True, True), "int8": (True, False)}
+
+
+class Recorder:
+    """Stands in for the TRT-LLM Whisper modules and records the arrays assigned to .value."""
+
+    def __init__(self, values, path, **attributes):
+        object.__setattr__(self, "_values", values)
+        object.__setattr__(self, "_path", path)
+        object.__setattr__(self, "_children", {})
+        for name, value in attributes.items():
+            object.__setattr__(self, name, value)
+
+    def _child(self, key, path):
+        if key not in self._children:
+            self._children[key] = Recorder(self._values, path)
+        return self._children[key]
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._child(name, f"{self._path}.{name}")
+
+    def __getitem__(self, index):
+        return self._child(index, f"{self._path}[{index}]")
+
+    def __setattr__(self, name, value):
+        if name != "value":
+            raise AttributeError(f"Unexpected assignment to {self._path}.{name}")
+        self._values[self._path] = value
+
+
+def random_checkpoint(path):
+    n, n_layer = args.n_state, args.n_layer
+    dims = {"n_mels": 80, "n_vocab": args.n_vocab, "n_audio_ctx": 1500, "n_audio_state": n,
+            "n_audio_head": n // 64, "n_audio_layer": n_layer, "n_text_ctx": 448, "n_text_state": n,
+            "n_text_head": n // 64, "n_text_layer": n_layer}
+    dtype = getattr(torch, args.checkpoint_dtype)
+    generator = torch.Generator().manual_seed(0)
+    params = {}
+
+    def add(name, *shape):
+        params[name] = (torch.randn(*shape, generator=generator) * 0.02).to(dtype)
+
+    def add_block(prefix, attentions):
+        for attention in attentions:
+            add(f"{prefix}{attention}_ln.weight", n)
+            add(f"{prefix}{attention}_ln.bias", n)
+            for projection in ("query", "key", "value", "out"):
+                add(f"{prefix}{attention}.{projection}.weight", n, n)
+                if projection != "key":
+                    add(f"{prefix}{attention}.{projection}.bias", n)
+        add(f"{prefix}mlp_ln.weight", n)
+        add(f"{prefix}mlp_ln.bias", n)
+        add(f"{prefix}mlp.0.weight", 4 * n, n)
+        add(f"{prefix}mlp.0.bias", 4 * n)
+        add(f"{prefix}mlp.2.weight", n, 4 * n)
+        add(f"{prefix}mlp.2.bias", n)
+
+    add("encoder.conv1.weight", n, 80, 3)
+    add("encoder.conv1.bias", n)
+    add("encoder.conv2.weight", n, n, 3)
+    add("encoder.conv2.bias", n)
+    for i in range(n_layer):
+        add_block(f"encoder.blocks.{i}.", ["attn"])
+    add("encoder.ln_post.weight", n)
+    add("encoder.ln_post.bias", n)
+    add("decoder.token_embedding.weight", args.n_vocab, n)
+    add("decoder.positional_embedding", 448, n)
+    for i in range(n_layer):
+        add_block(f"decoder.blocks.{i}.", ["attn", "cross_attn"])
+    add("decoder.ln.weight", n)
+    add("decoder.ln.bias", n)
+    torch.save({"dims": dims, "model_state_dict": params}, path)
+
+
+def convert():
+    """Runs one loader in this process and saves what it assigned."""
+    from tensorrt_llm.quantization import QuantMode
+    from ChatRTX.inference.trtllm.engine_loader import peak_rss_bytes
+
+    use_weight_only, use_gemm_woq_plugin = QUANT_MODES[args.quant]
+    quant_mode = QuantMode.use_weight_only() if use_weight_only else QuantMode(0)
+    dtype = torch.float16
+    start = time.perf_counter()
+    if args.run == "reference":
+        spec = importlib.util.spec_from_file_location("weight_reference", args.reference)
+        weight = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(weight)
+        model = torch.load(args.checkpoint, map_location="cpu")
+        model_params = model["model_state_dict"]
+        for k, v in model_params.items():
+            model_params[k] = v.to(dtype)
+        kwargs = {}
+    else:
+        from ChatRTX.inference.trtllm.whisper.build_files import weight
+        model = weight.load_checkpoint(args.checkpoint, dtype)
+        model_params = weight.CastParams(model["model_state_dict"], dtype)
+        kwargs = {"num_workers": args.weight_workers}
+    loaded = time.perf_counter()
+
+    dims = model["dims"]
+    values = {}
+    encoder = Recorder(values, "encoder", quant_mode=quant_mode)
+    decoder = Recorder(values, "decoder", quant_mode=quant_mode, num_layers=dims["n_text_layer"],
+                       has_attention_qkvo_bias=True, has_mlp_bias=True)
+    weight.load_encoder_weight(encoder, dims, model_params, dims["n_audio_layer"], use_gemm_woq_plugin, **kwargs)
+    weight.load_decoder_weight(decoder, model_params, use_gemm_woq_plugin, **kwargs)
+    converted = time.perf_counter()
+    peak_rss = peak_rss_bytes()
+
+    shared = [key for key in values if key != "decoder.embedding.vocab_embedding.weight"
+              and np.shares_memory(values[key], values["decoder.embedding.vocab_embedding.weight"])]
+    np.savez(args.output, **values)
+    print(f"{loaded - start:.3f} {converted - loaded:.3f} {peak_rss or 0} {','.join(shared) or '-'}")
+
+
+if args.run is not None:
+    convert()
+    sys.exit(0)
+
+with tempfile.TemporaryDirectory() as temp_dir:
+    checkpoint = os.path.join(temp_dir, "whisper.pt")
+    random_checkpoint(checkpoint)
+    print(f"checkpoint: {os.path.getsize(checkpoint) / 2**20:.0f} MB, {args.checkpoint_dtype}, "
+          f"{args.n_layer} layers of {args.n_state}")
+    failed = False
+    for quant in QUANT_MODES:
+        results = {}
+        for run in ("reference", "current"):
+            output = os.path.join(temp_dir, f"{run}_{quant}.npz")
+            command = [sys.executable, os.path.abspath(__file__), "--reference", args.reference, "--run", run,
+                       "--checkpoint", checkpoint, "--quant", quant, "--output", output]
+            if args.weight_workers is not None:
+                command += ["--weight_workers", str(args.weight_workers)]
+            load_s, convert_s, peak_rss, shared = subprocess.run(
+                command, check=True, capture_output=True, text=True).stdout.split()[-4:]
+            results[run] = np.load(output)
+            print(f"{quant:12s} {run:9s}: load {float(load_s):6.2f} s, convert {float(convert_s):6.2f} s, "
+                  f"peak RSS {int(peak_rss) / 2**20:6.0f} MB, arrays sharing the embedding: {shared}")
+        reference, current = results["reference"], results["current"]
+        mismatched = sorted(set(reference.files) ^ set(current.files))
+        for key in sorted(set(reference.files) & set(current.files)):
+            if reference[key].dtype != current[key].dtype or not np.array_equal(reference[key], current[key]):
+                mismatched.append(key)
+        if mismatched:
+            failed = True
+            print(f"{quant}: {len(mismatched)} of {len(reference.files)} parameters differ: {mismatched[:5]}")
+        else:
+            print(f"{quant}: all {len(reference.files)} parameters identical")
+    sys.exit(1 if failed else 0)
@@ -23,76 +23,234 @@ from PIL import Image
 import os
 import torch
 import shutil
-from llama_index.core.schema import TextNode
-from llama_index.core import (
-    load_index_from_storage,
-    VectorStoreIndex,
-    StorageContext
-)
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import gc
-from llama_index.core.schema import QueryBundle
 from transformers import CLIPProcessor, CLIPModel, CLIPTokenizer
+from ChatRTX.inference.pytorch.clip_image_index import ClipImageIndex, file_hash
+from ChatRTX.inference.pytorch.clip_pixel_cache import ClipPixelCache
 from ChatRTX.logger import ChatRTXLogger
 import ctypes
 
 class CLIPEmbeddingStorageEngine:
-    def __init__(self, data_dir, model_path, clip_model, clip_processor):
+    IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+    MAX_MATCHES = 500
+    # Result modes of query: copy the matched images into the result directory, link them into
+    # it, or return the original paths without touching the file system
+    RESULT_MODE_COPY = "copy"
+    RESULT_MODE_LINK = "link"
+    RESULT_MODE_PATHS = "paths"
+
+    def __init__(self, data_dir, model_path, clip_model, clip_processor, batch_size=32, num_workers=None,
+                 text_embedder=None, use_pixel_cache=True):
         try:
             self.data_dir = data_dir
             self.persist_dir = f"{self.data_dir}_clip_vector_embedding"
-            self.index = None
-            self.nodes = None
+            self.cache_dir = f"{self.data_dir}_clip_cache"
+            self.thumbnail_dir = os.path.join(self.cache_dir, "thumbnails")
+            self.image_index = None
+            self.manifest = None
+            self._index_changed = False
+            self._manifest_changed = False
             os.environ["OPENAI_API_KEY"] = "YOUR_API_KEY"
-            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            # Run on the device the model was loaded to
+            self.device = next(clip_model.parameters()).device
             self.model_path = model_path
+            # Stored with the manifest, the embeddings of another model are not reused
+            self.model_id = os.path.basename(os.path.normpath(model_path))
             self.clip_model = clip_model
             self.clip_processor = clip_processor
+            self.batch_size = batch_size
+            self.num_workers = num_workers or min(8, os.cpu_count() or 1)
+            # Callable returning the CLIP text embedding of a query, see ClipInference.embed_text
+            self.text_embedder = text_embedder
+            self.use_pixel_cache = use_pixel_cache
+            self._pixel_cache = None
+            self._clip_tokenizer = None
             self._logger = ChatRTXLogger.get_logger()
         except Exception as e:
             self._logger.error(f"Initialization error: {str(e)}")
 
     def create_nodes(self, force_rewrite=False):
+        """
+        Bring the image index in sync with the images in data_dir. Only new or changed images are
+        embedded, the embeddings of unchanged images are reused and deleted images are dropped.
+        An image is unchanged when its size and mtime match the manifest, or else when its content
+        hash matches an indexed image, which also covers renamed and moved images.
+
+        Args:
+            force_rewrite (bool): Embed all images again.
+
+        Returns:
+            bool: True on success.
+        """
         try:
-            nodes = []
-            images_dir = self.data_dir
-            if os.path.exists(self.persist_dir) and not force_rewrite:
-                return True
-            with torch.no_grad():
-                # iterate over the image metadata dictionary and extracts image embeddings for each image
-                for root, _, filenames in os.walk(images_dir):
-                    for filename in filenames:
-                        if not filename.lower().endswith((".png", ".jpg", ".jpeg", ".bmp")):
-                            continue
-                        img_file_path = os.path.join(root, filename)
-                        if os.path.isfile(img_file_path):
-                            image = Image.open(img_file_path).convert("RGB")
-                            image_input = self.clip_processor(images=image, return_tensors="pt").to(self.device)
-                            image_features = self.clip_model.get_image_features(**image_input)
-                            node = TextNode(text="dummy_text", metadata={"path": img_file_path}, embedding=image_features.tolist()[0])
-                            nodes.append(node)
-            self.nodes = nodes
+            start = time.perf_counter()
+            image_paths = []
+            for root, _, filenames in os.walk(self.data_dir):
+                for filename in filenames:
+                    img_file_path = os.path.join(root, filename)
+                    if filename.lower().endswith(self.IMAGE_EXTENSIONS) and os.path.isfile(img_file_path):
+                        image_paths.append(img_file_path)
+
+            stored_index = None if force_rewrite else ClipImageIndex.load(self.persist_dir)
+            if stored_index is not None and stored_index.dim != self.clip_model.config.projection_dim:
+                stored_index = None
+            stored_manifest = ClipImageIndex.load_manifest(self.persist_dir) if stored_index is not None else None
+            if stored_manifest is None or stored_manifest.get("model") != self.model_id:
+                stored_index = None
+                stored_manifest = {}
+            else:
+                stored_manifest = stored_manifest.get("images", {})
+            stored_rows = {path: row for row, path in enumerate(stored_index.paths)} if stored_index is not None else {}
+            rows_by_hash = {entry["hash"]: stored_rows[path] for path, entry in stored_manifest.items() if path in stored_rows}
+
+            manifest = {}
+            rows = []
+            new_paths = []
+            for img_file_path in image_paths:
+                stat = os.stat(img_file_path)
+                entry = stored_manifest.get(img_file_path)
+                if (entry is not None and img_file_path in stored_rows
+                        and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns):
+                    manifest[img_file_path] = entry
+                    rows.append(stored_rows[img_file_path])
+                    continue
+                digest = file_hash(img_file_path)
+                manifest[img_file_path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": digest}
+                row = rows_by_hash.get(digest)
+                if row is not None:
+                    rows.append(row)
+                else:
+                    new_paths.append(img_file_path)
+
+            if stored_index is not None and not new_paths and rows == list(range(len(stored_index))):
+                self.image_index = stored_index
+                self._index_changed = False
+            else:
+                new_path_set = set(new_paths)
+                reused_paths = [img_file_path for img_file_path in image_paths if img_file_path not in new_path_set]
+                embeddings, embedded_paths = self.embed_images(
+                    new_paths, [manifest[img_file_path]["hash"] for img_file_path in new_paths])
+                # Images that could not be decoded are left out of the manifest, so they are retried
+                for img_file_path in new_path_set.difference(embedded_paths):
+                    del manifest[img_file_path]
+                self.image_index = ClipImageIndex(self.clip_model.config.projection_dim)
+                if rows:
+                    self.image_index.add(stored_index.embeddings()[rows], reused_paths)
+                self.image_index.add(embeddings, embedded_paths)
+                self._index_changed = True
+            self._manifest_changed = self._index_changed or manifest != stored_manifest
+            self.manifest = manifest
+            self._logger.info(f"CLIP index sync of {self.data_dir} in {time.perf_counter() - start:.2f} sec: "
+                              f"{len(new_paths)} images embedded, {len(rows)} reused, "
+                              f"{len(stored_rows) - len(set(rows))} dropped")
             return True
         except Exception as e:
             self._logger.error(f"Error in create_nodes: {str(e)}")
             return False
 
-    def initialize_index(self, force_rewrite=False):
+    def embed_images(self, image_paths, digests=None):
+        """
+        Compute the CLIP embeddings of images. A thread pool decodes, resizes and crops the next batch
+        of images while the model runs on the current one. With content hashes, preprocessed images
+        are read from and added to the pixel cache, so cached images are not decoded again.
+
+        Args:
+            image_paths (list): Paths of the images to embed.
+            digests (list): Content hashes of the images, see clip_image_index.file_hash. Optional.
+
+        Returns:
+            tuple: A float32 array of shape (number of images, embedding dim) and the list of image
+            paths it holds, in input order. Images that cannot be decoded are skipped.
+        """
+        embeddings = np.empty((len(image_paths), self.clip_model.config.projection_dim), dtype=np.float32)
+        valid = np.zeros(len(image_paths), dtype=bool)
+        digests = digests or [None] * len(image_paths)
+        size = self.clip_processor.image_processor.crop_size["height"]
+        pixel_cache = self._get_pixel_cache(size) if any(digests) else None
+        batches = [range(start, min(start + self.batch_size, len(image_paths)))
+                   for start in range(0, len(image_paths), self.batch_size)]
+        cache_hits = 0
+        with ThreadPoolExecutor(max_workers=self.num_workers) as executor, torch.inference_mode():
+            submit = lambda batch: [executor.submit(self._load_image, image_paths[i], digests[i], size, pixel_cache)
+                                    for i in batch]
+            pending = submit(batches[0]) if batches else []
+            for batch_index, batch in enumerate(batches):
+                futures = pending
+                if batch_index + 1 < len(batches):
+                    pending = submit(batches[batch_index + 1])
+                loaded = [(i, *future.result()) for i, future in zip(batch, futures)]
+                loaded = [(i, pixels, cached) for i, pixels, cached in loaded if pixels is not None]
+                if not loaded:
+                    continue
+                for i, pixels, cached in loaded:
+                    cache_hits += cached
+                    if pixel_cache is not None and digests[i] is not None and not cached:
+                        pixel_cache.put(digests[i], pixels)
+                rows = [i for i, _, _ in loaded]
+                # Images are already resized and cropped to the model input size
+                pixel_values = self.clip_processor(images=[pixels for _, pixels, _ in loaded], return_tensors="pt",
+                                                   do_resize=False, do_center_crop=False)["pixel_values"]
+                pixel_values = pixel_values.to(self.device, dtype=self.clip_model.dtype)
+                image_features = self.clip_model.get_image_features(pixel_values=pixel_values)
+                embeddings[rows] = image_features.float().cpu().numpy()
+                valid[rows] = True
+        if pixel_cache is not None:
+            pixel_cache.flush()
+            self._logger.info(f"Pixel cache hits: {cache_hits} of {len(image_paths)} images")
+        return embeddings[valid], [path for path, is_valid in zip(image_paths, valid) if is_valid]
+
+    def _get_pixel_cache(self, size):
+        if not self.use_pixel_cache:
+            return None
+        if self._pixel_cache is None or self._pixel_cache.size != size:
+            self._pixel_cache = ClipPixelCache(self.cache_dir, size)
+        return self._pixel_cache
+
+    def _load_image(self, img_file_path, digest, size, pixel_cache):
+        # Called from the thread pool. Decoding and resizing release the GIL in PIL.
         try:
-            # Check if the persist directory exists and delete it if force_rewrite is true
-            if force_rewrite and os.path.exists(self.persist_dir):
-                print("Deleting existing directory for a fresh start.")
-                self.delete_persist_dir()
+            if pixel_cache is not None and digest is not None:
+                pixels = pixel_cache.get(digest)
+                if pixels is not None:
+                    return pixels, True
+            with Image.open(img_file_path) as image:
+                # Let the JPEG decoder downscale while decoding, it keeps both sides at least size
+                image.draft("RGB", (size, size))
+                image = image.convert("RGB")
+            # Resize the shortest edge to size and center crop, like the CLIP processor
+            scale = size / min(image.size)
+            width, height = max(size, round(image.width * scale)), max(size, round(image.height * scale))
+            image = image.resize((width, height), Image.BICUBIC)
+            left, top = (width - size) // 2, (height - size) // 2
+            return np.asarray(image.crop((left, top, left + size, top + size))), False
+        except Exception as e:
+            self._logger.warning(f"Skipping image {img_file_path}: {str(e)}")
+            return None, False
 
-            if os.path.exists(self.persist_dir) and os.listdir(self.persist_dir):
-                print("Using the persisted value from " + self.persist_dir)
-                storage_context = StorageContext.from_defaults(persist_dir=self.persist_dir)
-                self.index = load_index_from_storage(storage_context=storage_context)
+    def initialize_index(self, force_rewrite=False):
+        try:
+            if self.image_index is not None:
+                if self._index_changed:
+                    # Replaces whatever the persist directory holds, including indexes persisted by older versions
+                    if os.path.exists(self.persist_dir) and not ClipImageIndex.exists(self.persist_dir):
+                        print("Deleting existing directory for a fresh start.")
+                        self.delete_persist_dir()
+                    self.image_index.save(self.persist_dir)
+                    torch.cuda.empty_cache()
+                    gc.collect()
+                if self._manifest_changed:
+                    ClipImageIndex.save_manifest(self.persist_dir, {"model": self.model_id, "images": self.manifest})
             else:
-                self.index = VectorStoreIndex(self.nodes)
-                self.index.storage_context.persist(persist_dir=self.persist_dir)
-                torch.cuda.empty_cache()
-                gc.collect()
-            self.retriever = self.index.as_retriever(similarity_top_k=500)
+                print("Using the persisted value from " + self.persist_dir)
+                self.image_index = ClipImageIndex.load(self.persist_dir)
+                if self.image_index is None:
+                    self._logger.error(f"No image index found in {self.persist_dir}")
+                    return False
             return True
         except Exception as e:
             self._logger.error(f"Error in initialize_index: {str(e)}")
@@ -109,6 +267,8 @@ class CLIPEmbeddingStorageEngine:
             
 
     def is_junction(self, path):
+        if os.name != "nt":
+            return False
         FILE_ATTRIBUTE_REPARSE_POINT = 0x0400
         INVALID_FILE_ATTRIBUTES = -1
         
@@ -118,62 +278,200 @@ class CLIPEmbeddingStorageEngine:
         
         return bool(attrs & FILE_ATTRIBUTE_REPARSE_POINT)
 
-    def query(self, input_text, top_matches_path, min_clip_score):
+    def embed_text(self, input_text):
+        if self.text_embedder is not None:
+            return self.text_embedder(input_text)
+        if self._clip_tokenizer is None:
+            self._clip_tokenizer = CLIPTokenizer.from_pretrained(self.model_path)
+        text_inputs = self._clip_tokenizer(input_text, padding=True, return_tensors="pt").to(self.device)
+        with torch.inference_mode():
+            return self.clip_model.get_text_features(**text_inputs).float().tolist()[0]
+
+    def query(self, input_text, top_matches_path, min_clip_score, result_mode=RESULT_MODE_COPY,
+              return_scores=False, thumbnail_size=None):
+        """
+        Find the images matching a text query.
+
+        Args:
+            input_text (str): The query text.
+            top_matches_path (str): The directory the matches are copied or linked into. Not used in "paths" mode.
+            min_clip_score (float): The minimum CLIP score (cosine similarity * 100) of a match.
+                The best match is always returned.
+            result_mode (str): "copy" copies the matched images into top_matches_path, "link" hardlinks
+                them, falling back to a symlink and then to a copy, and "paths" returns the original
+                paths, so the search cost does not depend on the image file sizes.
+            return_scores (bool): Return (path, score) tuples instead of paths.
+            thumbnail_size (int): Deliver cached thumbnails of at most this many pixels per side
+                instead of the original images.
+
+        Returns:
+            list: The delivered paths, ordered by descending score, or False when nothing matched.
+        """
         try:
-            tokenizer = CLIPTokenizer.from_pretrained(self.model_path)
-            text_inputs = tokenizer(input_text, padding=True, return_tensors="pt").to(self.device)
-            text_features = self.clip_model.get_text_features(**text_inputs)
-            test_query_bundle = QueryBundle(input_text, embedding=text_features.tolist()[0])
-            retrieval_results = self.retriever.retrieve(test_query_bundle)
-
-            # Ensure the directory for top matches exists
-            os.makedirs(top_matches_path, exist_ok=True)
-            if os.path.islink(top_matches_path) or self.is_junction(top_matches_path):
-                return False
+            if result_mode not in (self.RESULT_MODE_COPY, self.RESULT_MODE_LINK, self.RESULT_MODE_PATHS):
+                raise ValueError(f"Unsupported result mode {result_mode}")
+            # Filtered by score in the index, it always keeps at least 1 image even if the score is not very good
+            matches = self.image_index.search(self.embed_text(input_text), self.MAX_MATCHES,
+                                              min_score=min_clip_score / 100)
+
+            if result_mode != self.RESULT_MODE_PATHS:
+                # Ensure the directory for top matches exists
+                os.makedirs(top_matches_path, exist_ok=True)
+                if os.path.islink(top_matches_path) or self.is_junction(top_matches_path):
+                    return False
 
             ret_paths = []
-            matches_images_count = 0
             # Save top matched images
-            for i, res in enumerate(retrieval_results):
-                if matches_images_count > 0 and (res.get_score() * 100) < min_clip_score:
-                    # return at least 1 image even if score is not very good
-                    break
-                original_full_name = os.path.basename(res.metadata['path'])
-                path = os.path.join(top_matches_path, f"top_match_{i + 1}_{str(original_full_name)}")
-                shutil.copy(res.metadata['path'], path)
-                ret_paths.append(path)
-                matches_images_count += 1
+            for i, (image_path, score) in enumerate(matches):
+                source_path = self.get_thumbnail(image_path, thumbnail_size) if thumbnail_size else image_path
+                if result_mode == self.RESULT_MODE_PATHS:
+                    path = source_path
+                else:
+                    original_full_name = os.path.basename(source_path)
+                    path = os.path.join(top_matches_path, f"top_match_{i + 1}_{str(original_full_name)}")
+                    if result_mode == self.RESULT_MODE_LINK:
+                        self._link_file(source_path, path)
+                    else:
+                        shutil.copy(source_path, path)
+                ret_paths.append((path, score * 100) if return_scores else path)
             return ret_paths if ret_paths else False
         except Exception as e:
             self._logger.error(f"Error in query: {str(e)}")
             return False
 
+    def find_similar(self, image_paths, k, min_clip_score=None):
+        """
+        Find the indexed images most similar to one or more query images. Indexed query images use
+        their stored embedding, the others are embedded in one batch.
+
+        Args:
+            image_paths (str or list): A query image path, or a list of them for a batch query.
+            k (int): The maximum number of results per query image. The query image itself is not returned.
+            min_clip_score (float): The minimum CLIP score (cosine similarity * 100) of a result.
+
+        Returns:
+            list: (path, score) tuples ordered by descending score, or a list of such lists for a batch query.
+        """
+        single_query = isinstance(image_paths, str)
+        image_paths = [image_paths] if single_query else list(image_paths)
+        query_embeddings = np.zeros((len(image_paths), self.image_index.dim), dtype=np.float32)
+        missing = []
+        for i, image_path in enumerate(image_paths):
+            embedding = self.image_index.get_embedding(image_path)
+            if embedding is None:
+                missing.append(i)
+            else:
+                query_embeddings[i] = embedding
+        if missing:
+            embeddings, embedded_paths = self.embed_images([image_paths[i] for i in missing])
+            embedded = dict(zip(embedded_paths, embeddings))
+            for i in missing:
+                if image_paths[i] not in embedded:
+                    raise ValueError(f"Failed to load image {image_paths[i]}")
+                query_embeddings[i] = embedded[image_paths[i]]
+
+        # One more result, the query image itself is found when it is indexed
+        matches = self.image_index.search(query_embeddings, k + 1,
+                                          min_score=min_clip_score / 100 if min_clip_score is not None else None)
+        results = [[(path, score * 100) for path, score in query_matches if path != image_path][:k]
+                   for image_path, query_matches in zip(image_paths, matches)]
+        return results[0] if single_query else results
+
+    def find_near_duplicates(self, min_clip_score=95, batch_size=1024):
+        """
+        Group the near-duplicate images of the library, comparing all pairs in batches.
+
+        Args:
+            min_clip_score (float): The minimum CLIP score (cosine similarity * 100) of two near-duplicates.
+            batch_size (int): The number of images compared per batch.
+
+        Returns:
+            list: Clusters of at least two image paths, largest first.
+        """
+        return self.image_index.find_duplicate_clusters(min_clip_score / 100, batch_size=batch_size)
+
+    def get_thumbnail(self, image_path, size):
+        """
+        Get a JPEG thumbnail of an image, cached by content hash, so it is generated once per image
+        content and size.
+
+        Args:
+            image_path (str): The image path.
+            size (int): The maximum width and height of the thumbnail.
+
+        Returns:
+            str: The path of the cached thumbnail.
+        """
+        entry = self.manifest.get(image_path) if self.manifest else None
+        digest = entry["hash"] if entry is not None else file_hash(image_path)
+        thumbnail_path = os.path.join(self.thumbnail_dir, f"{digest}_{size}.jpg")
+        if not os.path.isfile(thumbnail_path):
+            os.makedirs(self.thumbnail_dir, exist_ok=True)
+            with Image.open(image_path) as image:
+                # Let the JPEG decoder downscale while decoding
+                image.draft("RGB", (size, size))
+                image = image.convert("RGB")
+                image.thumbnail((size, size))
+                temp_path = f"{thumbnail_path}.{os.getpid()}.tmp"
+                image.save(temp_path, format="JPEG", quality=85)
+            os.replace(temp_path, thumbnail_path)
+        return thumbnail_path
+
+    @staticmethod
+    def _link_file(source_path, link_path):
+        # Hardlinks need the same volume and symlinks may need extra privileges on Windows,
+        # copy as a last resort
+        if os.path.lexists(link_path):
+            os.remove(link_path)
+        try:
+            os.link(source_path, link_path)
+            return
+        except OSError:
+            pass
+        try:
+            os.symlink(os.path.abspath(source_path), link_path)
+            return
+        except OSError:
+            pass
+        shutil.copy(source_path, link_path)
+
 class ClipInference:
+    TEXT_EMBEDDING_CACHE_SIZE = 256
+
     def __init__(self):
         try:
             self.CLIPModel = None
             self.clip_model = None
             self.clip_processor = None
+            self.clip_tokenizer = None
+            # LRU cache of query text embeddings, keyed by normalized query, device and dtype
+            self._text_embedding_cache = OrderedDict()
+            self._text_embedding_cache_lock = threading.Lock()
             self.clip_engine = None
             self.model_path = None
             self._logger = ChatRTXLogger.get_logger()
         except Exception as e:
             raise (f"Initialization error: {str(e)}")
 
-    def load_model(self, model_path):
+    def load_model(self, model_path, device=None):
         self.model_path = model_path
         try:
-            self.clip_model = CLIPModel.from_pretrained(self.model_path).to('cuda')
+            device = device or ("cuda" if torch.cuda.is_available() else "cpu")
+            self.clip_model = CLIPModel.from_pretrained(self.model_path).to(device)
             self.clip_processor = CLIPProcessor.from_pretrained(self.model_path)
+            self.clip_tokenizer = CLIPTokenizer.from_pretrained(self.model_path)
+            with self._text_embedding_cache_lock:
+                self._text_embedding_cache.clear()
             return True
         except Exception as e:
             self._logger.error(f"Failed to init CLIP model object: Error {str(e)}")
             return False
 
-    def generate_clip_engine(self, image_data_dir, force_rewrite=True):
+    def generate_clip_engine(self, image_data_dir, force_rewrite=False):
         try:
             if self.clip_model is not None and self.clip_processor is not None:
-                self.clip_engine = CLIPEmbeddingStorageEngine(image_data_dir, self.model_path, self.clip_model, self.clip_processor)
+                self.clip_engine = CLIPEmbeddingStorageEngine(image_data_dir, self.model_path, self.clip_model,
+                                                              self.clip_processor, text_embedder=self.embed_text)
                 if not self.clip_engine.create_nodes(force_rewrite):
                     return False
                 if not self.clip_engine.initialize_index(force_rewrite):
@@ -186,14 +484,73 @@ class ClipInference:
             self._logger.error(f"Failed to generate clip engine: Error {str(e)}")
             return False
 
-    def generate_clip_response(self, input_text, top_matches_path, min_clip_score=23):
+    def embed_text(self, input_text):
+        """
+        Compute the CLIP text embedding of a query. Embeddings are cached, so repeated searches only
+        cost the vector search.
+
+        Args:
+            input_text (str): The query text.
+
+        Returns:
+            list: The text embedding.
+        """
+        # The CLIP tokenizer lower-cases and collapses whitespace itself, so this does not change the embedding
+        text = " ".join(input_text.lower().split())
+        parameter = next(self.clip_model.parameters())
+        key = (text, str(parameter.device), parameter.dtype)
+        with self._text_embedding_cache_lock:
+            embedding = self._text_embedding_cache.get(key)
+            if embedding is not None:
+                self._text_embedding_cache.move_to_end(key)
+                return embedding
+
+        text_inputs = self.clip_tokenizer(text, padding=True, return_tensors="pt").to(parameter.device)
+        with torch.inference_mode():
+            embedding = self.clip_model.get_text_features(**text_inputs).float().tolist()[0]
+        with self._text_embedding_cache_lock:
+            self._text_embedding_cache[key] = embedding
+            if len(self._text_embedding_cache) > self.TEXT_EMBEDDING_CACHE_SIZE:
+                self._text_embedding_cache.popitem(last=False)
+        return embedding
+
+    def find_similar(self, image_paths, k=10, min_clip_score=None):
+        """
+        Find the images most similar to one or more images, see CLIPEmbeddingStorageEngine.find_similar.
+        """
+        try:
+            if self.clip_engine is not None:
+                return self.clip_engine.find_similar(image_paths, k, min_clip_score)
+            self._logger.error("Clip engine is not initialized. Please call generate_clip_engine() first.")
+            return False
+        except Exception as e:
+            self._logger.error(f"Failed to find similar images: Error {str(e)}")
+            return False
+
+    def find_near_duplicates(self, min_clip_score=95, batch_size=1024):
+        """
+        Group the near-duplicate images of the library, see CLIPEmbeddingStorageEngine.find_near_duplicates.
+        """
+        try:
+            if self.clip_engine is not None:
+                return self.clip_engine.find_near_duplicates(min_clip_score, batch_size)
+            self._logger.error("Clip engine is not initialized. Please call generate_clip_engine() first.")
+            return False
+        except Exception as e:
+            self._logger.error(f"Failed to find near duplicate images: Error {str(e)}")
+            return False
+
+    def generate_clip_response(self, input_text, top_matches_path, min_clip_score=23,
+                               result_mode=CLIPEmbeddingStorageEngine.RESULT_MODE_COPY, return_scores=False,
+                               thumbnail_size=None):
         try:
             # Check if the directory exists, if not, create it
-            if not os.path.exists(top_matches_path):
+            if result_mode != CLIPEmbeddingStorageEngine.RESULT_MODE_PATHS and not os.path.exists(top_matches_path):
                 os.makedirs(top_matches_path)
 
             if self.clip_engine is not None:
-                result = self.clip_engine.query(input_text, top_matches_path, min_clip_score)
+                result = self.clip_engine.query(input_text, top_matches_path, min_clip_score, result_mode=result_mode,
+                                                return_scores=return_scores, thumbnail_size=thumbnail_size)
                 return result if result else False
             else:
                 self._logger.error("Clip engine is not initialized. Please call generate_clip_engine() first.")
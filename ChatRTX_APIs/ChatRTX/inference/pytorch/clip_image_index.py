@@ -0,0 +1,248 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import hashlib
+import faiss
+import numpy as np
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Hash the content of a file.
+
+    Args:
+        path (str): The file path.
+        chunk_size (int): The number of bytes read at a time.
+
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ClipImageIndex:
+    """
+    FAISS inner product index over L2-normalized CLIP image embeddings, so search scores are
+    cosine similarities. Image paths are kept in a table next to the vectors, row i of the FAISS
+    index belongs to paths[i]. Both are saved in binary form.
+    """
+    INDEX_FILE = "clip_image_index.faiss"
+    PATHS_FILE = "clip_image_paths.npy"
+    MANIFEST_FILE = "clip_manifest.json"
+
+    def __init__(self, dim):
+        """
+        Initialize an empty ClipImageIndex.
+
+        Args:
+            dim (int): The dimension of the CLIP embeddings.
+        """
+        self._index = faiss.IndexFlatIP(dim)
+        self._paths = []
+        self._rows = None
+
+    @property
+    def dim(self):
+        return self._index.d
+
+    @property
+    def paths(self):
+        return self._paths
+
+    def add(self, embeddings, paths):
+        """
+        Add image embeddings.
+
+        Args:
+            embeddings (np.ndarray): Array of shape (number of images, dim).
+            paths (list): The image path of each row.
+        """
+        if len(paths) != len(embeddings):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(paths)} paths")
+        if len(paths) == 0:
+            return
+        self._index.add(self._normalize(embeddings))
+        self._paths.extend(paths)
+        self._rows = None
+
+    def embeddings(self):
+        """
+        Returns:
+            np.ndarray: The normalized embeddings of all images, row i belongs to paths[i].
+        """
+        return self._index.reconstruct_n(0, self._index.ntotal)
+
+    def get_embedding(self, path):
+        """
+        Get the stored embedding of an image.
+
+        Args:
+            path (str): The image path.
+
+        Returns:
+            np.ndarray: The normalized embedding, or None if the image is not indexed.
+        """
+        if self._rows is None:
+            self._rows = {image_path: row for row, image_path in enumerate(self._paths)}
+        row = self._rows.get(path)
+        return self._index.reconstruct(row) if row is not None else None
+
+    def find_duplicate_clusters(self, min_score, batch_size=1024):
+        """
+        Group near-duplicate images. All pairs are compared with batched FAISS range searches, and
+        pairs scoring at least min_score are joined into clusters with union-find.
+
+        Args:
+            min_score (float): The minimum cosine similarity of two near-duplicates.
+            batch_size (int): The number of images searched per batch.
+
+        Returns:
+            list: Clusters of at least two image paths, largest first.
+        """
+        parents = np.arange(self._index.ntotal)
+
+        def find(row):
+            while parents[row] != row:
+                parents[row] = parents[parents[row]]
+                row = parents[row]
+            return row
+
+        for start in range(0, self._index.ntotal, batch_size):
+            embeddings = self._index.reconstruct_n(start, min(batch_size, self._index.ntotal - start))
+            # Range search returns the results with a score above the radius
+            limits, _, rows = self._index.range_search(embeddings, np.nextafter(np.float32(min_score), np.float32(-1)))
+            for i in range(len(embeddings)):
+                query_row = find(start + i)
+                for row in rows[limits[i]:limits[i + 1]]:
+                    root = find(row)
+                    if root != query_row:
+                        parents[root] = query_row
+
+        clusters = {}
+        for row in range(self._index.ntotal):
+            clusters.setdefault(find(row), []).append(self._paths[row])
+        return sorted((cluster for cluster in clusters.values() if len(cluster) > 1), key=len, reverse=True)
+
+    def search(self, query_embeddings, k, min_score=None):
+        """
+        Find the images most similar to one or more query embeddings.
+
+        Args:
+            query_embeddings (np.ndarray): A query embedding, or an array of shape (number of queries, dim).
+            k (int): The maximum number of results per query.
+            min_score (float): Results below this cosine similarity are dropped, but the best result
+                is always kept.
+
+        Returns:
+            list: (path, score) tuples ordered by descending score. A list of such lists for a batch of queries.
+        """
+        query_embeddings = np.asarray(query_embeddings, dtype=np.float32)
+        single_query = query_embeddings.ndim == 1
+        k = min(k, self._index.ntotal)
+        if k == 0:
+            return [] if single_query else [[] for _ in range(len(np.atleast_2d(query_embeddings)))]
+
+        scores, rows = self._index.search(self._normalize(np.atleast_2d(query_embeddings)), k)
+        results = []
+        for query_scores, query_rows in zip(scores, rows):
+            keep = query_rows >= 0
+            if min_score is not None:
+                keep &= query_scores >= min_score
+                keep[0] = query_rows[0] >= 0
+            results.append([(self._paths[row], float(score)) for row, score in zip(query_rows[keep], query_scores[keep])])
+        return results[0] if single_query else results
+
+    def save(self, persist_dir):
+        """
+        Save the index into persist_dir.
+
+        Args:
+            persist_dir (str): The persistence directory.
+        """
+        os.makedirs(persist_dir, exist_ok=True)
+        faiss.write_index(self._index, os.path.join(persist_dir, self.INDEX_FILE))
+        # Paths cannot contain NUL, so they are stored as one NUL separated UTF-8 blob
+        blob = np.frombuffer("\0".join(self._paths).encode("utf-8"), dtype=np.uint8)
+        np.save(os.path.join(persist_dir, self.PATHS_FILE), blob)
+
+    @classmethod
+    def exists(cls, persist_dir):
+        return all(os.path.isfile(os.path.join(persist_dir, name)) for name in (cls.INDEX_FILE, cls.PATHS_FILE))
+
+    @classmethod
+    def load(cls, persist_dir):
+        """
+        Load an index saved with save.
+
+        Args:
+            persist_dir (str): The persistence directory.
+
+        Returns:
+            ClipImageIndex: The index, or None if persist_dir does not contain one.
+        """
+        if not cls.exists(persist_dir):
+            return None
+        faiss_index = faiss.read_index(os.path.join(persist_dir, cls.INDEX_FILE))
+        blob = np.load(os.path.join(persist_dir, cls.PATHS_FILE))
+        image_index = cls(faiss_index.d)
+        image_index._index = faiss_index
+        image_index._paths = blob.tobytes().decode("utf-8").split("\0") if faiss_index.ntotal else []
+        image_index._rows = None
+        return image_index
+
+    @classmethod
+    def load_manifest(cls, persist_dir):
+        """
+        Load the manifest of the indexed images.
+
+        Args:
+            persist_dir (str): The persistence directory.
+
+        Returns:
+            dict: {"model": model id, "images": {path: {"size", "mtime_ns", "hash"}}}, or None if
+            persist_dir does not contain a valid manifest.
+        """
+        try:
+            with open(os.path.join(persist_dir, cls.MANIFEST_FILE), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    @classmethod
+    def save_manifest(cls, persist_dir, manifest):
+        os.makedirs(persist_dir, exist_ok=True)
+        with open(os.path.join(persist_dir, cls.MANIFEST_FILE), "w", encoding="utf-8") as file:
+            json.dump(manifest, file)
+
+    @staticmethod
+    def _normalize(embeddings):
+        embeddings = np.array(embeddings, dtype=np.float32, order="C", ndmin=2)
+        faiss.normalize_L2(embeddings)
+        return embeddings
+
+    def __len__(self):
+        return self._index.ntotal
@@ -0,0 +1,125 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import json
+import threading
+import numpy as np
+
+
+class ClipPixelCache:
+    """
+    On-disk cache of images preprocessed to the CLIP input size, keyed by the content hash of the
+    image file. Pixels are stored as uint8 rows of shape (size, size, 3) in one flat file that is
+    read through a memory map, and a JSON file maps each hash to its row. Embedding images again,
+    e.g. with another CLIP model, then reads the pixels instead of decoding the originals.
+    """
+    PIXELS_FILE = "pixels_{size}.u8"
+    INDEX_FILE = "pixels_{size}.json"
+
+    def __init__(self, cache_dir, size):
+        """
+        Initialize the ClipPixelCache, loading the rows cached so far.
+
+        Args:
+            cache_dir (str): The cache directory.
+            size (int): The width and height of the cached images.
+        """
+        self.size = size
+        self._pixels_path = os.path.join(cache_dir, self.PIXELS_FILE.format(size=size))
+        self._index_path = os.path.join(cache_dir, self.INDEX_FILE.format(size=size))
+        self._row_bytes = size * size * 3
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._pixels = None
+        self._dirty = False
+        os.makedirs(cache_dir, exist_ok=True)
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as file:
+                self._rows = json.load(file)
+        except (OSError, ValueError):
+            self._rows = {}
+        # Rows not completely written, e.g. after a crash, are dropped. This is done before the file
+        # is mapped, mapped files cannot be truncated on Windows.
+        num_rows = os.path.getsize(self._pixels_path) // self._row_bytes if os.path.exists(self._pixels_path) else 0
+        if num_rows and os.path.getsize(self._pixels_path) != num_rows * self._row_bytes:
+            with open(self._pixels_path, "r+b") as file:
+                file.truncate(num_rows * self._row_bytes)
+        self._rows = {digest: row for digest, row in self._rows.items() if row < num_rows}
+        self._num_rows = num_rows
+
+    def get(self, digest):
+        """
+        Get the cached pixels of an image.
+
+        Args:
+            digest (str): The content hash of the image file.
+
+        Returns:
+            np.ndarray: A read-only uint8 array of shape (size, size, 3), or None on a miss.
+        """
+        with self._lock:
+            row = self._rows.get(digest)
+            if row is None:
+                return None
+            if self._pixels is None or row >= len(self._pixels):
+                self._pixels = np.memmap(self._pixels_path, dtype=np.uint8, mode="r",
+                                         shape=(self._num_rows, self.size, self.size, 3))
+            return self._pixels[row]
+
+    def put(self, digest, pixels):
+        """
+        Cache the pixels of an image.
+
+        Args:
+            digest (str): The content hash of the image file.
+            pixels (np.ndarray): A uint8 array of shape (size, size, 3).
+        """
+        pixels = np.ascontiguousarray(pixels, dtype=np.uint8)
+        if pixels.shape != (self.size, self.size, 3):
+            raise ValueError(f"Expected pixels of shape {(self.size, self.size, 3)}, got {pixels.shape}")
+        with self._lock:
+            if digest in self._rows:
+                return
+            with open(self._pixels_path, "ab") as file:
+                file.write(pixels.tobytes())
+            self._rows[digest] = self._num_rows
+            self._num_rows += 1
+            self._dirty = True
+
+    def flush(self):
+        """
+        Save the row index, so the rows added since the last flush are found by later runs.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            temp_path = f"{self._index_path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as file:
+                json.dump(self._rows, file)
+            os.replace(temp_path, self._index_path)
+            self._dirty = False
+
+    def __contains__(self, digest):
+        return digest in self._rows
+
+    def __len__(self):
+        return len(self._rows)
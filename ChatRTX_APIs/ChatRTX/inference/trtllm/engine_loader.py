@@ -0,0 +1,88 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import mmap
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+import psutil
+
+from ChatRTX.logger import ChatRTXLogger
+
+
+def map_engine_file(engine_path):
+    """
+    Map a serialized TensorRT engine read-only instead of reading it into a bytes object, so loading
+    does not hold a second copy of the engine in host memory and the pages are read as TensorRT
+    deserializes them.
+
+    Args:
+        engine_path: Path of the engine file.
+
+    Returns:
+        memoryview: The engine bytes. TensorRT takes it wherever it takes the bytes of an engine. The
+        mapping is released once the last reference to the view is gone.
+    """
+    with open(engine_path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise ValueError(f"Engine file {engine_path} is empty")
+        # the mapping stays valid after the file is closed
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped)
+
+
+def peak_rss_bytes():
+    """
+    Returns the peak resident set size of this process in bytes, None when the platform does not
+    report it.
+    """
+    memory_info = psutil.Process().memory_info()
+    if hasattr(memory_info, 'peak_wset'):
+        # Windows
+        return memory_info.peak_wset
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+@contextmanager
+def log_engine_load(name):
+    """
+    Log how long loading an engine took and the peak RSS of the process after it.
+
+    Args:
+        name: What is loaded, for the log message.
+    """
+    logger = ChatRTXLogger.get_logger()
+    start_time = time.perf_counter()
+    peak_before = peak_rss_bytes()
+    yield
+    peak_after = peak_rss_bytes()
+    message = f"Loaded {name} in {time.perf_counter() - start_time:.2f}s"
+    if peak_after is not None:
+        message += f", peak RSS {peak_after / 2**20:.0f} MB (+{(peak_after - peak_before) / 2**20:.0f} MB)"
+    logger.info(message)
@@ -20,11 +20,14 @@
 # DEALINGS IN THE SOFTWARE.
 
 import gc
+import json
+import os
 import torch
 import tensorrt_llm
 from typing import Any, Optional
 from tensorrt_llm.runtime import ModelRunner, ModelRunnerCpp
 from tensorrt_llm.logger import logger
+from ChatRTX.inference.trtllm.engine_loader import log_engine_load, map_engine_file
 from ChatRTX.inference.trtllm.utils import (DEFAULT_HF_MODEL_DIRS, load_tokenizer, read_model_name, throttle_generator)
 from ChatRTX.logger import ChatRTXLogger
 
@@ -85,11 +88,39 @@ class TrtLlm():
                                  lora_ckpt_source='hf')
             if not use_py_session:
                 runner_kwargs.update(free_gpu_memory_fraction = 0.5)
-            self._model = runner_cls.from_dir(**runner_kwargs)
+            with log_engine_load(f"TRT-LLM engine {model_path}"):
+                self._model = self._create_runner(runner_cls, runner_kwargs)
         except Exception as e:
             self._logger.error(f"Fail to create TRT-LLM object for model: {model_path}. \n Error: {str(e)}")
             raise Exception(f"Fail to create TRT-LLM object for model: {model_path}. \n Error: {str(e)}")
 
+    def _create_runner(self, runner_cls, runner_kwargs):
+        """
+        Creates the model runner. The Python session runner is built from a memory-mapped engine
+        where the engine directory and this TensorRT-LLM support it, otherwise from_dir reads the
+        engine into memory.
+        """
+        engine_dir = runner_kwargs['engine_dir']
+        rank = runner_kwargs['rank']
+        config_path = os.path.join(engine_dir, 'config.json')
+        with open(config_path, 'r') as f:
+            # engines from the legacy build scripts have no pretrained_config
+            mappable = 'pretrained_config' in json.load(f)
+        if runner_cls is not ModelRunner or not mappable or not hasattr(ModelRunner, 'from_engine'):
+            return runner_cls.from_dir(**runner_kwargs)
+        try:
+            from tensorrt_llm.builder import Engine, EngineConfig
+            config = EngineConfig.from_json_file(config_path)
+            config.pretrained_config.set_rank(rank)
+            engine = Engine(config, map_engine_file(os.path.join(engine_dir, f'rank{rank}.engine')))
+            return ModelRunner.from_engine(engine,
+                                           rank=rank,
+                                           debug_mode=runner_kwargs['debug_mode'],
+                                           lora_ckpt_source=runner_kwargs['lora_ckpt_source'])
+        except Exception as e:
+            self._logger.warning(f"Could not load the memory-mapped engine, reading it instead. Error: {str(e)}")
+            return runner_cls.from_dir(**runner_kwargs)
+
     def get_model_name(self):
         if self._model is not None:
             return self._model_name
@@ -101,6 +132,12 @@ class TrtLlm():
         """Get class name."""
         return "TrtLlm"
 
+    def count_tokens(self, text: str) -> int:
+        """
+        Returns the number of tokens of the text with the model tokenizer, excluding special tokens.
+        """
+        return len(self._tokenizer.encode(text, add_special_tokens=False))
+
     def print_output(self, tokenizer, output_ids, input_lengths, sequence_lengths):
         """
         Processes the model output to convert output_ids to human-readable text.
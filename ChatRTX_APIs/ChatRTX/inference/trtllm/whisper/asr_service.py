@@ -0,0 +1,194 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+import time
+
+from ChatRTX.inference.trtllm.whisper.trt_whisper import WhisperTRTLLM, decode_audio_file
+from ChatRTX.logger import ChatRTXLogger
+
+
+class WhisperASRService:
+    """
+    Keeps a WhisperTRTLLM model resident between utterances. The model is loaded in the background,
+    callers wait on a readiness event instead of polling, and the model is unloaded once it has been
+    idle for idle_timeout_seconds to hand the video memory back.
+    """
+
+    def __init__(self,
+                 engine_dir,
+                 assets_dir,
+                 idle_timeout_seconds=300,
+                 load_timeout_seconds=60):
+        """
+        Args:
+            engine_dir: Directory of the Whisper encoder and decoder engines.
+            assets_dir: Directory of the tokenizer and mel filter assets.
+            idle_timeout_seconds: Seconds without a transcription after which the model is unloaded.
+                None keeps the model loaded until unload is called, 0 unloads it after every transcription.
+            load_timeout_seconds: Seconds transcribe waits for the model to finish loading.
+        """
+        self._logger = ChatRTXLogger.get_logger()
+        self.engine_dir = engine_dir
+        self.assets_dir = assets_dir
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.load_timeout_seconds = load_timeout_seconds
+        self._model = None
+        self._load_error = None
+        self._loading = False
+        self._in_use = 0
+        self._last_used = time.monotonic()
+        self._idle_timer = None
+        # set once a load finished, successfully or not, cleared while loading and after unloading
+        self._ready = threading.Event()
+        # guards the model state, never held while loading or transcribing
+        self._lock = threading.Lock()
+        # the decoder session runs one batch at a time
+        self._inference_lock = threading.Lock()
+
+    @property
+    def is_loaded(self):
+        return self._model is not None
+
+    def load(self, wait=False):
+        """
+        Start loading the model in the background unless it is loaded or loading already.
+
+        Args:
+            wait: Block until the model is loaded.
+
+        Returns:
+            True, or with wait the outcome of wait_until_ready.
+        """
+        with self._lock:
+            self._cancel_idle_timer()
+            self._last_used = time.monotonic()
+            if self._model is None and not self._loading:
+                self._loading = True
+                self._load_error = None
+                self._ready.clear()
+                threading.Thread(target=self._load, name="whisper-asr-loader", daemon=True).start()
+        if wait:
+            return self.wait_until_ready()
+        return True
+
+    def _load(self):
+        model, error = None, None
+        start_time = time.perf_counter()
+        try:
+            model = WhisperTRTLLM(self.engine_dir, assets_dir=self.assets_dir)
+            self._logger.info(f"Whisper model loaded in {time.perf_counter() - start_time:.2f}s")
+        except Exception as e:
+            self._logger.error(f"Error in loading the Whisper model. Exception {e}")
+            error = e
+        with self._lock:
+            self._model = model
+            self._load_error = error
+            self._loading = False
+            self._last_used = time.monotonic()
+            self._ready.set()
+            # with a zero timeout the model waits for its first transcription
+            if model is not None and self.idle_timeout_seconds != 0:
+                self._schedule_idle_unload()
+
+    def wait_until_ready(self, timeout=None):
+        """
+        Wait for a load started by load to finish.
+
+        Returns:
+            True when the model is loaded, False when loading failed or timed out.
+        """
+        timeout = self.load_timeout_seconds if timeout is None else timeout
+        if not self._ready.wait(timeout):
+            self._logger.error(f"Whisper model loading not finished even after {timeout} seconds")
+            return False
+        return self._model is not None
+
+    def transcribe(self, audio, language="english"):
+        """
+        Transcribe audio, loading the model first if it was unloaded.
+
+        Args:
+            audio: A .wav path or a 16 kHz waveform.
+            language: "english" or "chinese".
+
+        Returns:
+            The transcript.
+        """
+        self.load()
+        if not self.wait_until_ready():
+            raise Exception(f"Whisper model is not available: {self._load_error}")
+        with self._lock:
+            model = self._model
+            if model is None:
+                raise Exception("Whisper model was unloaded before the transcription started")
+            self._in_use += 1
+            self._cancel_idle_timer()
+        try:
+            with self._inference_lock:
+                return decode_audio_file(audio, model, language=language, mel_filters_dir=self.assets_dir)
+        finally:
+            with self._lock:
+                self._in_use -= 1
+                self._last_used = time.monotonic()
+                self._schedule_idle_unload()
+
+    def unload(self):
+        """
+        Unload the model now. A later transcribe loads it again.
+
+        Returns:
+            False when the model is in use or loading and was left alone.
+        """
+        return self._unload(idle_only=False)
+
+    def _unload(self, idle_only):
+        with self._lock:
+            if idle_only and time.monotonic() - self._last_used < (self.idle_timeout_seconds or 0):
+                # used again after the timer was started
+                return False
+            self._cancel_idle_timer()
+            if self._in_use or self._loading:
+                return False
+            model, self._model = self._model, None
+            self._ready.clear()
+        if model is not None:
+            model.unload_model()
+            self._logger.info("Whisper model unloaded")
+        return True
+
+    def _schedule_idle_unload(self):
+        # called with self._lock held
+        if self.idle_timeout_seconds is None or self._in_use or self._model is None:
+            return
+        self._cancel_idle_timer()
+        if self.idle_timeout_seconds <= 0:
+            threading.Thread(target=self._unload, args=(True,), daemon=True).start()
+            return
+        self._idle_timer = threading.Timer(self.idle_timeout_seconds, self._unload, args=(True,))
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _cancel_idle_timer(self):
+        # called with self._lock held
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
@@ -23,7 +23,7 @@ import os
 import time
 
 import torch
-from weight import load_decoder_weight, load_encoder_weight
+from weight import CastParams, load_checkpoint, load_decoder_weight, load_encoder_weight
 
 import tensorrt_llm
 from tensorrt_llm import str_dtype_to_torch, str_dtype_to_trt
@@ -88,6 +88,11 @@ def parse_arguments():
     parser.add_argument('--max_input_len', type=int, default=14)
     parser.add_argument('--max_output_len', type=int, default=100)
     parser.add_argument('--max_beam_width', type=int, default=4)
+    parser.add_argument(
+        '--weight_workers',
+        type=int,
+        default=None,
+        help='Threads converting the layer weights. Defaults to the CPU count, at most 4.')
     parser.add_argument(
         '--use_gpt_attention_plugin',
         nargs='?',
@@ -186,11 +191,9 @@ def parse_arguments():
 
 def build_encoder(model, args):
     model_metadata = model['dims']
-    model_params = model['model_state_dict']
-
-    # cast params according dtype
-    for k, v in model_params.items():
-        model_params[k] = v.to(str_dtype_to_torch(args.dtype))
+    # params are cast to dtype one at a time while the weights are loaded
+    model_params = CastParams(model['model_state_dict'],
+                              str_dtype_to_torch(args.dtype))
 
     builder = Builder()
 
@@ -226,9 +229,12 @@ def build_encoder(model, args):
             tensorrt_llm_whisper_encoder, args.quant_mode)
     use_gemm_woq_plugin = args.use_gemm_plugin and args.use_weight_only
 
-    load_encoder_weight(tensorrt_llm_whisper_encoder, model_metadata,
-                        model_params, model_metadata['n_audio_layer'],
-                        use_gemm_woq_plugin)
+    load_encoder_weight(tensorrt_llm_whisper_encoder,
+                        model_metadata,
+                        model_params,
+                        model_metadata['n_audio_layer'],
+                        use_gemm_woq_plugin,
+                        num_workers=args.weight_workers)
 
     network = builder.create_network()
     network.plugin_config.to_legacy_setting()
@@ -271,11 +277,9 @@ def build_encoder(model, args):
 def build_decoder(model, args):
 
     model_metadata = model['dims']
-    model_params = model['model_state_dict']
-
-    # cast params according dtype
-    for k, v in model_params.items():
-        model_params[k] = v.to(str_dtype_to_torch(args.dtype))
+    # params are cast to dtype one at a time while the weights are loaded
+    model_params = CastParams(model['model_state_dict'],
+                              str_dtype_to_torch(args.dtype))
 
     builder = Builder()
 
@@ -337,8 +341,10 @@ def build_decoder(model, args):
             tensorrt_llm_whisper_decoder, args.quant_mode)
     use_gemm_woq_plugin = args.use_gemm_plugin and args.use_weight_only
 
-    load_decoder_weight(tensorrt_llm_whisper_decoder, model_params,
-                        use_gemm_woq_plugin)
+    load_decoder_weight(tensorrt_llm_whisper_decoder,
+                        model_params,
+                        use_gemm_woq_plugin,
+                        num_workers=args.weight_workers)
 
     network = builder.create_network()
     network.plugin_config.to_legacy_setting()
@@ -386,7 +392,7 @@ def run_build(args):
     if not os.path.exists(args.output_dir):
         os.makedirs(args.output_dir)
     model_path = os.path.join(args.model_dir, args.model_name + '.pt')
-    model = torch.load(model_path)
+    model = load_checkpoint(model_path, str_dtype_to_torch(args.dtype))
     build_encoder(model, args)
     build_decoder(model, args)
 
@@ -18,6 +18,10 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
+import os
+import time
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -53,14 +57,119 @@ def trans_weight(weight):
     return np.ascontiguousarray(weight)
 
 
+def load_checkpoint(model_path, dtype: torch.dtype):
+    """
+    Load a Whisper checkpoint for the conversion to dtype. A checkpoint already in dtype is
+    memory-mapped, its tensors are read as they are converted and never copied. Any other
+    checkpoint is read into memory and cast in place, so each original is freed as soon as its
+    cast exists. Mapped, the originals would stay resident next to the casts.
+    """
+    try:
+        model = torch.load(model_path, map_location='cpu', mmap=True)
+        if all(v.dtype == dtype for v in model['model_state_dict'].values()):
+            return model
+    except (TypeError, RuntimeError):
+        # torch without mmap support, or a checkpoint in the legacy format
+        pass
+    # release the mapping before reading the checkpoint
+    model = None
+    model = torch.load(model_path, map_location='cpu')
+    model_params = model['model_state_dict']
+    for k, v in model_params.items():
+        model_params[k] = v.to(dtype)
+    return model
+
+
+class CastParams(Mapping):
+    """
+    Read-only view of a checkpoint state dict that casts each tensor to dtype when it is read,
+    instead of casting the whole checkpoint up front. A tensor that already has the dtype is
+    returned as is, so only the tensor being converted is ever copied.
+    """
+
+    def __init__(self, params: dict, dtype: torch.dtype):
+        self._params = params
+        self.dtype = dtype
+
+    def __getitem__(self, name):
+        return self._params[name].to(self.dtype)
+
+    def __iter__(self):
+        return iter(self._params)
+
+    def __len__(self):
+        return len(self._params)
+
+    def fuse(self, names):
+        """
+        Concatenate the tensors along dim 0, casting them while they are copied into the result.
+        A None name gives zeros shaped like the first tensor, for the missing key bias.
+        """
+        tensors = [self._params[name] for name in names if name is not None]
+        rows = tensors[0].shape[0]
+        fused = torch.empty((rows * len(names), *tensors[0].shape[1:]), dtype=self.dtype)
+        for i, name in enumerate(names):
+            if name is None:
+                fused[i * rows:(i + 1) * rows].zero_()
+            else:
+                fused[i * rows:(i + 1) * rows].copy_(self._params[name])
+        return fused
+
+
+def load_linear_weight(linear,
+                       weight: torch.Tensor,
+                       use_weight_only,
+                       plugin_weight_only_quant_type=None,
+                       use_gemm_woq_plugin=True,
+                       param_dtype='float16'):
+    if not use_weight_only:
+        linear.weight.value = weight.numpy()
+        return
+    transposed = weight.t().contiguous()
+    processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
+        transposed, plugin_weight_only_quant_type)
+    if not use_gemm_woq_plugin:
+        linear.weight.value = transposed.numpy().astype(str_dtype_to_np(param_dtype))
+    else:
+        linear.weight.value = processed_torch_weights.numpy()
+    linear.per_channel_scale.value = torch_weight_scales.numpy()
+
+
+def _as_params(model_params, dtype):
+    if isinstance(model_params, CastParams):
+        return model_params
+    return CastParams(model_params, dtype or next(iter(model_params.values())).dtype)
+
+
+DEFAULT_WEIGHT_WORKERS = 4
+
+
+def _map_layers(load_layer, n_layer, num_workers):
+    # the tensor copies, casts and quantization release the GIL, so layers convert in parallel.
+    # Every worker holds the temporaries of a layer, more than a few add memory, not speed
+    if num_workers is None:
+        num_workers = min(DEFAULT_WEIGHT_WORKERS, os.cpu_count() or 1)
+    if num_workers <= 1:
+        for i in range(n_layer):
+            load_layer(i)
+        return
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        list(executor.map(load_layer, range(n_layer)))
+
+
 def load_encoder_weight(tensorrt_llm_whisper,
                         model_metadata: dict,
                         model_params: dict,
                         n_layer: int,
-                        use_gemm_woq_plugin=True):
+                        use_gemm_woq_plugin=True,
+                        dtype: torch.dtype = None,
+                        num_workers: int = None):
     tensorrt_llm.logger.info('Loading encoder weights from PT...')
+    tik = time.time()
+    model_params = _as_params(model_params, dtype)
 
     quant_mode = getattr(tensorrt_llm_whisper, 'quant_mode', QuantMode(0))
+    plugin_weight_only_quant_type = None
     if quant_mode.is_int8_weight_only():
         plugin_weight_only_quant_type = torch.int8
     elif quant_mode.is_int4_weight_only():
@@ -70,6 +179,11 @@ def load_encoder_weight(tensorrt_llm_whisper,
 
     param_dtype = 'float16'
 
+    def load_linear(linear, weight):
+        load_linear_weight(linear, weight, use_weight_only,
+                           plugin_weight_only_quant_type, use_gemm_woq_plugin,
+                           param_dtype)
+
     tensorrt_llm_whisper.positional_embedding.value = sinusoids(
         model_metadata['n_audio_ctx'], model_metadata['n_audio_state']).numpy()
 
@@ -82,149 +196,67 @@ def load_encoder_weight(tensorrt_llm_whisper,
     tensorrt_llm_whisper.conv2.bias.value = model_params[
         'encoder.conv2.bias'].numpy()
 
-    for i in range(n_layer):
-        tensorrt_llm_whisper.encoder_layers[
-            i].attention_layernorm.weight.value = model_params[
-                'encoder.blocks.' + str(i) + '.attn_ln.weight'].numpy()
-        tensorrt_llm_whisper.encoder_layers[
-            i].attention_layernorm.bias.value = model_params[
-                'encoder.blocks.' + str(i) + '.attn_ln.bias'].numpy()
-
-        t = torch.cat([
-            model_params['encoder.blocks.' + str(i) + '.attn.query.weight'],
-            model_params['encoder.blocks.' + str(i) + '.attn.key.weight'],
-            model_params['encoder.blocks.' + str(i) + '.attn.value.weight']
-        ],
-                      dim=0).numpy()
-
-        if t is not None:
-            dst = tensorrt_llm_whisper.encoder_layers[i].attention.qkv.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = tensorrt_llm_whisper.encoder_layers[
-                    i].attention.qkv.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-
-        bias_shape = model_params['encoder.blocks.' + str(i) +
-                                  '.attn.query.bias'].shape
-        dtype = model_params['encoder.blocks.' + str(i) +
-                             '.attn.query.bias'].dtype
-        fused_bias = torch.cat([
-            model_params['encoder.blocks.' + str(i) + '.attn.query.bias'],
-            torch.zeros([*bias_shape], dtype=dtype),
-            model_params['encoder.blocks.' + str(i) + '.attn.value.bias']
-        ],
-                               dim=0).numpy()
-        tensorrt_llm_whisper.encoder_layers[
-            i].attention.qkv.bias.value = fused_bias
-
-        t = trans_weight(model_params['encoder.blocks.' + str(i) +
-                                      '.attn.out.weight'].numpy())
-        if t is not None:
-            dst = tensorrt_llm_whisper.encoder_layers[i].attention.dense.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = tensorrt_llm_whisper.encoder_layers[
-                    i].attention.dense.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-        tensorrt_llm_whisper.encoder_layers[
-            i].attention.dense.bias.value = trans_weight(
-                model_params['encoder.blocks.' + str(i) +
-                             '.attn.out.bias'].numpy())
-
-        tensorrt_llm_whisper.encoder_layers[
-            i].mlp_layernorm.weight.value = model_params[
-                'encoder.blocks.' + str(i) + '.mlp_ln.weight'].numpy()
-        tensorrt_llm_whisper.encoder_layers[
-            i].mlp_layernorm.bias.value = model_params['encoder.blocks.' +
-                                                       str(i) +
-                                                       '.mlp_ln.bias'].numpy()
-
-        t = trans_weight(model_params['encoder.blocks.' + str(i) +
-                                      '.mlp.0.weight'].numpy())
-        if t is not None:
-            dst = tensorrt_llm_whisper.encoder_layers[i].mlp.fc.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = tensorrt_llm_whisper.encoder_layers[
-                    i].mlp.fc.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-        tensorrt_llm_whisper.encoder_layers[i].mlp.fc.bias.value = trans_weight(
-            model_params['encoder.blocks.' + str(i) + '.mlp.0.bias'].numpy())
-
-        t = trans_weight(model_params['encoder.blocks.' + str(i) +
-                                      '.mlp.2.weight'].numpy())
-        if t is not None:
-            dst = tensorrt_llm_whisper.encoder_layers[i].mlp.proj.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = tensorrt_llm_whisper.encoder_layers[
-                    i].mlp.proj.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-        tensorrt_llm_whisper.encoder_layers[
-            i].mlp.proj.bias.value = trans_weight(
-                model_params['encoder.blocks.' + str(i) +
-                             '.mlp.2.bias'].numpy())
+    def load_layer(i):
+        prefix = 'encoder.blocks.' + str(i) + '.'
+        layer = tensorrt_llm_whisper.encoder_layers[i]
+
+        layer.attention_layernorm.weight.value = model_params[
+            prefix + 'attn_ln.weight'].numpy()
+        layer.attention_layernorm.bias.value = model_params[
+            prefix + 'attn_ln.bias'].numpy()
+
+        load_linear(
+            layer.attention.qkv,
+            model_params.fuse([
+                prefix + 'attn.query.weight', prefix + 'attn.key.weight',
+                prefix + 'attn.value.weight'
+            ]))
+        # the key projection has no bias
+        layer.attention.qkv.bias.value = model_params.fuse(
+            [prefix + 'attn.query.bias', None,
+             prefix + 'attn.value.bias']).numpy()
+
+        load_linear(layer.attention.dense,
+                    model_params[prefix + 'attn.out.weight'])
+        layer.attention.dense.bias.value = trans_weight(
+            model_params[prefix + 'attn.out.bias'].numpy())
+
+        layer.mlp_layernorm.weight.value = model_params[
+            prefix + 'mlp_ln.weight'].numpy()
+        layer.mlp_layernorm.bias.value = model_params[prefix +
+                                                      'mlp_ln.bias'].numpy()
+
+        load_linear(layer.mlp.fc, model_params[prefix + 'mlp.0.weight'])
+        layer.mlp.fc.bias.value = trans_weight(
+            model_params[prefix + 'mlp.0.bias'].numpy())
+
+        load_linear(layer.mlp.proj, model_params[prefix + 'mlp.2.weight'])
+        layer.mlp.proj.bias.value = trans_weight(
+            model_params[prefix + 'mlp.2.bias'].numpy())
+
+    _map_layers(load_layer, n_layer, num_workers)
 
     tensorrt_llm_whisper.ln_post.weight.value = model_params[
         'encoder.ln_post.weight'].numpy()
     tensorrt_llm_whisper.ln_post.bias.value = model_params[
         'encoder.ln_post.bias'].numpy()
-
-
-def fuse_qkv(q, k, v):
-    qkv_weight = np.concatenate((q, k, v))
-    return qkv_weight
+    tensorrt_llm.logger.info(
+        f'Encoder weights loaded in {time.time() - tik:.2f}s')
 
 
 def load_decoder_weight(tllm_model,
                         model_params: dict,
-                        use_gemm_woq_plugin=True):
+                        use_gemm_woq_plugin=True,
+                        dtype: torch.dtype = None,
+                        num_workers: int = None):
     tensorrt_llm.logger.info('Loading decoder weights from PT...')
+    tik = time.time()
+    model_params = _as_params(model_params, dtype)
 
     quant_mode = getattr(tllm_model, 'quant_mode', QuantMode(0))
     param_dtype = 'float16'
 
+    plugin_weight_only_quant_type = None
     if quant_mode.is_int8_weight_only():
         plugin_weight_only_quant_type = torch.int8
     elif quant_mode.is_int4_weight_only():
@@ -233,75 +265,40 @@ def load_decoder_weight(tllm_model,
 
     use_int8_kv_cache = quant_mode.has_int8_kv_cache()
 
-    tllm_model.embedding.vocab_embedding.weight.value = trans_weight(
-        model_params['decoder.token_embedding.weight'].numpy())
-    tllm_model.lm_head.weight.value = trans_weight(
+    def load_linear(linear, weight):
+        load_linear_weight(linear, weight, use_weight_only,
+                           plugin_weight_only_quant_type, use_gemm_woq_plugin,
+                           param_dtype)
+
+    # the embedding is tied to the lm head, cast it once for both. Each parameter
+    # gets its own buffer, so neither can change the other's weights
+    token_embedding = trans_weight(
         model_params['decoder.token_embedding.weight'].numpy())
+    tllm_model.embedding.vocab_embedding.weight.value = token_embedding
+    tllm_model.lm_head.weight.value = token_embedding.copy()
     if tllm_model.embedding.position_embedding:
         tllm_model.embedding.position_embedding.weight.value = trans_weight(
             model_params['decoder.positional_embedding'].numpy())
 
-    for i in range(tllm_model.num_layers):
+    def load_layer(i):
+        prefix = 'decoder.blocks.' + str(i) + '.'
         layer = tllm_model.decoder_layers[i]
 
-        t = torch.cat([
-            model_params['decoder.blocks.' + str(i) + '.attn.query.weight'],
-            model_params['decoder.blocks.' + str(i) + '.attn.key.weight'],
-            model_params['decoder.blocks.' + str(i) + '.attn.value.weight']
-        ],
-                      dim=0).numpy()
-
-        if t is not None:
-            dst = layer.self_attention.qkv.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = layer.self_attention.qkv.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-
-        t = trans_weight(model_params['decoder.blocks.' + str(i) +
-                                      '.attn.out.weight'].numpy())
-
-        if t is not None:
-            dst = layer.self_attention.dense.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = layer.self_attention.dense.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
+        load_linear(
+            layer.self_attention.qkv,
+            model_params.fuse([
+                prefix + 'attn.query.weight', prefix + 'attn.key.weight',
+                prefix + 'attn.value.weight'
+            ]))
+        load_linear(layer.self_attention.dense,
+                    model_params[prefix + 'attn.out.weight'])
 
         if tllm_model.has_attention_qkvo_bias:
-            bias_shape = model_params['decoder.blocks.' + str(i) +
-                                      '.attn.query.bias'].shape
-            dtype = model_params['decoder.blocks.' + str(i) +
-                                 '.attn.query.bias'].dtype
-            layer.self_attention.qkv.bias.value = fuse_qkv(
-                trans_weight(model_params['decoder.blocks.' + str(i) +
-                                          '.attn.query.bias'].numpy()),
-                torch.zeros([*bias_shape], dtype=dtype).numpy(),
-                trans_weight(model_params['decoder.blocks.' + str(i) +
-                                          '.attn.value.bias'].numpy()))
+            layer.self_attention.qkv.bias.value = model_params.fuse(
+                [prefix + 'attn.query.bias', None,
+                 prefix + 'attn.value.bias']).numpy()
             layer.self_attention.dense.bias.value = trans_weight(
-                model_params['decoder.blocks.' + str(i) +
-                             '.attn.out.bias'].numpy())
+                model_params[prefix + 'attn.out.bias'].numpy())
 
         if use_int8_kv_cache:
             t = fromfile(
@@ -310,74 +307,27 @@ def load_decoder_weight(tllm_model,
             layer.self_attention.kv_cache_scaling_factor.value = t
 
         layer.self_attention_layernorm.weight.value = trans_weight(
-            model_params['decoder.blocks.' + str(i) +
-                         '.attn_ln.weight'].numpy())
+            model_params[prefix + 'attn_ln.weight'].numpy())
         layer.self_attention_layernorm.bias.value = trans_weight(
-            model_params['decoder.blocks.' + str(i) + '.attn_ln.bias'].numpy())
-
-        t = torch.cat([
-            model_params['decoder.blocks.' + str(i) +
-                         '.cross_attn.query.weight'],
-            model_params['decoder.blocks.' + str(i) + '.cross_attn.key.weight'],
-            model_params['decoder.blocks.' + str(i) +
-                         '.cross_attn.value.weight']
-        ],
-                      dim=0).numpy()
-
-        if t is not None:
-            dst = layer.cross_attention.qkv.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = layer.cross_attention.qkv.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-
-        t = trans_weight(model_params['decoder.blocks.' + str(i) +
-                                      '.cross_attn.out.weight'].numpy())
-
-        if t is not None:
-            dst = layer.cross_attention.dense.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = layer.cross_attention.dense.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
+            model_params[prefix + 'attn_ln.bias'].numpy())
+
+        load_linear(
+            layer.cross_attention.qkv,
+            model_params.fuse([
+                prefix + 'cross_attn.query.weight',
+                prefix + 'cross_attn.key.weight',
+                prefix + 'cross_attn.value.weight'
+            ]))
+        load_linear(layer.cross_attention.dense,
+                    model_params[prefix + 'cross_attn.out.weight'])
 
         if tllm_model.has_attention_qkvo_bias:
-            bias_shape = model_params['decoder.blocks.' + str(i) +
-                                      '.cross_attn.query.bias'].shape
-            dtype = model_params['decoder.blocks.' + str(i) +
-                                 '.cross_attn.query.bias'].dtype
-            cross_attn_qkv_bias = fuse_qkv(
-                trans_weight(model_params['decoder.blocks.' + str(i) +
-                                          '.cross_attn.query.bias'].numpy()),
-                torch.zeros([*bias_shape], dtype=dtype).numpy(),
-                trans_weight(model_params['decoder.blocks.' + str(i) +
-                                          '.cross_attn.value.bias'].numpy()))
-
-            layer.cross_attention.qkv.bias.value = cross_attn_qkv_bias
-
+            layer.cross_attention.qkv.bias.value = model_params.fuse([
+                prefix + 'cross_attn.query.bias', None,
+                prefix + 'cross_attn.value.bias'
+            ]).numpy()
             layer.cross_attention.dense.bias.value = trans_weight(
-                model_params['decoder.blocks.' + str(i) +
-                             '.cross_attn.out.bias'].numpy())
+                model_params[prefix + 'cross_attn.out.bias'].numpy())
 
         if use_int8_kv_cache:
             t = fromfile(
@@ -386,67 +336,30 @@ def load_decoder_weight(tllm_model,
             layer.self_attention.kv_cache_scaling_factor.value = t
 
         layer.cross_attention_layernorm.weight.value = trans_weight(
-            model_params['decoder.blocks.' + str(i) +
-                         '.cross_attn_ln.weight'].numpy())
+            model_params[prefix + 'cross_attn_ln.weight'].numpy())
         layer.cross_attention_layernorm.bias.value = trans_weight(
-            model_params['decoder.blocks.' + str(i) +
-                         '.cross_attn_ln.bias'].numpy())
-
-        t = trans_weight(model_params['decoder.blocks.' + str(i) +
-                                      '.mlp.0.weight'].numpy())
-
-        if t is not None:
-            dst = layer.mlp.fc.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = layer.mlp.fc.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
-
-        t = trans_weight(model_params['decoder.blocks.' + str(i) +
-                                      '.mlp.2.weight'].numpy())
-
-        if t is not None:
-            dst = layer.mlp.proj.weight
-            if use_weight_only:
-                processed_torch_weights, torch_weight_scales = torch.ops.trtllm.symmetric_quantize_last_axis_of_batched_matrix(
-                    torch.tensor(np.ascontiguousarray(t.transpose(1, 0))),
-                    plugin_weight_only_quant_type)
-                if not use_gemm_woq_plugin:
-                    dst.value = torch.tensor(
-                        np.ascontiguousarray(t.transpose(1, 0))).numpy().astype(
-                            str_dtype_to_np(param_dtype))
-                else:
-                    dst.value = processed_torch_weights.numpy()
-                scales = layer.mlp.proj.per_channel_scale
-                scales.value = torch_weight_scales.numpy()
-            else:
-                dst.value = t
+            model_params[prefix + 'cross_attn_ln.bias'].numpy())
+
+        load_linear(layer.mlp.fc, model_params[prefix + 'mlp.0.weight'])
+        load_linear(layer.mlp.proj, model_params[prefix + 'mlp.2.weight'])
 
         if tllm_model.has_mlp_bias:
             layer.mlp.fc.bias.value = trans_weight(
-                model_params['decoder.blocks.' + str(i) +
-                             '.mlp.0.bias'].numpy())
+                model_params[prefix + 'mlp.0.bias'].numpy())
             layer.mlp.proj.bias.value = trans_weight(
-                model_params['decoder.blocks.' + str(i) +
-                             '.mlp.2.bias'].numpy())
+                model_params[prefix + 'mlp.2.bias'].numpy())
 
         layer.mlp_layernorm.weight.value = trans_weight(
-            model_params['decoder.blocks.' + str(i) + '.mlp_ln.weight'].numpy())
+            model_params[prefix + 'mlp_ln.weight'].numpy())
         layer.mlp_layernorm.bias.value = trans_weight(
-            model_params['decoder.blocks.' + str(i) + '.mlp_ln.bias'].numpy())
+            model_params[prefix + 'mlp_ln.bias'].numpy())
+
+    _map_layers(load_layer, tllm_model.num_layers, num_workers)
 
     if tllm_model.final_layernorm:
         tllm_model.final_layernorm.weight.value = trans_weight(
             model_params['decoder.ln.weight'].numpy())
         tllm_model.final_layernorm.bias.value = trans_weight(
             model_params['decoder.ln.bias'].numpy())
+    tensorrt_llm.logger.info(
+        f'Decoder weights loaded in {time.time() - tik:.2f}s')
@@ -18,16 +18,25 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
+import hashlib
 import json
 import re
 import time
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 
+import numpy as np
 import torch
 from datasets import load_dataset
 from torch.utils.data import DataLoader
-from ChatRTX.inference.trtllm.whisper.whisper_utils import log_mel_spectrogram
+from ChatRTX.inference.trtllm.whisper.whisper_utils import (N_SAMPLES, load_audio,
+                                                            log_mel_spectrogram, log_mel_spectrogram_batch,
+                                                            mel_filters, transcribe_long_audio,
+                                                            trim_silence)
+from ChatRTX.inference.trtllm.whisper.whisper_streaming import StreamingTranscriber
+from ChatRTX.inference.trtllm.engine_loader import log_engine_load, map_engine_file
 import tensorrt_llm
 import tensorrt_llm.logger as logger
 from tensorrt_llm._utils import (str_dtype_to_torch, str_dtype_to_trt,
@@ -143,6 +152,53 @@ LANGUAGES = {
     "yue": "cantonese",
 }
 
+RANKS_CACHE_SUFFIX = ".ranks.bin"
+_RANKS_CACHE_MAGIC = b"TKRANKS1"
+
+
+def load_tiktoken_ranks(vocab_path):
+    """
+    Load the token ranks of a .tiktoken vocab. Parsing the base64 lines is slow, so the ranks are
+    also written next to the vocab in a binary cache (token lengths, ranks and the concatenated
+    token bytes) holding a hash of the vocab. The cache is used while the hash matches.
+    """
+    with open(vocab_path, 'rb') as f:
+        content = f.read()
+    digest = hashlib.blake2b(content, digest_size=16).digest()
+    cache_path = vocab_path + RANKS_CACHE_SUFFIX
+    header_size = len(_RANKS_CACHE_MAGIC) + len(digest) + 4
+    try:
+        with open(cache_path, 'rb') as f:
+            cached = f.read()
+        if cached[:header_size - 4] == _RANKS_CACHE_MAGIC + digest:
+            n = int.from_bytes(cached[header_size - 4:header_size], 'little')
+            lengths = np.frombuffer(cached, dtype='<u4', count=n, offset=header_size)
+            ranks = np.frombuffer(cached, dtype='<u4', count=n, offset=header_size + 4 * n)
+            offsets = (header_size + 8 * n + np.concatenate([[0], np.cumsum(lengths, dtype=np.int64)])).tolist()
+            return {cached[start:end]: rank for start, end, rank in zip(offsets, offsets[1:], ranks.tolist())}
+    except (OSError, ValueError):
+        pass
+
+    ranks = {
+        base64.b64decode(token): int(rank)
+        for token, rank in (line.split() for line in content.decode().splitlines() if line)
+    }
+    try:
+        tokens = list(ranks)
+        temp_path = cache_path + ".tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(_RANKS_CACHE_MAGIC + digest + len(tokens).to_bytes(4, 'little'))
+            f.write(np.array([len(token) for token in tokens], dtype='<u4').tobytes())
+            f.write(np.array(list(ranks.values()), dtype='<u4').tobytes())
+            f.write(b"".join(tokens))
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        logger.warning(f'Could not write the tokenizer cache {cache_path}: {e}')
+    return ranks
+
+
+# the Encoding is immutable, so reloads of the model share it
+@lru_cache(maxsize=None)
 def get_tokenizer(name: str = "multilingual",
                   num_languages: int = 99,
                   tokenizer_dir: str = None):
@@ -151,10 +207,7 @@ def get_tokenizer(name: str = "multilingual",
                                   f"assets/{name}.tiktoken")
     else:
         vocab_path = os.path.join(tokenizer_dir, f"{name}.tiktoken")
-    ranks = {
-        base64.b64decode(token): int(rank)
-        for token, rank in (line.split() for line in open(vocab_path) if line)
-    }
+    ranks = load_tiktoken_ranks(vocab_path)
     n_vocab = len(ranks)
     special_tokens = {}
 
@@ -184,6 +237,13 @@ def get_tokenizer(name: str = "multilingual",
         special_tokens=special_tokens,
     )
 
+def get_text_prefix(language="english"):
+    if(language == "chinese"):
+        return "<|startoftranscript|><|zh|><|transcribe|><|notimestamps|>"
+    # supporting only chinese and english for now. defaulting to english.
+    return "<|startoftranscript|><|en|><|transcribe|><|notimestamps|>"
+
+
 class WhisperEncoding:
 
     def __init__(self, engine_dir):
@@ -201,13 +261,14 @@ class WhisperEncoding:
         num_languages = config['builder_config']['num_languages']
 
         self.dtype = dtype
+        self.max_batch_size = config['builder_config'].get('max_batch_size', 1)
         self.n_mels = n_mels
         self.num_languages = num_languages
 
         serialize_path = engine_dir / f'whisper_encoder_{self.dtype}_tp1_rank0.engine'
 
-        with open(serialize_path, 'rb') as f:
-            session = Session.from_serialized_engine(f.read())
+        with log_engine_load(f"Whisper encoder {serialize_path.name}"):
+            session = Session.from_serialized_engine(map_engine_file(serialize_path))
 
         return session
 
@@ -266,8 +327,6 @@ class WhisperDecoding:
     def get_session(self, engine_dir, runtime_mapping, debug_mode=False):
         dtype = self.decoder_config['precision']
         serialize_path = engine_dir / f'whisper_decoder_{dtype}_tp1_rank0.engine'
-        with open(serialize_path, "rb") as f:
-            decoder_engine_buffer = f.read()
 
         decoder_model_config = ModelConfig(
             max_batch_size=self.decoder_config['max_batch_size'],
@@ -285,11 +344,12 @@ class WhisperDecoding:
             has_token_type_embedding=self.
             decoder_config['has_token_type_embedding'],
         )
-        decoder_generation_session = tensorrt_llm.runtime.GenerationSession(
-            decoder_model_config,
-            decoder_engine_buffer,
-            runtime_mapping,
-            debug_mode=debug_mode)
+        with log_engine_load(f"Whisper decoder {serialize_path.name}"):
+            decoder_generation_session = tensorrt_llm.runtime.GenerationSession(
+                decoder_model_config,
+                map_engine_file(serialize_path),
+                runtime_mapping,
+                debug_mode=debug_mode)
 
         return decoder_generation_session
 
@@ -366,28 +426,127 @@ class WhisperTRTLLM(object):
         self.eot_id = self.tokenizer.encode(
             "<|endoftext|>",
             allowed_special=self.tokenizer.special_tokens_set)[0]
+        self.startofprev_id = self.tokenizer.encode(
+            "<|startofprev|>",
+            allowed_special=self.tokenizer.special_tokens_set)[0]
+        # limits the decoder engine was built with
+        self.max_batch_size = min(self.encoder.max_batch_size,
+                                  self.decoder.decoder_config.get('max_batch_size', 1))
+        self.max_input_len = self.decoder.decoder_config.get('max_input_len', 14)
+        self.max_output_len = self.decoder.decoder_config.get('max_output_len', 100)
+
+    def get_prompt_ids(self, text_prefix, prev_text=None):
+        """
+        Tokenize the decoder prompt. When prev_text is given, its last tokens are put before the
+        prefix as <|startofprev|> context, as many as the decoder's max_input_len leaves room for.
+        """
+        prompt_ids = self.tokenizer.encode(text_prefix, allowed_special=self.tokenizer.special_tokens_set)
+        context_budget = self.max_input_len - len(prompt_ids) - 1
+        if prev_text and prev_text.strip() and context_budget > 0:
+            context_ids = self.tokenizer.encode(" " + prev_text.strip())[-context_budget:]
+            prompt_ids = [self.startofprev_id] + context_ids + prompt_ids
+        return prompt_ids
+
+    def decode_batch(self,
+                     encoder_output,
+                     text_prefix,
+                     num_beams=1,
+                     max_new_tokens=96,
+                     prev_text=None):
+        prompt_ids = self.get_prompt_ids(text_prefix, prev_text)
+        batch_size = encoder_output.shape[0]
+        decoder_input_ids = torch.tensor(prompt_ids).repeat(batch_size, 1)
 
-    def process_batch(
-            self,
-            mel,
-            text_prefix,
-            num_beams=1):
-        prompt_id = self.tokenizer.encode(text_prefix, allowed_special=self.tokenizer.special_tokens_set)
-        prompt_id = torch.tensor(prompt_id)
-        batch_size = mel.shape[0]
-        decoder_input_ids = prompt_id.repeat(batch_size, 1)
-
-        encoder_output = self.encoder.get_audio_features(mel)
         output_ids = self.decoder.generate(decoder_input_ids,
                                            encoder_output,
                                            self.eot_id,
-                                           max_new_tokens=96,
+                                           max_new_tokens=min(max_new_tokens, self.max_output_len),
                                            num_beams=num_beams)
         texts = []
         for i in range(len(output_ids)):
-            text = self.tokenizer.decode(output_ids[i][0]).strip()
+            # drop the prompt so the previous text context is not repeated in the transcript
+            text = self.tokenizer.decode(output_ids[i][0][len(prompt_ids):]).strip()
             texts.append(text)
         return texts
+
+    def process_batch(
+            self,
+            mel,
+            text_prefix,
+            num_beams=1,
+            max_new_tokens=96,
+            prev_text=None):
+        encoder_output = self.encoder.get_audio_features(mel)
+        return self.decode_batch(encoder_output, text_prefix, num_beams, max_new_tokens, prev_text)
+
+    def process_long_audio(
+            self,
+            audio,
+            text_prefix,
+            num_beams=1,
+            dtype='float16',
+            mel_filters_dir=None,
+            windows=None):
+        """
+        Transcribe audio longer than the 30 seconds the encoder takes. The audio is split into
+        overlapping 30 second windows, or the given ones, batched up to the engines' max batch size,
+        and every batch is prompted with the transcript of the window before it.
+
+        Args:
+            audio: The waveform in 16 kHz as a numpy array.
+            text_prefix: The special tokens starting the transcript.
+            num_beams: The beam width.
+            dtype: The dtype the encoder engine was built with.
+            mel_filters_dir: Directory of the mel filter assets.
+            windows: (start, end) windows of up to 30 seconds, e.g. from trim_silence.
+
+        Returns:
+            The transcript, special tokens removed.
+        """
+        def encode(windows):
+            mel = log_mel_spectrogram_batch(windows, self.n_mels, device='cuda', mel_filters_dir=mel_filters_dir)
+            return self.encoder.get_audio_features(mel.type(str_dtype_to_torch(dtype)))
+
+        def decode(encoder_output, prev_text):
+            texts = self.decode_batch(encoder_output, text_prefix, num_beams,
+                                      max_new_tokens=self.max_output_len,
+                                      prev_text=re.sub(r'<\|.*?\|>', '', prev_text))
+            return [re.sub(r'<\|.*?\|>', '', text).strip() for text in texts]
+
+        return transcribe_long_audio(audio, encode, decode, self.max_batch_size, windows=windows)
+
+    def create_stream(
+            self,
+            language="english",
+            step_seconds=1.0,
+            num_beams=1,
+            dtype='float16',
+            mel_filters_dir=None):
+        """
+        Start a streaming transcription. Push PCM chunks to the returned StreamingTranscriber while
+        recording, it returns partial hypotheses every step_seconds of audio, and call finish once
+        the recording stops for the final transcript.
+
+        Args:
+            language: "english" or "chinese".
+            step_seconds: Seconds of new audio between partial hypotheses.
+            num_beams: The beam width.
+            dtype: The dtype the encoder engine was built with.
+            mel_filters_dir: Directory of the mel filter assets.
+
+        Returns:
+            A StreamingTranscriber decoding with this model.
+        """
+        text_prefix = get_text_prefix(language)
+
+        def transcribe(mel, prev_text):
+            mel = torch.from_numpy(mel).cuda().type(str_dtype_to_torch(dtype)).unsqueeze(0)
+            text = self.process_batch(mel, text_prefix, num_beams,
+                                      max_new_tokens=self.max_output_len, prev_text=prev_text)[0]
+            return re.sub(r'<\|.*?\|>', '', text).strip()
+
+        filters = mel_filters('cpu', self.n_mels, mel_filters_dir).numpy()
+        return StreamingTranscriber(transcribe, filters, step_seconds=step_seconds)
     
     def unload_model(self):
         del self.encoder
@@ -403,13 +562,28 @@ def decode_audio_file(
         batch_size=1,
         num_beams=1,
         normalizer=None,
-        mel_filters_dir=None):
-    if(language == "chinese"):
-        text_prefix="<|startoftranscript|><|zh|><|transcribe|><|notimestamps|>"
-    else:
-        # supporting only chinese and english for now. defaulting to english.
-        text_prefix="<|startoftranscript|><|en|><|transcribe|><|notimestamps|>"
-    mel, total_duration = log_mel_spectrogram(input_file_path,
+        mel_filters_dir=None,
+        long_form=True,
+        vad=True):
+    text_prefix = get_text_prefix(language)
+    audio = input_file_path
+    if isinstance(audio, (str, Path)):
+        # mono float32 at 16 kHz whatever the channels and rate of the file
+        audio = load_audio(audio)
+    windows = None
+    if vad:
+        audio, windows = trim_silence(audio)
+        if not windows:
+            # nothing was said, skip the encoder
+            return ""
+    if long_form and audio.shape[-1] > N_SAMPLES:
+        # audio past 30 seconds is transcribed in windows instead of being cut off, with vad split in the pauses
+        prediction = model.process_long_audio(audio, text_prefix, num_beams, dtype, mel_filters_dir, windows)
+        if normalizer:
+            prediction = normalizer(prediction)
+        return prediction
+
+    mel, total_duration = log_mel_spectrogram(audio,
                                               model.n_mels,
                                               device='cuda',
                                               return_duration=True,
@@ -425,4 +599,82 @@ def decode_audio_file(
     prediction = re.sub(r'<\|.*?\|>', '', prediction)
     if normalizer:
         prediction = normalizer(prediction)
-    return prediction
\ No newline at end of file
+    return prediction
+
+
+def transcribe_many(
+        input_file_paths,
+        model,
+        language="english",
+        dtype='float16',
+        num_beams=1,
+        normalizer=None,
+        mel_filters_dir=None,
+        num_workers=None,
+        vad=True):
+    """
+    Transcribe many audio files, e.g. recordings to ingest into a RAG dataset. A thread pool decodes
+    the next files and computes their mel spectrograms on the CPU while the engines run on the current
+    ones, and distinct files share encoder and decoder batches of up to the engines' max batch size.
+    Files longer than 30 seconds are transcribed on their own in overlapping windows.
+
+    Args:
+        input_file_paths: Paths of the audio files.
+        model: A loaded WhisperTRTLLM.
+        language: "english" or "chinese".
+        dtype: The dtype the encoder engine was built with.
+        num_beams: The beam width.
+        normalizer: Optional callable applied to every transcript.
+        mel_filters_dir: Directory of the mel filter assets.
+        num_workers: Threads computing the mel spectrograms. Defaults to the ThreadPoolExecutor default.
+        vad: Trim silence with trim_silence and skip files without speech.
+
+    Returns:
+        The transcripts in input order. Files that cannot be read or have no speech give an empty transcript.
+    """
+    text_prefix = get_text_prefix(language)
+    transcripts = [""] * len(input_file_paths)
+
+    def prepare(path):
+        try:
+            audio = load_audio(path)
+        except Exception as e:
+            logger.warning(f'Skipping {path}, it cannot be read: {e}')
+            return None, None, None
+        windows = None
+        if vad:
+            audio, windows = trim_silence(audio)
+            if not windows:
+                return None, None, None
+        if audio.shape[-1] > N_SAMPLES:
+            return audio, windows, None
+        return audio, windows, log_mel_spectrogram(audio, model.n_mels, device='cpu', mel_filters_dir=mel_filters_dir)
+
+    def finish(text):
+        text = re.sub(r'<\|.*?\|>', '', text).strip()
+        return normalizer(text) if normalizer else text
+
+    batches = [range(start, min(start + model.max_batch_size, len(input_file_paths)))
+               for start in range(0, len(input_file_paths), model.max_batch_size)]
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        submit = lambda batch: [executor.submit(prepare, input_file_paths[i]) for i in batch]
+        pending = submit(batches[0]) if batches else []
+        for batch_index, batch in enumerate(batches):
+            futures = pending
+            if batch_index + 1 < len(batches):
+                pending = submit(batches[batch_index + 1])
+            short = []
+            for i, future in zip(batch, futures):
+                audio, windows, mel = future.result()
+                if mel is not None:
+                    short.append((i, mel))
+                elif audio is not None:
+                    transcripts[i] = finish(model.process_long_audio(audio, text_prefix, num_beams, dtype,
+                                                                     mel_filters_dir, windows))
+            if not short:
+                continue
+            mel = torch.stack([mel for _, mel in short]).cuda().type(str_dtype_to_torch(dtype))
+            texts = model.process_batch(mel, text_prefix, num_beams)
+            for (i, _), text in zip(short, texts):
+                transcripts[i] = finish(text)
+    return transcripts
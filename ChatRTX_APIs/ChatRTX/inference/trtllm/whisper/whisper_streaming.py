@@ -0,0 +1,217 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+from collections import namedtuple
+
+import numpy as np
+
+from ChatRTX.inference.trtllm.whisper.whisper_utils import (HOP_LENGTH, N_FFT, N_FRAMES, N_SAMPLES, SAMPLE_RATE,
+                                                            WINDOW_OVERLAP, load_audio, stitch_transcripts)
+
+# text is the whole transcript so far, is_final marks text that will not be revised
+StreamingHypothesis = namedtuple("StreamingHypothesis", ["text", "is_final"])
+
+
+class StreamingMelBuffer:
+    """
+    Rolling log-Mel spectrogram of audio that arrives in chunks. Every STFT frame is computed once,
+    as soon as the samples under it have arrived, with the parameters of log_mel_spectrogram
+    (centered 400 sample Hann windows, 160 sample hop). A window that starts at the first sample
+    matches log_mel_spectrogram of the audio received so far.
+    """
+
+    def __init__(self, filters: np.ndarray, n_frames: int = N_FRAMES):
+        """
+        Args:
+            filters: The mel filterbank, shape (n_mels, N_FFT // 2 + 1).
+            n_frames: The number of frames in a window.
+        """
+        self.filters = np.asarray(filters, dtype=np.float32)
+        self.n_frames = n_frames
+        self.num_samples = 0
+        # periodic, like torch.hann_window
+        self._hann = (0.5 - 0.5 * np.cos(2 * np.pi * np.arange(N_FFT) / N_FFT)).astype(np.float32)
+        # samples received before the reflect padding of the first frame is known
+        self._head = np.zeros(0, dtype=np.float32)
+        # padded samples from the start of the first frame not computed yet
+        self._pending = None
+        # mel energies of the computed frames from frame self._frame_offset on
+        self._mel = np.zeros((self.filters.shape[0], 0), dtype=np.float32)
+        self._frame_offset = 0
+
+    @property
+    def num_frames(self):
+        """Frames computed so far, including dropped ones."""
+        return self._frame_offset + self._mel.shape[1]
+
+    def _energies(self, padded, n):
+        frames = np.lib.stride_tricks.sliding_window_view(padded[:(n - 1) * HOP_LENGTH + N_FFT], N_FFT)[::HOP_LENGTH]
+        magnitudes = np.abs(np.fft.rfft(frames * self._hann, axis=-1))**2
+        return (self.filters @ magnitudes.T.astype(np.float32)).astype(np.float32)
+
+    def append(self, samples: np.ndarray):
+        """Add 16 kHz float32 samples and compute the frames they complete."""
+        samples = np.asarray(samples, dtype=np.float32)
+        self.num_samples += len(samples)
+        if self._pending is None:
+            self._head = np.concatenate([self._head, samples])
+            if len(self._head) <= N_FFT // 2:
+                return
+            # torch.stft(center=True) reflects the first N_FFT // 2 samples
+            self._pending = np.concatenate([self._head[1:N_FFT // 2 + 1][::-1], self._head])
+            self._head = None
+        else:
+            self._pending = np.concatenate([self._pending, samples])
+        if len(self._pending) < N_FFT:
+            return
+        n = (len(self._pending) - N_FFT) // HOP_LENGTH + 1
+        self._mel = np.concatenate([self._mel, self._energies(self._pending, n)], axis=1)
+        self._pending = self._pending[n * HOP_LENGTH:]
+
+    def _tail_energies(self):
+        # frames past the computed ones, with zeros for the samples not received yet, the way
+        # log_mel_spectrogram pads the audio. They are recomputed once the samples arrive.
+        if self._pending is None:
+            head = np.pad(self._head, (0, N_FFT // 2 + 1))
+            pending = np.concatenate([head[1:N_FFT // 2 + 1][::-1], self._head])
+        else:
+            pending = self._pending
+        n = -(-len(pending) // HOP_LENGTH)
+        if n == 0:
+            return self._mel[:, :0]
+        return self._energies(np.pad(pending, (0, N_FFT)), n)
+
+    def get_window(self, start_frame: int = None):
+        """
+        Returns the normalized log-Mel spectrogram of n_frames frames from start_frame, zero padded
+        past the received audio. Defaults to the window ending at the latest audio.
+        """
+        if start_frame is None:
+            start_frame = max(0, self.num_samples // HOP_LENGTH - self.n_frames)
+        if start_frame < self._frame_offset:
+            raise ValueError(f"Frame {start_frame} was dropped, the buffer starts at frame {self._frame_offset}")
+        mel = np.zeros((self.filters.shape[0], self.n_frames), dtype=np.float32)
+        computed = self._mel[:, start_frame - self._frame_offset:][:, :self.n_frames]
+        mel[:, :computed.shape[1]] = computed
+        if computed.shape[1] < self.n_frames:
+            tail = self._tail_energies()[:, max(0, start_frame - self.num_frames):]
+            tail = tail[:, :self.n_frames - computed.shape[1]]
+            mel[:, computed.shape[1]:computed.shape[1] + tail.shape[1]] = tail
+        log_spec = np.log10(np.maximum(mel, 1e-10))
+        log_spec = np.maximum(log_spec, log_spec.max() - 8.0)
+        return (log_spec + 4.0) / 4.0
+
+    def drop_frames(self, before_frame: int):
+        """Free the frames before before_frame."""
+        drop = min(max(0, before_frame - self._frame_offset), self._mel.shape[1])
+        self._mel = self._mel[:, drop:]
+        self._frame_offset += drop
+
+
+class StreamingTranscriber:
+    """
+    Transcribes audio while it is being recorded. PCM chunks go into a StreamingMelBuffer, the
+    current 30 second window is decoded every step_seconds of new audio into a partial hypothesis,
+    and a full window is decoded one last time into final text. The next window starts
+    overlap_seconds before the end of the finalized one, and the window transcripts are stitched.
+    """
+
+    def __init__(self,
+                 transcribe_fn,
+                 filters: np.ndarray,
+                 step_seconds: float = 1.0,
+                 overlap_seconds: float = WINDOW_OVERLAP):
+        """
+        Args:
+            transcribe_fn: transcribe_fn(mel, prev_text) decodes a (n_mels, N_FRAMES) log-Mel window
+                into text. prev_text is the final text of the previous window, empty for the first.
+            filters: The mel filterbank, shape (n_mels, N_FFT // 2 + 1).
+            step_seconds: Seconds of new audio between partial hypotheses.
+            overlap_seconds: Seconds shared by consecutive windows.
+        """
+        self.transcribe_fn = transcribe_fn
+        self.mel_buffer = StreamingMelBuffer(filters)
+        self.step_samples = int(step_seconds * SAMPLE_RATE)
+        self.overlap_frames = int(overlap_seconds * SAMPLE_RATE) // HOP_LENGTH
+        self._window_start = 0
+        self._samples_since_decode = 0
+        self._final_texts = []
+
+    def _window_samples(self):
+        return self.mel_buffer.num_samples - self._window_start * HOP_LENGTH
+
+    def _hypothesis(self, text, is_final):
+        return StreamingHypothesis(stitch_transcripts(self._final_texts + [text]), is_final)
+
+    def _finalize_window(self):
+        text = self.transcribe_fn(self.mel_buffer.get_window(self._window_start),
+                                  self._final_texts[-1] if self._final_texts else "")
+        self._final_texts.append(text)
+        self._window_start += self.mel_buffer.n_frames - self.overlap_frames
+        self.mel_buffer.drop_frames(self._window_start)
+        self._samples_since_decode = 0
+
+    def push(self, pcm, sample_rate: int = SAMPLE_RATE):
+        """
+        Add a chunk of audio.
+
+        Args:
+            pcm: Samples of shape (n_samples,) or (n_samples, n_channels), float or integer PCM.
+                It is never written to, so read-only views and reused capture buffers are fine.
+            sample_rate: The sample rate of pcm. Chunks are resampled one by one, so 16 kHz input avoids
+                artifacts at the chunk borders.
+
+        Returns:
+            A StreamingHypothesis when the transcript was updated, otherwise None.
+        """
+        samples = load_audio(np.asarray(pcm), sample_rate)
+        self.mel_buffer.append(samples)
+        self._samples_since_decode += len(samples)
+        hypothesis = None
+        while self._window_samples() >= N_SAMPLES:
+            self._finalize_window()
+            hypothesis = self._hypothesis("", True)
+        if self._samples_since_decode >= self.step_samples:
+            self._samples_since_decode = 0
+            text = self.transcribe_fn(self.mel_buffer.get_window(self._window_start),
+                                      self._final_texts[-1] if self._final_texts else "")
+            hypothesis = self._hypothesis(text, False)
+        return hypothesis
+
+    def finish(self):
+        """
+        Decode the audio left after the last full window and end the stream.
+
+        Returns:
+            The final StreamingHypothesis of the whole stream.
+        """
+        if self._window_samples() > (self.overlap_frames * HOP_LENGTH if self._final_texts else 0):
+            self._finalize_window()
+        hypothesis = self._hypothesis("", True)
+        self.reset()
+        return hypothesis
+
+    def reset(self):
+        """Drop the buffered audio and transcript to start a new stream."""
+        self.mel_buffer = StreamingMelBuffer(self.mel_buffer.filters, self.mel_buffer.n_frames)
+        self._window_start = 0
+        self._samples_since_decode = 0
+        self._final_texts = []
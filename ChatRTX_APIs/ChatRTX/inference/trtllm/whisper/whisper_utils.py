@@ -18,11 +18,14 @@
 # LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
 # FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
 # DEALINGS IN THE SOFTWARE.
+import io
 import os
+import re
 from functools import lru_cache
+from math import gcd
 from pathlib import Path
 from subprocess import CalledProcessError, run
-from typing import Optional, Union
+from typing import List, Optional, Union
 
 import numpy as np
 import soundfile
@@ -38,6 +41,59 @@ N_FFT = 400
 HOP_LENGTH = 160
 CHUNK_LENGTH = 30
 N_SAMPLES = CHUNK_LENGTH * SAMPLE_RATE  # 480000 samples in a 30-second chunk
+N_FRAMES = N_SAMPLES // HOP_LENGTH  # 3000 frames in a mel spectrogram input
+WINDOW_OVERLAP = 2  # seconds shared by consecutive windows of long-form audio
+N_OVERLAP_SAMPLES = WINDOW_OVERLAP * SAMPLE_RATE
+# CJK characters are stitched one by one, other scripts word by word
+_STITCH_UNIT_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]|[^\s\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]+")
+_CJK_CHAR_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff]")
+
+def _pcm_to_float32(data):
+    # scale integer PCM to [-1, 1] the way soundfile reads it
+    if data.dtype == np.uint8:
+        return (data.astype(np.float32) - 128.0) / 128.0
+    if np.issubdtype(data.dtype, np.integer):
+        return data.astype(np.float32) / float(-np.iinfo(data.dtype).min)
+    return data.astype(np.float32, copy=False)
+
+
+def load_audio(audio, sample_rate: int = None):
+    """
+    Decode audio in memory into the mono float32 16 kHz waveform Whisper takes, without writing it back to disk.
+
+    Parameters
+    ----------
+    audio: Union[str, Path, bytes, file object, np.ndarray]
+        A .wav path, the bytes of a .wav file, an open .wav file, or a waveform of shape (n_samples,)
+        or (n_samples, n_channels)
+
+    sample_rate: int
+        The sample rate of a waveform. Ignored for .wav input, which carries its own. Defaults to 16 kHz
+
+    Returns
+    -------
+    np.ndarray, shape = (n_samples,), dtype float32
+        A new array, a waveform passed in is left untouched
+    """
+    if isinstance(audio, np.ndarray):
+        sample_rate = sample_rate or SAMPLE_RATE
+        data = audio
+    else:
+        if isinstance(audio, (bytes, bytearray, memoryview)):
+            audio = io.BytesIO(audio)
+        elif isinstance(audio, Path):
+            audio = str(audio)
+        sample_rate, data = wavfile.read(audio)
+    data = _pcm_to_float32(data)
+    if data.ndim > 1:
+        data = data.mean(axis=1, dtype=np.float32)
+    if sample_rate != SAMPLE_RATE:
+        # polyphase resampling, e.g. 48 kHz -> 16 kHz is a 1/3 decimation
+        divisor = gcd(SAMPLE_RATE, int(sample_rate))
+        data = sps.resample_poly(data, SAMPLE_RATE // divisor, int(sample_rate) // divisor).astype(np.float32)
+    # float32 16 kHz mono input reaches here as the caller's own array, never clip it in place
+    return np.clip(data, -1.0, 1.0)
+
 
 def load_audio_wav_format(wav_path):
     # make sure audio in .wav format
@@ -98,6 +154,31 @@ def mel_filters(device,
         return torch.from_numpy(f[f"mel_{n_mels}"]).to(device)
 
 
+@lru_cache(maxsize=None)
+def hann_window(device) -> torch.Tensor:
+    """
+    The STFT window, created once per device.
+    """
+    return torch.hann_window(N_FFT, device=device)
+
+
+def _log_mel(audio: torch.Tensor, n_mels: int, mel_filters_dir: str = None):
+    # audio is (n_samples,) or (batch, n_samples). Every waveform is normalized by its own maximum.
+    stft = torch.stft(audio,
+                      N_FFT,
+                      HOP_LENGTH,
+                      window=hann_window(audio.device),
+                      return_complex=True)
+    magnitudes = stft[..., :-1].abs()**2
+
+    filters = mel_filters(audio.device, n_mels, mel_filters_dir)
+    mel_spec = filters @ magnitudes
+
+    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
+    log_spec = torch.maximum(log_spec, log_spec.amax(dim=(-2, -1), keepdim=True) - 8.0)
+    return (log_spec + 4.0) / 4.0
+
+
 def log_mel_spectrogram(
     audio: Union[str, np.ndarray, torch.Tensor],
     n_mels: int,
@@ -129,49 +210,259 @@ def log_mel_spectrogram(
         A Tensor that contains the Mel spectrogram
     """
     if not torch.is_tensor(audio):
-        if isinstance(audio, str):
-            if audio.endswith('.wav'):
-                audio, _ = load_audio_wav_format(audio)
-            else:
-                audio = load_audio(audio)
+        if isinstance(audio, (str, Path)):
+            audio = load_audio(audio)
         assert isinstance(audio,
                           np.ndarray), f"Unsupported audio type: {type(audio)}"
         duration = audio.shape[-1] / SAMPLE_RATE
         audio = pad_or_trim(audio, N_SAMPLES)
-        audio = audio.astype(np.float32)
+        audio = audio.astype(np.float32, copy=False)
         audio = torch.from_numpy(audio)
 
+    else:
+        duration = audio.shape[-1] / SAMPLE_RATE
+
     if device is not None:
         audio = audio.to(device)
     if padding > 0:
         audio = F.pad(audio, (0, padding))
-    window = torch.hann_window(N_FFT).to(audio.device)
-    stft = torch.stft(audio,
-                      N_FFT,
-                      HOP_LENGTH,
-                      window=window,
-                      return_complex=True)
-    magnitudes = stft[..., :-1].abs()**2
-
-    filters = mel_filters(audio.device, n_mels, mel_filters_dir)
-    mel_spec = filters @ magnitudes
-
-    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
-    log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
-    log_spec = (log_spec + 4.0) / 4.0
+    log_spec = _log_mel(audio, n_mels, mel_filters_dir)
     if return_duration:
         return log_spec, duration
     else:
         return log_spec
-    
+
+
+def log_mel_spectrogram_batch(
+    audio: Union[List[np.ndarray], np.ndarray, torch.Tensor],
+    n_mels: int,
+    padding: int = 0,
+    device: Optional[Union[str, torch.device]] = None,
+    mel_filters_dir: str = None,
+):
+    """
+    Compute the log-Mel spectrograms of a batch of waveforms with one STFT. Each item is normalized
+    on its own, so item i equals log_mel_spectrogram(audio[i]).
+
+    Parameters
+    ----------
+    audio: Union[List[np.ndarray], np.ndarray, torch.Tensor], shape = (batch, n_samples)
+        A list of waveforms, or an array or Tensor of waveforms padded to the same length, in 16 kHz.
+        NumPy waveforms are padded or trimmed to 30 seconds like in log_mel_spectrogram
+
+    n_mels: int
+        The number of Mel-frequency filters, only 80 and 128 are supported
+
+    padding: int
+        Number of zero samples to pad to the right
+
+    device: Optional[Union[str, torch.device]]
+        If given, the audio tensor is moved to this device before STFT
+
+    Returns
+    -------
+    torch.Tensor, shape = (batch, 80 or 128, n_frames)
+    """
+    if not torch.is_tensor(audio):
+        audio = np.stack([pad_or_trim(np.asarray(waveform, dtype=np.float32), N_SAMPLES) for waveform in audio])
+        audio = torch.from_numpy(audio)
+    if device is not None:
+        audio = audio.to(device)
+    if padding > 0:
+        audio = F.pad(audio, (0, padding))
+    return _log_mel(audio, n_mels, mel_filters_dir)
+
 
 
 def process_input_audio(audio_path):
-    # Covert the audio file into required sampling rate
-    current_sampling_rate, data = wavfile.read(audio_path)
-    new_sampling_rate = 16000
-    number_of_samples = round(len(data) * float(new_sampling_rate) / current_sampling_rate)
-    data = sps.resample(data, number_of_samples)
+    # Covert the audio file into required sampling rate. Prefer load_audio, which skips the file round trip
+    data = load_audio(audio_path)
     new_file_path = os.path.join( os.path.dirname(audio_path), "whisper_audio_input.wav" )
-    wavfile.write(new_file_path, new_sampling_rate, data.astype(np.int16))
-    return new_file_path
\ No newline at end of file
+    wavfile.write(new_file_path, SAMPLE_RATE, (data * 32767).astype(np.int16))
+    return new_file_path
+
+
+def split_audio_windows(num_samples: int,
+                        window_samples: int = N_SAMPLES,
+                        overlap_samples: int = N_OVERLAP_SAMPLES):
+    """
+    Split audio into windows the encoder can take, consecutive windows sharing overlap_samples.
+
+    Returns
+    -------
+    list of (start, end) sample offsets. Audio that fits a single window gives one window.
+    """
+    if overlap_samples >= window_samples:
+        raise ValueError("The window overlap must be shorter than the window")
+    windows = []
+    start = 0
+    while True:
+        end = min(start + window_samples, num_samples)
+        windows.append((start, end))
+        if end >= num_samples:
+            return windows
+        start += window_samples - overlap_samples
+
+
+def _stitch_units(text):
+    return _STITCH_UNIT_RE.findall(text)
+
+
+def _join_units(units):
+    text = ""
+    for unit in units:
+        if text and not (_CJK_CHAR_RE.match(unit) or _CJK_CHAR_RE.match(text[-1])):
+            text += " "
+        text += unit
+    return text
+
+
+def stitch_transcripts(texts, max_overlap_units: int = 16):
+    """
+    Join the transcripts of overlapping windows. Speech in the overlap is transcribed by both
+    windows, so the longest run of words (characters for CJK) that ends one transcript and starts
+    the next is kept once. Case and punctuation are ignored when matching.
+    """
+    normalize = lambda unit: re.sub(r"[^\w]", "", unit.lower())
+    units = []
+    for text in texts:
+        new_units = _stitch_units(text)
+        overlap = 0
+        for n in range(min(max_overlap_units, len(units), len(new_units)), 0, -1):
+            if [normalize(unit) for unit in units[-n:]] == [normalize(unit) for unit in new_units[:n]]:
+                overlap = n
+                break
+        units.extend(new_units[overlap:])
+    return _join_units(units)
+
+
+def transcribe_long_audio(audio,
+                          encode_fn,
+                          decode_fn,
+                          max_batch_size: int,
+                          window_samples: int = N_SAMPLES,
+                          overlap_samples: int = N_OVERLAP_SAMPLES,
+                          windows=None):
+    """
+    Transcribe audio of any length. The audio is split into overlapping windows, which go through
+    the encoder and decoder in batches of up to max_batch_size, and the window transcripts are stitched.
+    Each batch is prompted with the transcript of the window before it.
+
+    Parameters
+    ----------
+    audio: np.ndarray, shape = (n_samples,)
+        The audio waveform in 16 kHz
+
+    encode_fn: callable
+        encode_fn(windows) takes a list of waveforms and returns the encoder output for the batch
+
+    decode_fn: callable
+        decode_fn(encoder_output, prev_text) returns the transcript of every window of the batch.
+        prev_text is the transcript of the previous window, empty for the first batch
+
+    max_batch_size: int
+        The maximum number of windows per batch
+
+    windows: list of (start, end)
+        The windows to transcribe, e.g. from speech_windows. Defaults to split_audio_windows
+
+    Returns
+    -------
+    str
+        The stitched transcript
+    """
+    if windows is None:
+        windows = split_audio_windows(len(audio), window_samples, overlap_samples)
+    texts = []
+    for i in range(0, len(windows), max_batch_size):
+        batch = [audio[start:end] for start, end in windows[i:i + max_batch_size]]
+        encoder_output = encode_fn(batch)
+        texts.extend(decode_fn(encoder_output, texts[-1] if texts else ""))
+    return stitch_transcripts(texts)
+
+
+def detect_speech(audio: np.ndarray,
+                  margin_db: float = 10.0,
+                  min_energy_db: float = -50.0,
+                  max_flatness: float = 0.4,
+                  min_speech_ms: int = 100,
+                  min_silence_ms: int = 300,
+                  pad_ms: int = 200):
+    """
+    Find the speech in a 16 kHz waveform with an energy and spectral flatness voice activity detector.
+    A 25 ms frame, every 10 ms, is speech when its energy is margin_db above the noise floor (the
+    10th percentile of the frame energies, at least min_energy_db dBFS) and its spectrum is not flat
+    like noise. Pauses shorter than min_silence_ms are bridged, regions shorter than min_speech_ms
+    dropped, and the rest padded by pad_ms on both sides.
+
+    Returns
+    -------
+    np.ndarray, shape = (n_regions, 2)
+        The start and end samples of the speech regions, empty when there is no speech
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if len(audio) < N_FFT:
+        return np.zeros((0, 2), dtype=np.int64)
+    frames = np.lib.stride_tricks.sliding_window_view(audio, N_FFT)[::HOP_LENGTH]
+    energy_db = 10.0 * np.log10(np.mean(frames**2, axis=1) + 1e-10)
+    power = np.abs(np.fft.rfft(frames * np.hanning(N_FFT).astype(np.float32), axis=1))**2 + 1e-10
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    # the threshold stays below the loudest frames so a clip that is all speech is not cut
+    threshold = min(np.percentile(energy_db, 10) + margin_db, energy_db.max() - margin_db)
+    speech = (energy_db > max(threshold, min_energy_db)) & (flatness < max_flatness)
+
+    edges = np.diff(np.concatenate([[0], speech.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+    if len(starts) == 0:
+        return np.zeros((0, 2), dtype=np.int64)
+    frame_ms = 1000 * HOP_LENGTH // SAMPLE_RATE
+    # bridge short pauses, then drop short blips
+    keep_gap = (starts[1:] - ends[:-1]) * frame_ms >= min_silence_ms
+    starts = starts[np.concatenate([[True], keep_gap])]
+    ends = ends[np.concatenate([keep_gap, [True]])]
+    long_enough = (ends - starts) * frame_ms >= min_speech_ms
+    starts, ends = starts[long_enough], ends[long_enough]
+    pad = pad_ms * SAMPLE_RATE // 1000
+    regions = np.stack([starts * HOP_LENGTH - pad, (ends - 1) * HOP_LENGTH + N_FFT + pad], axis=1)
+    return np.clip(regions, 0, len(audio))
+
+
+def speech_windows(audio: np.ndarray, max_samples: int = N_SAMPLES, **vad_kwargs):
+    """
+    Windows of up to max_samples that cover the speech in audio, for the encoder. Silence before the
+    first and after the last speech is trimmed, and long audio is split in the pauses between speech
+    regions rather than at fixed offsets. A single region longer than max_samples is split into
+    overlapping windows.
+
+    Returns
+    -------
+    list of (start, end)
+        Empty when the audio has no speech
+    """
+    windows = []
+    for start, end in detect_speech(audio, **vad_kwargs).tolist():
+        if windows and end - windows[-1][0] <= max_samples:
+            windows[-1] = (windows[-1][0], end)
+        elif end - start <= max_samples:
+            windows.append((start, end))
+        else:
+            windows.extend((start + window_start, start + window_end)
+                           for window_start, window_end in split_audio_windows(end - start, max_samples))
+    return windows
+
+
+def trim_silence(audio: np.ndarray, max_samples: int = N_SAMPLES, **vad_kwargs):
+    """
+    Cut audio to its speech, see speech_windows.
+
+    Returns
+    -------
+    The trimmed audio and its speech windows, relative to the trimmed audio. The windows are empty
+    when there is no speech
+    """
+    windows = speech_windows(audio, max_samples, **vad_kwargs)
+    if not windows:
+        return audio[:0], []
+    start = windows[0][0]
+    return audio[start:windows[-1][1]], [(window_start - start, window_end - start)
+                                         for window_start, window_end in windows]
@@ -0,0 +1,356 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".part.json"
+
+
+class DownloadProgress:
+    """
+    Byte counts of a set of downloads, shared by the threads that download them. Reports the
+    throughput to a callback at most once per interval.
+    """
+
+    def __init__(self, files_total, callback=None, interval_seconds=0.5):
+        self.files_total = files_total
+        self.files_completed = 0
+        self.total_bytes = 0
+        self.downloaded_bytes = 0
+        self._callback = callback
+        self._interval_seconds = interval_seconds
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+        self._session_bytes = 0
+        self._last_report = 0.0
+        self._window_start = self._start_time
+        self._window_bytes = 0
+        self._speed = 0.0
+
+    def add_file(self, size, downloaded):
+        with self._lock:
+            self.total_bytes += size or 0
+            self.downloaded_bytes += downloaded
+
+    def update(self, num_bytes):
+        with self._lock:
+            self.downloaded_bytes += num_bytes
+            self._session_bytes += num_bytes
+            self._window_bytes += num_bytes
+        self._report()
+
+    def file_completed(self):
+        with self._lock:
+            self.files_completed += 1
+        self._report(force=True)
+
+    def stats(self):
+        """
+        Returns:
+            dict: Downloaded and total bytes, the current and average speed in bytes per second,
+                the estimated seconds left and the file counts.
+        """
+        with self._lock:
+            now = time.monotonic()
+            window = now - self._window_start
+            if window >= 1.0:
+                self._speed = self._window_bytes / window
+                self._window_start = now
+                self._window_bytes = 0
+            elapsed = now - self._start_time
+            average_speed = self._session_bytes / elapsed if elapsed > 0 else 0.0
+            speed = self._speed or average_speed
+            remaining = max(self.total_bytes - self.downloaded_bytes, 0)
+            return {
+                "downloaded_bytes": self.downloaded_bytes,
+                "total_bytes": self.total_bytes,
+                "speed_bytes_per_second": round(speed),
+                "average_speed_bytes_per_second": round(average_speed),
+                "eta_seconds": round(remaining / speed, 1) if speed > 0 and self.total_bytes else None,
+                "elapsed_seconds": round(elapsed, 1),
+                "files_completed": self.files_completed,
+                "files_total": self.files_total,
+            }
+
+    def _report(self, force=False):
+        if self._callback is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_report < self._interval_seconds:
+                return
+            self._last_report = now
+        try:
+            self._callback(self.stats())
+        except Exception as e:
+            print(f"Download progress callback failed: {e}")
+
+
+class _PartFile:
+    """
+    A file being downloaded: the <destination>.part file the segments are written into, and the
+    <destination>.part.json state with the progress of every segment, which a later download
+    resumes from.
+    """
+
+    def __init__(self, url, destination, size, accepts_ranges):
+        self.url = url
+        self.destination = destination
+        self.part_path = destination + PART_SUFFIX
+        self.state_path = destination + STATE_SUFFIX
+        self.size = size
+        self.accepts_ranges = accepts_ranges
+        self.segments = []
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+
+    def plan(self, num_segments, min_segment_size):
+        """Resume the saved segments when they are for the same file, otherwise start over."""
+        if self.accepts_ranges and self._load_state():
+            return
+        if self.accepts_ranges and self.size:
+            count = max(1, min(num_segments, math.ceil(self.size / min_segment_size)))
+            segment_size = math.ceil(self.size / count)
+            self.segments = [[start, min(start + segment_size, self.size), start]
+                             for start in range(0, self.size, segment_size)]
+        else:
+            # no ranges, no resume: one stream from the start
+            self.segments = [[0, self.size, 0]]
+        with open(self.part_path, 'wb') as f:
+            if self.size:
+                f.truncate(self.size)
+        self.save_state(force=True)
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            if (state["url"] != self.url or state["size"] != self.size
+                    or os.path.getsize(self.part_path) != self.size):
+                return False
+            self.segments = [list(segment) for segment in state["segments"]]
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    @property
+    def downloaded(self):
+        with self._lock:
+            return sum(position - start for start, _, position in self.segments)
+
+    def advance(self, index, num_bytes):
+        with self._lock:
+            self.segments[index][2] += num_bytes
+        self.save_state()
+
+    def save_state(self, force=False):
+        if not self.accepts_ranges:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_save < 1.0:
+                return
+            self._last_save = now
+            state = {"url": self.url, "size": self.size, "segments": [list(s) for s in self.segments]}
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.state_path)
+
+    def finish(self):
+        if self.size and os.path.getsize(self.part_path) != self.size:
+            raise IOError(f"Downloaded size of {self.part_path} does not match {self.size} bytes")
+        os.replace(self.part_path, self.destination)
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+
+
+class DownloadManager:
+    """
+    Downloads files over HTTP with a pooled requests.Session. Files are downloaded concurrently,
+    and a file from a server that accepts ranges is split into segments downloaded over parallel
+    connections. Each file is written to <destination>.part, which an interrupted download, in this
+    or a later run, resumes from.
+    """
+
+    def __init__(self, max_files=2, segments_per_file=4, min_segment_size=16 * 1024 * 1024,
+                 chunk_size=1024 * 1024, retries=5, timeout_seconds=30, progress_callback=None):
+        """
+        Args:
+            max_files (int): Files downloaded at the same time.
+            segments_per_file (int): Connections used for one file.
+            min_segment_size (int): Files are not split into segments smaller than this.
+            chunk_size (int): Bytes read from a response at a time.
+            retries (int): Attempts for a segment that keeps failing before the download fails.
+                A segment resumes from where the failed attempt stopped.
+            timeout_seconds (float): Connect and read timeout of a request.
+            progress_callback (callable): Called with DownloadProgress.stats() as bytes arrive.
+        """
+        self.max_files = max_files
+        self.segments_per_file = segments_per_file
+        self.min_segment_size = min_segment_size
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.timeout_seconds = timeout_seconds
+        self.progress_callback = progress_callback
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_files, pool_maxsize=max_files * segments_per_file)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def download(self, files):
+        """
+        Download files, skipping the ones already complete.
+
+        Args:
+            files (list): (url, destination) pairs.
+
+        Returns:
+            dict: True or False for every destination, whether it was downloaded.
+        """
+        progress = DownloadProgress(len(files), self.progress_callback)
+        with ThreadPoolExecutor(max_workers=self.max_files) as executor:
+            futures = {destination: executor.submit(self._download_file, url, destination, progress)
+                       for url, destination in files}
+        results = {}
+        for destination, future in futures.items():
+            try:
+                future.result()
+                results[destination] = True
+            except Exception as e:
+                print(f"Download failed for {destination}. Error: {e}")
+                results[destination] = False
+        return results
+
+    def _probe(self, url):
+        """
+        Returns:
+            tuple: The size of the file, None when unknown, and whether the server accepts ranges.
+        """
+        with self.session.get(url, headers={"Range": "bytes=0-0"}, stream=True,
+                              timeout=self.timeout_seconds) as r:
+            r.raise_for_status()
+            content_range = r.headers.get("Content-Range", "")
+            if r.status_code == 206 and "/" in content_range:
+                size = content_range.rsplit("/", 1)[1]
+                if size.isdigit():
+                    return int(size), True
+            size = r.headers.get("Content-Length")
+            return (int(size) if size and size.isdigit() else None), False
+
+    def _download_file(self, url, destination, progress):
+        size, accepts_ranges = self._with_retries(lambda: self._probe(url), destination)
+        if size is not None and os.path.isfile(destination) and os.path.getsize(destination) == size:
+            print(f"{destination} is already downloaded")
+            progress.add_file(size, size)
+            progress.file_completed()
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(destination)), exist_ok=True)
+        part = _PartFile(url, destination, size, accepts_ranges)
+        part.plan(self.segments_per_file, self.min_segment_size)
+        resumed = part.downloaded
+        if resumed:
+            print(f"Resuming {destination} at {resumed} of {size} bytes")
+        progress.add_file(size, resumed)
+
+        failed = threading.Event()
+        pending = [i for i, (_, end, position) in enumerate(part.segments) if end is None or position < end]
+        try:
+            if len(pending) == 1:
+                self._download_segment(part, pending[0], progress, failed)
+            elif pending:
+                with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+                    futures = [executor.submit(self._download_segment, part, i, progress, failed) for i in pending]
+                for future in futures:
+                    future.result()
+        finally:
+            part.save_state(force=True)
+        part.finish()
+        progress.file_completed()
+
+    def _download_segment(self, part, index, progress, failed):
+        def attempt():
+            start, end, position = part.segments[index]
+            if end is not None and position >= end:
+                return
+            headers = {}
+            if part.accepts_ranges:
+                headers["Range"] = f"bytes={position}-{end - 1}"
+            elif position:
+                # the server cannot resume, start over
+                progress.update(-position)
+                part.segments[index][2] = 0
+                position = 0
+            with self.session.get(part.url, headers=headers, stream=True, timeout=self.timeout_seconds) as r:
+                r.raise_for_status()
+                if part.accepts_ranges and r.status_code != 206:
+                    raise IOError(f"Server ignored the range request for {part.url}")
+                with open(part.part_path, 'r+b') as f:
+                    f.seek(position)
+                    for data in r.iter_content(self.chunk_size):
+                        if failed.is_set():
+                            return
+                        if end is not None:
+                            data = data[:end - position]
+                        f.write(data)
+                        f.flush()
+                        position += len(data)
+                        part.advance(index, len(data))
+                        progress.update(len(data))
+                        if end is not None and position >= end:
+                            break
+            if end is not None and position < end and not failed.is_set():
+                raise IOError(f"Connection closed at byte {position} of segment {start}-{end}")
+
+        try:
+            self._with_retries(attempt, part.destination, failed)
+        except Exception:
+            failed.set()
+            raise
+
+    def _with_retries(self, fn, destination, failed=None):
+        for attempt in range(self.retries):
+            try:
+                return fn()
+            except (requests.RequestException, IOError) as e:
+                if (failed is not None and failed.is_set()) or attempt == self.retries - 1:
+                    raise
+                delay = min(2 ** attempt, 30)
+                print(f"Download of {destination} interrupted ({e}), retrying in {delay} s")
+                time.sleep(delay)
@@ -0,0 +1,242 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+from importlib import metadata
+
+ENGINE_CACHE_DIR = ".engine_cache"
+MANIFEST_FILE = "manifest.json"
+STATS_FILE = "stats.json"
+TIMING_CACHE_DIR = "timing_caches"
+DEFAULT_MAX_ENTRIES = 4
+
+
+def toolchain_version():
+    """
+    Returns a string identifying what an engine is built with and for: the TensorRT-LLM and TensorRT
+    versions and the GPU. Engines are not portable across any of them.
+    """
+    versions = []
+    for package in ("tensorrt_llm", "tensorrt"):
+        try:
+            versions.append(f"{package}=={metadata.version(package)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{package}==unknown")
+    try:
+        from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetName
+        nvmlInit()
+        gpu_name = nvmlDeviceGetName(nvmlDeviceGetHandleByIndex(0))
+        versions.append(gpu_name.decode() if isinstance(gpu_name, bytes) else gpu_name)
+    except Exception:
+        versions.append("gpu=unknown")
+    return ";".join(versions)
+
+
+def _file_sha256(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1024 * 1024):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _link_or_copy(src, dst):
+    if os.path.exists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class EngineBuildCache:
+    """
+    Content-addressed cache of built TRT-LLM engines. An entry is keyed by the checksums of the
+    checkpoint files, the engine build command and the toolchain, and holds hardlinks to the engine
+    files, so a re-install after a delete, or another user of the machine, restores the engine
+    instead of rebuilding it. The cache also keeps a timing cache per toolchain that every build
+    starts from.
+
+    Restored engine files share their inode with the entry, so the engine files of a model are
+    unlinked before it is built again (see unlink_engine_files) rather than overwritten in place.
+    Entries outlive the deletion of their model, the cache is bounded by max_entries alone.
+    """
+
+    def __init__(self, cache_dir, max_entries=DEFAULT_MAX_ENTRIES):
+        """
+        Args:
+            cache_dir (str): Directory of the cache.
+            max_entries (int): Entries kept, the least recently used ones are evicted first.
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self._stats_lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def get_key(self, checkpoint_checksums, build_command, toolchain=None):
+        """
+        Args:
+            checkpoint_checksums (dict): Checksum of every checkpoint file, by file name.
+            build_command (str): The engine build command, before the directories are filled in.
+            toolchain (str): See toolchain_version. Computed when not given.
+
+        Returns:
+            str: The cache key.
+        """
+        content = json.dumps({
+            "checkpoints": checkpoint_checksums,
+            "build_command": build_command,
+            "toolchain": toolchain or toolchain_version(),
+        }, sort_keys=True)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def timing_cache_path(self, toolchain=None):
+        """Path of the shared timing cache of the toolchain. It may not exist yet."""
+        toolchain_key = hashlib.sha256((toolchain or toolchain_version()).encode()).hexdigest()[:16]
+        return os.path.join(self.cache_dir, TIMING_CACHE_DIR, f"{toolchain_key}.cache")
+
+    def _read_manifest(self, key):
+        try:
+            with open(os.path.join(self._entry_dir(key), MANIFEST_FILE), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _entry_keys(self):
+        return [name for name in os.listdir(self.cache_dir)
+                if os.path.isfile(os.path.join(self.cache_dir, name, MANIFEST_FILE))]
+
+    def _remove_entry(self, key):
+        shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+
+    def restore(self, key, engine_dir):
+        """
+        Hardlink the cached engine files into engine_dir. The files are checked against the sha256
+        digests in the manifest first, an entry that does not match is removed.
+
+        Returns:
+            bool: True on a hit, False when there is no complete entry for the key.
+        """
+        entry_dir = self._entry_dir(key)
+        manifest = self._read_manifest(key)
+        if manifest is None:
+            return False
+        try:
+            for file_name, digest in manifest["files"].items():
+                if _file_sha256(os.path.join(entry_dir, file_name)) != digest:
+                    print(f"Engine build cache entry {key} does not match its manifest, removing it")
+                    self._remove_entry(key)
+                    return False
+        except (OSError, KeyError, AttributeError):
+            self._remove_entry(key)
+            return False
+        os.makedirs(engine_dir, exist_ok=True)
+        for file_name in manifest["files"]:
+            _link_or_copy(os.path.join(entry_dir, file_name), os.path.join(engine_dir, file_name))
+        # the manifest time orders the entries for eviction
+        os.utime(os.path.join(entry_dir, MANIFEST_FILE))
+        return True
+
+    @staticmethod
+    def unlink_engine_files(engine_dir):
+        """
+        Remove the files of engine_dir before an engine is built into it. A build writes its files
+        in place, which would change a cache entry hardlinked to them.
+        """
+        if not os.path.isdir(engine_dir):
+            return
+        for file_name in os.listdir(engine_dir):
+            path = os.path.join(engine_dir, file_name)
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def store(self, key, engine_dir, timing_cache_file=None, toolchain=None):
+        """
+        Add the files of a built engine to the cache, and its timing cache to the shared one.
+        Failures are reported and leave the cache without the entry. Evicts the least recently
+        used entries over max_entries.
+        """
+        entry_dir = self._entry_dir(key)
+        temp_dir = entry_dir + ".tmp"
+        try:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            os.makedirs(temp_dir)
+            files = {}
+            for file_name in os.listdir(engine_dir):
+                path = os.path.join(engine_dir, file_name)
+                if os.path.isfile(path) and path != timing_cache_file:
+                    _link_or_copy(path, os.path.join(temp_dir, file_name))
+                    files[file_name] = _file_sha256(path)
+            # written last, an entry without a manifest is incomplete
+            with open(os.path.join(temp_dir, MANIFEST_FILE), 'w') as f:
+                json.dump({"files": files}, f, indent=4)
+            self._remove_entry(key)
+            os.replace(temp_dir, entry_dir)
+        except OSError as e:
+            print(f"Failed to add the engine to the build cache: {e}")
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self.evict()
+        if timing_cache_file and os.path.exists(timing_cache_file):
+            shared_timing_cache = self.timing_cache_path(toolchain)
+            try:
+                os.makedirs(os.path.dirname(shared_timing_cache), exist_ok=True)
+                # a copy, the builds of other models update the shared one
+                shutil.copyfile(timing_cache_file, shared_timing_cache + ".tmp")
+                os.replace(shared_timing_cache + ".tmp", shared_timing_cache)
+            except OSError as e:
+                print(f"Failed to update the shared timing cache: {e}")
+
+    def evict(self):
+        """Remove the least recently used entries over max_entries."""
+        keys = sorted(self._entry_keys(),
+                      key=lambda k: os.path.getmtime(os.path.join(self._entry_dir(k), MANIFEST_FILE)))
+        for key in keys[:max(len(keys) - self.max_entries, 0)]:
+            print(f"Evicting engine build cache entry {key}")
+            self._remove_entry(key)
+
+    def record(self, hit):
+        """
+        Count a hit or a miss.
+
+        Returns:
+            dict: The hit and miss counts so far.
+        """
+        stats_path = os.path.join(self.cache_dir, STATS_FILE)
+        with self._stats_lock:
+            try:
+                with open(stats_path, 'r') as f:
+                    stats = json.load(f)
+            except (OSError, ValueError):
+                stats = {"hits": 0, "misses": 0}
+            stats["hits" if hit else "misses"] += 1
+            try:
+                with open(stats_path, 'w') as f:
+                    json.dump(stats, f, indent=4)
+            except OSError as e:
+                print(f"Failed to save the build cache stats: {e}")
+        return stats
@@ -228,12 +228,14 @@ class ModelManager:
             self._logger.error(f"Error while verifying checksum for {model_id}. Error: {str(e)}")
             return False
 
-    def download_model(self, model_id):
+    def download_model(self, model_id, progress_callback=None):
         """
         Downloads the specified model.
 
         Args:
             model_id (str): The ID of the model to download.
+            progress_callback (callable, optional): Called with the download throughput stats of a
+                Hugging Face hosted model, see DownloadProgress.stats.
 
         Returns:
             bool: True if the model was downloaded successfully, False otherwise.
@@ -249,7 +251,7 @@ class ModelManager:
                 self._logger.error(f"Model {model_id} not found.")
                 return False
 
-            status = download_model_by_name(model_info, self._model_directory)
+            status = download_model_by_name(model_info, self._model_directory, progress_callback=progress_callback)
             if status:
                 model_info_list_updated = self.config.get_config('models/supported')
                 for i in range(len(model_info_list_updated)):
@@ -26,10 +26,11 @@ import shutil
 import builtins
 import subprocess
 import requests
-from tqdm import tqdm
 import time
 import logging
 from ChatRTX.model_manager.checksum import file_checksums
+from ChatRTX.model_manager.download_manager import DownloadManager
+from ChatRTX.model_manager.engine_cache import ENGINE_CACHE_DIR, EngineBuildCache, toolchain_version
 
 # Capture the original print function
 original_print = builtins.print
@@ -70,18 +71,37 @@ def execute_command(command):
         print(e.stderr.decode())
 
 
-def build_engine_for_model(model_info, checkpoints_local_dir, engine_local_dir):
+def build_engine_for_model(model_info, checkpoints_local_dir, engine_local_dir, build_cache=None, checkpoint_checksums=None):
     # Read the command from model_info
     engine_build_cmd = model_info['prerequisite']['engine_build_command']
+    engine_path = os.path.join(engine_local_dir, model_info['metadata']['engine'])
+
+    cache_key = None
+    if build_cache is not None and checkpoint_checksums:
+        toolchain = toolchain_version()
+        cache_key = build_cache.get_key(checkpoint_checksums, engine_build_cmd, toolchain)
+        if build_cache.restore(cache_key, engine_local_dir) and os.path.exists(engine_path):
+            stats = build_cache.record(hit=True)
+            print(f"Engine build cache hit, restored {model_info['id']} engine (hits: {stats['hits']}, misses: {stats['misses']})")
+            return True
+        stats = build_cache.record(hit=False)
+        print(f"Engine build cache miss for {model_info['id']} (hits: {stats['hits']}, misses: {stats['misses']})")
+        # restored files are hardlinks into the cache, the build must not write through them
+        build_cache.unlink_engine_files(engine_local_dir)
+        shared_timing_cache = build_cache.timing_cache_path(toolchain)
+        if os.path.exists(shared_timing_cache) and '--input_timing_cache' not in engine_build_cmd:
+            engine_build_cmd += f' --input_timing_cache "{shared_timing_cache}"'
+
     # Replace placeholders with actual directory paths
     engine_build_cmd_formatted = engine_build_cmd.replace('%checkpoints_local_dir%', f'"{checkpoints_local_dir}"').replace(
         '%engine_dir%', f'"{engine_local_dir}"').replace("%output_timing_cache_dir%", f'"{engine_local_dir}"')
 
     # Execute the formatted command
     execute_command(engine_build_cmd_formatted)
-    engine_path = os.path.join(engine_local_dir, model_info['metadata']['engine'])
     if os.path.exists(engine_path):
         print("Engine build succeeded")
+        if cache_key is not None:
+            build_cache.store(cache_key, engine_local_dir, os.path.join(engine_local_dir, 'model.cache'), toolchain)
         return True
     else:
         print("Failed to build the engine")
@@ -188,19 +208,6 @@ def process_model_files(model_info, download_dir, model_setup_path):
         print(f"An error occurred during the process: {e}")
         return False
 
-def download_file(url, destination):
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
-        total_size_in_bytes = int(r.headers.get('content-length', 0))
-        block_size = 1024  # 1 Kibibyte
-        progress_bar = tqdm(total=total_size_in_bytes, unit='iB', unit_scale=True)
-        with open(destination, 'wb') as file:
-            for data in r.iter_content(block_size):
-                progress_bar.update(len(data))
-                file.write(data)
-        progress_bar.close()
-
-
 def remove_directory(directory_path):
     try:
         # Check if the directory exists
@@ -295,7 +302,7 @@ def check_checkpoints_checksum(checkpoints_path, checkpoints, mode_id, checkpoin
         return False
 
 
-def download_model_by_name(model_info, download_path):
+def download_model_by_name(model_info, download_path, progress_callback=None):
     status = False
     os.environ['NGC_CLI_API_URL'] = 'https://api.ngc.nvidia.com'
     if 'ngc_model_name' in model_info and model_info['ngc_model_name']:
@@ -327,17 +334,23 @@ def download_model_by_name(model_info, download_path):
         os.makedirs(model_setup_path, exist_ok=True)
         checkpoints_files = model_info['prerequisite']['checkpoints_files']
         download_link = model_info['download_link']
-        status = True
+        files = []
         for file in checkpoints_files:
             url = download_link + "/" + file + "?download=true"
-            destination = os.path.join(model_setup_path, file)
             print(f"URL to download is {url}")
-            try:
-                download_file(url, destination)
+            files.append((url, os.path.join(model_setup_path, file)))
+        with DownloadManager(progress_callback=progress_callback) as download_manager:
+            results = download_manager.download(files)
+        for file, (_, destination) in zip(checkpoints_files, files):
+            if results[destination]:
                 print(f"Download successful for the file {file}")
-            except Exception as e:
-                print(f"Download failed for the file {file}. Error: {e}")
-                status = False
+            else:
+                print(f"Download failed for the file {file}")
+        status = all(results.values())
+        if status == False:
+            # keep the .part files to resume from
+            print(f"Download of {model_info['name']} is incomplete, it resumes on the next attempt")
+            return status
 
     if status == False:
         model_setup_path = os.path.join(download_path, model_info['id'])
@@ -393,7 +406,13 @@ def build_engine_by_name(model_info, download_path):
         engine_dir_path = os.path.join(model_setup_path, model_info['prerequisite']['engine_dir'])
         if not os.path.exists(engine_dir_path):
             os.makedirs(engine_dir_path)
-        status = build_engine_for_model(model_info, checkpoints_local_dir, engine_dir_path)
+        checkpoint_checksums = {
+            checkpoint_file: file_checksums[os.path.join(model_info['id'], model_info['prerequisite']['checkpoints_local_dir'], checkpoint_file)]
+            for checkpoint_file in checkpoint
+        }
+        build_cache = EngineBuildCache(os.path.join(download_path, ENGINE_CACHE_DIR))
+        status = build_engine_for_model(model_info, checkpoints_local_dir, engine_dir_path,
+                                        build_cache=build_cache, checkpoint_checksums=checkpoint_checksums)
         return status
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
@@ -0,0 +1,248 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import re
+import json
+from array import array
+from collections import Counter
+
+import numpy as np
+
+# Dotted numbers (driver versions such as 551.23) are kept as a single term, CJK runs are
+# split into character bigrams and everything else is split on non-word characters.
+_CJK = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+_TOKEN_RE = re.compile(rf"\d+(?:\.\d+)+|[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RE = re.compile(f"[{_CJK}]")
+
+
+def tokenize(text):
+    """
+    Split text into lower-cased BM25 terms.
+
+    :param text: The text to tokenize.
+    :return: A list of terms.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if _CJK_RE.match(token) and len(token) > 1:
+            terms.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            terms.append(token)
+    return terms
+
+
+class BM25Index:
+    """
+    Inverted index with Okapi BM25 scoring.
+
+    Postings are kept in CSR layout: ``indptr[t]:indptr[t + 1]`` slices the document rows and
+    term frequencies of term ``t`` out of two flat numpy arrays. Documents added or removed since
+    the last query are buffered and merged into the CSR arrays lazily, so incremental updates
+    do not rebuild the whole index on every call.
+    """
+    INDEX_FILE = "bm25_index.npz"
+    VOCAB_FILE = "bm25_vocab.json"
+
+    def __init__(self, k1=1.5, b=0.75):
+        """
+        Initialize an empty BM25Index.
+
+        :param k1: Term frequency saturation parameter.
+        :param b: Document length normalization parameter.
+        """
+        self.k1 = k1
+        self.b = b
+        self._vocab = {}
+        self._doc_ids = []
+        self._doc_rows = {}
+        self._doc_len = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._indptr = np.zeros(1, dtype=np.int64)
+        self._post_docs = np.zeros(0, dtype=np.int32)
+        self._post_tf = np.zeros(0, dtype=np.float32)
+        self._pending_terms = array('i')
+        self._pending_docs = array('i')
+        self._pending_tf = array('f')
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._doc_rows)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_rows
+
+    def add_documents(self, documents):
+        """
+        Add documents to the index. Documents whose id is already indexed are replaced.
+
+        :param documents: An iterable of (doc_id, text) tuples.
+        """
+        doc_lengths = []
+        replaced = []
+        for doc_id, text in documents:
+            if doc_id in self._doc_rows:
+                replaced.append(self._doc_rows[doc_id])
+            row = len(self._doc_ids)
+            self._doc_ids.append(doc_id)
+            self._doc_rows[doc_id] = row
+            terms = tokenize(text)
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                term_id = self._vocab.setdefault(term, len(self._vocab))
+                self._pending_terms.append(term_id)
+                self._pending_docs.append(row)
+                self._pending_tf.append(tf)
+
+        if doc_lengths:
+            self._doc_len = np.concatenate([self._doc_len, np.asarray(doc_lengths, dtype=np.float32)])
+            self._alive = np.concatenate([self._alive, np.ones(len(doc_lengths), dtype=bool)])
+            self._alive[replaced] = False
+            self._dirty = True
+
+    def remove_documents(self, doc_ids):
+        """
+        Remove documents from the index. Unknown ids are ignored.
+
+        :param doc_ids: An iterable of document ids.
+        """
+        for doc_id in doc_ids:
+            row = self._doc_rows.pop(doc_id, None)
+            if row is not None:
+                self._alive[row] = False
+                self._dirty = True
+
+    def _merge(self):
+        """
+        Merge pending postings into the CSR arrays and drop removed documents.
+        """
+        if not self._dirty:
+            return
+        n_terms = len(self._vocab)
+        terms = np.concatenate([
+            np.repeat(np.arange(len(self._indptr) - 1, dtype=np.int32), np.diff(self._indptr)),
+            np.frombuffer(self._pending_terms, dtype=np.int32)])
+        docs = np.concatenate([self._post_docs, np.frombuffer(self._pending_docs, dtype=np.int32)])
+        tfs = np.concatenate([self._post_tf, np.frombuffer(self._pending_tf, dtype=np.float32)])
+
+        keep = self._alive[docs]
+        terms, docs, tfs = terms[keep], docs[keep], tfs[keep]
+
+        # Renumber the surviving document rows so the arrays stay dense
+        alive_rows = np.flatnonzero(self._alive)
+        remap = np.full(len(self._alive), -1, dtype=np.int32)
+        remap[alive_rows] = np.arange(len(alive_rows), dtype=np.int32)
+        docs = remap[docs]
+        self._doc_ids = [self._doc_ids[row] for row in alive_rows]
+        self._doc_rows = {doc_id: row for row, doc_id in enumerate(self._doc_ids)}
+        self._doc_len = self._doc_len[alive_rows]
+        self._alive = np.ones(len(alive_rows), dtype=bool)
+
+        order = np.lexsort((docs, terms))
+        self._post_docs = np.ascontiguousarray(docs[order])
+        self._post_tf = np.ascontiguousarray(tfs[order])
+        self._indptr = np.zeros(n_terms + 1, dtype=np.int64)
+        np.cumsum(np.bincount(terms, minlength=n_terms), out=self._indptr[1:])
+
+        self._pending_terms = array('i')
+        self._pending_docs = array('i')
+        self._pending_tf = array('f')
+        self._dirty = False
+
+    def search(self, query, top_k):
+        """
+        Score all documents against the query and return the best matches.
+
+        :param query: The query string.
+        :param top_k: The maximum number of results.
+        :return: A list of (doc_id, score) tuples sorted by descending score.
+        """
+        self._merge()
+        num_docs = len(self._doc_ids)
+        if num_docs == 0 or top_k <= 0:
+            return []
+
+        query_terms = Counter(term_id for term_id in (self._vocab.get(t) for t in tokenize(query))
+                              if term_id is not None)
+        if not query_terms:
+            return []
+
+        avg_len = max(float(self._doc_len.mean()), 1.0)
+        scores = np.zeros(num_docs, dtype=np.float32)
+        for term_id, query_tf in query_terms.items():
+            start, end = self._indptr[term_id], self._indptr[term_id + 1]
+            if start == end:
+                continue
+            docs = self._post_docs[start:end]
+            tf = self._post_tf[start:end]
+            df = end - start
+            idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1.0 - self.b + self.b * self._doc_len[docs] / avg_len)
+            scores[docs] += query_tf * idf * tf * (self.k1 + 1.0) / (tf + norm)
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(scores[matched], -top_k)[-top_k:]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(self._doc_ids[row], float(scores[row])) for row in matched]
+
+    def save(self, persist_dir):
+        """
+        Persist the index into the given directory.
+
+        :param persist_dir: The directory to write the index files to.
+        """
+        self._merge()
+        os.makedirs(persist_dir, exist_ok=True)
+        np.savez(os.path.join(persist_dir, BM25Index.INDEX_FILE),
+                 indptr=self._indptr, post_docs=self._post_docs, post_tf=self._post_tf,
+                 doc_len=self._doc_len, params=np.asarray([self.k1, self.b], dtype=np.float64))
+        terms = sorted(self._vocab, key=self._vocab.get)
+        with open(os.path.join(persist_dir, BM25Index.VOCAB_FILE), 'w', encoding='utf8') as file:
+            json.dump({"terms": terms, "doc_ids": self._doc_ids}, file, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, persist_dir):
+        """
+        Load an index previously written with save().
+
+        :param persist_dir: The directory containing the index files.
+        :return: The loaded BM25Index, or None if no index was persisted in the directory.
+        """
+        index_file = os.path.join(persist_dir, BM25Index.INDEX_FILE)
+        vocab_file = os.path.join(persist_dir, BM25Index.VOCAB_FILE)
+        if not (os.path.exists(index_file) and os.path.exists(vocab_file)):
+            return None
+
+        with np.load(index_file) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            index._indptr = data["indptr"]
+            index._post_docs = data["post_docs"]
+            index._post_tf = data["post_tf"]
+            index._doc_len = data["doc_len"]
+        with open(vocab_file, 'r', encoding='utf8') as file:
+            vocab = json.load(file)
+        index._vocab = {term: term_id for term_id, term in enumerate(vocab["terms"])}
+        index._doc_ids = vocab["doc_ids"]
+        index._doc_rows = {doc_id: row for row, doc_id in enumerate(index._doc_ids)}
+        index._alive = np.ones(len(index._doc_ids), dtype=bool)
+        return index
@@ -0,0 +1,286 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import threading
+from ChatRTX.logger import ChatRTXLogger
+
+# inotify event masks, see <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO |
+               _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """
+    Minimal recursive inotify binding through ctypes. Only available on Linux.
+    """
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._paths = {}
+
+    def add_tree(self, root):
+        """
+        Watch root and all of its subdirectories.
+
+        :param root: The directory to watch.
+        :return: The files found while walking the tree.
+        """
+        files = []
+        for dir_path, _, file_names in os.walk(root):
+            wd = self._add_watch(self.fd, os.fsencode(dir_path), _WATCH_MASK)
+            if wd < 0:
+                error = ctypes.get_errno()
+                if error == errno.ENOSPC:
+                    raise OSError(error, "inotify watch limit reached")
+                continue
+            self._paths[wd] = dir_path
+            files.extend(os.path.join(dir_path, name) for name in file_names)
+        return files
+
+    def read_events(self):
+        """
+        Read the pending events.
+
+        :return: A list of (path, mask) tuples. path is None when the kernel queue overflowed.
+        """
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & _IN_Q_OVERFLOW:
+                events.append((None, mask))
+                continue
+            dir_path = self._paths.get(wd)
+            if mask & _IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            if dir_path is not None:
+                events.append((os.path.join(dir_path, name) if name else dir_path, mask))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DatasetWatcher:
+    """
+    Watches a dataset folder in a background thread and reports the files that changed.
+
+    inotify is used on Linux. On other platforms, or when inotify is unavailable, the folder is
+    polled and (size, mtime) snapshots are compared. Bursts of events, such as a folder being
+    copied in, are debounced: the callback runs once the folder has been quiet for
+    debounce_seconds, or after max_delay_seconds of continuous changes.
+    """
+
+    def __init__(self, folder_path, callback, extensions=None, debounce_seconds=2.0,
+                 max_delay_seconds=30.0, poll_interval=2.0, use_inotify=None):
+        """
+        Initialize the DatasetWatcher.
+
+        :param folder_path: The folder to watch.
+        :param callback: Called from the watcher thread with a sorted list of changed file paths.
+                         Deleted files are included, so the callee checks for existence.
+        :param extensions: File extensions to report, e.g. [".pdf", ".txt"]. None reports all files.
+        :param debounce_seconds: Quiet period that ends a burst of changes.
+        :param max_delay_seconds: Maximum time changes are held back during a continuous burst.
+        :param poll_interval: Interval between folder scans when polling.
+        :param use_inotify: Force inotify on or off. Default is to use it when available.
+        """
+        self._folder_path = os.path.abspath(folder_path)
+        self._callback = callback
+        self._extensions = tuple(ext.lower() for ext in extensions) if extensions else None
+        self._debounce_seconds = debounce_seconds
+        self._max_delay_seconds = max_delay_seconds
+        self._poll_interval = poll_interval
+        self._use_inotify = sys.platform.startswith("linux") if use_inotify is None else use_inotify
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._pending = set()
+        self._first_change = None
+        self._last_change = None
+        self._logger = ChatRTXLogger.get_logger()
+
+    @property
+    def folder_path(self):
+        return self._folder_path
+
+    def start(self):
+        """
+        Start watching in a daemon thread.
+        """
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="DatasetWatcher", daemon=True)
+        self._thread.start()
+        self._logger.info("Watching %s for changes", self._folder_path)
+
+    def stop(self, timeout=5.0):
+        """
+        Stop watching. Pending changes that were not yet reported are dropped.
+
+        :param timeout: Seconds to wait for the watcher thread to exit.
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        inotify = None
+        if self._use_inotify:
+            try:
+                inotify = _Inotify()
+                inotify.add_tree(self._folder_path)
+            except (OSError, AttributeError) as e:
+                self._logger.warning("inotify unavailable (%s). Falling back to polling.", str(e))
+                if inotify is not None:
+                    inotify.close()
+                inotify = None
+        try:
+            if inotify is not None:
+                self._run_inotify(inotify)
+            else:
+                self._run_polling()
+        except Exception as e:
+            self._logger.error("Dataset watcher stopped: Error %s", str(e), exc_info=True)
+        finally:
+            if inotify is not None:
+                inotify.close()
+
+    def _run_inotify(self, inotify):
+        while not self._stop_event.is_set():
+            ready, _, _ = select.select([inotify.fd], [], [], self._wait_time(0.5))
+            if ready:
+                changed = []
+                for path, mask in inotify.read_events():
+                    if path is None:
+                        # Events were lost, report everything under the folder
+                        changed.extend(self._snapshot())
+                    elif mask & _IN_ISDIR:
+                        if mask & (_IN_CREATE | _IN_MOVED_TO):
+                            changed.extend(inotify.add_tree(path))
+                        elif mask & _IN_MOVED_FROM:
+                            # The files of a directory moved out are no longer known individually
+                            changed.append(path + os.sep)
+                    else:
+                        changed.append(path)
+                self._add_changes(changed)
+            self._flush_if_quiet()
+
+    def _run_polling(self):
+        snapshot = self._snapshot()
+        while not self._stop_event.wait(self._wait_time(self._poll_interval)):
+            current = self._snapshot()
+            if current != snapshot:
+                self._add_changes(path for path in current.keys() | snapshot.keys()
+                                  if current.get(path) != snapshot.get(path))
+                snapshot = current
+            self._flush_if_quiet()
+
+    def _snapshot(self):
+        snapshot = {}
+        for dir_path, _, file_names in os.walk(self._folder_path):
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def _add_changes(self, paths):
+        paths = [path for path in paths if self._is_tracked(path)]
+        if not paths:
+            return
+        now = time.monotonic()
+        self._pending.update(paths)
+        self._last_change = now
+        if self._first_change is None:
+            self._first_change = now
+
+    def _is_tracked(self, path):
+        if path.endswith(os.sep) or self._extensions is None:
+            return True
+        return path.lower().endswith(self._extensions)
+
+    def _wait_time(self, default):
+        if self._last_change is None:
+            return default
+        return max(0.05, min(default, self._last_change + self._debounce_seconds - time.monotonic()))
+
+    def _flush_if_quiet(self):
+        if not self._pending:
+            return
+        now = time.monotonic()
+        if (now - self._last_change < self._debounce_seconds
+                and now - self._first_change < self._max_delay_seconds):
+            return
+        changed = sorted(self._pending)
+        self._pending.clear()
+        self._first_change = None
+        self._last_change = None
+        self._logger.info("Detected %d changed file(s) in %s", len(changed), self._folder_path)
+        try:
+            self._callback(changed)
+        except Exception as e:
+            self._logger.error("Dataset change callback failed: Error %s", str(e), exc_info=True)
@@ -0,0 +1,181 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import re
+import hashlib
+import numpy as np
+from ChatRTX.rags.bm25_index import tokenize
+
+FILENAMES_KEY = "filenames"
+CONTENT_HASH_KEY = "content_hash"
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_SHINGLE_SIZE = 3
+# Chunks with fewer terms than this only take part in exact deduplication, their
+# fingerprints are too coarse to compare
+_MIN_SIMHASH_TERMS = 8
+_BIT_VALUES = [1 << i for i in range(64)]
+
+
+def content_hash(text):
+    """
+    Hash text after case and whitespace normalization.
+
+    :param text: The text to hash.
+    :return: The hex digest.
+    """
+    normalized = _WHITESPACE_RE.sub(" ", text).strip().lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def simhash(terms):
+    """
+    Compute the 64 bit SimHash fingerprint of a term sequence over word shingles.
+
+    :param terms: The terms of the text, see bm25_index.tokenize.
+    :return: The fingerprint as an int.
+    """
+    if not terms:
+        return 0
+    shingles = [" ".join(terms[i:i + _SHINGLE_SIZE]) for i in range(max(1, len(terms) - _SHINGLE_SIZE + 1))]
+    hashes = np.fromiter((int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+                          for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    bits = (hashes[:, None] >> np.arange(64, dtype=np.uint64)) & np.uint64(1)
+    votes = 2 * bits.sum(axis=0, dtype=np.int64) - len(shingles)
+    return sum(_BIT_VALUES[i] for i in np.flatnonzero(votes > 0))
+
+
+def source_files(node):
+    """
+    Get all source files of a node, including the ones of duplicates merged into it.
+
+    :param node: The node.
+    :return: A list of file paths.
+    """
+    filenames = node.metadata.get(FILENAMES_KEY)
+    if filenames:
+        return list(filenames)
+    filename = node.metadata.get("filename")
+    return [filename] if filename else []
+
+
+def set_source_files(node, filenames):
+    """
+    Set the source files of a node. The first one is also kept as its "filename".
+
+    :param node: The node.
+    :param filenames: A non-empty list of file paths.
+    """
+    node.metadata["filename"] = filenames[0]
+    if len(filenames) > 1:
+        node.metadata[FILENAMES_KEY] = list(filenames)
+    else:
+        node.metadata.pop(FILENAMES_KEY, None)
+
+
+class ChunkDeduplicator:
+    """
+    Collapses duplicate nodes into one canonical node that lists all of their source files.
+
+    Exact duplicates are found by the hash of the normalized node text. Near duplicates are
+    optionally found by SimHash: fingerprints are split into max_distance + 1 bands, so any two
+    fingerprints within max_distance bits share at least one band exactly, and only nodes that
+    share a band are compared.
+    """
+
+    def __init__(self, near_duplicates=False, max_distance=3):
+        """
+        Initialize the ChunkDeduplicator.
+
+        :param near_duplicates: Whether to also collapse near duplicates.
+        :param max_distance: The maximum Hamming distance between the SimHash fingerprints of near duplicates.
+        """
+        self._near_duplicates = near_duplicates
+        self._max_distance = max_distance
+        self._by_hash = {}
+        self._bands = {}
+        self._fingerprints = {}
+        num_bands = max_distance + 1
+        width = 64 // num_bands
+        self._band_masks = [(((1 << (64 - width * i if i == num_bands - 1 else width)) - 1) << (width * i), i)
+                            for i in range(num_bands)]
+
+    def add(self, node):
+        """
+        Add a node. If it duplicates a node added before, its source files are merged into that node.
+
+        :param node: The node to add.
+        :return: The canonical node, which is the node itself when it is not a duplicate.
+        """
+        text = node.get_content()
+        digest = content_hash(text)
+        canonical = self._by_hash.get(digest)
+        fingerprint = None
+        if canonical is None and self._near_duplicates:
+            terms = tokenize(text)
+            if len(terms) >= _MIN_SIMHASH_TERMS:
+                fingerprint = simhash(terms)
+                canonical = self._find_near_duplicate(fingerprint)
+
+        if canonical is not None:
+            self._merge(canonical, node)
+            self._by_hash.setdefault(digest, canonical)
+            return canonical
+
+        node.metadata[CONTENT_HASH_KEY] = digest
+        # Source paths are bookkeeping, they must not change the embedding or the prompt
+        node.excluded_embed_metadata_keys = self._with_excluded_keys(node.excluded_embed_metadata_keys)
+        node.excluded_llm_metadata_keys = self._with_excluded_keys(node.excluded_llm_metadata_keys)
+        self._by_hash[digest] = node
+        if fingerprint is not None:
+            self._fingerprints[node.node_id] = fingerprint
+            for mask, band in self._band_masks:
+                self._bands.setdefault((band, fingerprint & mask), []).append(node)
+        return node
+
+    def deduplicate(self, nodes):
+        """
+        Add nodes and return the ones that are not duplicates.
+
+        :param nodes: The nodes to deduplicate.
+        :return: A list of canonical nodes, in input order.
+        """
+        return [node for node in nodes if self.add(node) is node]
+
+    def _find_near_duplicate(self, fingerprint):
+        for mask, band in self._band_masks:
+            for candidate in self._bands.get((band, fingerprint & mask), ()):
+                if bin(self._fingerprints[candidate.node_id] ^ fingerprint).count("1") <= self._max_distance:
+                    return candidate
+        return None
+
+    @staticmethod
+    def _with_excluded_keys(keys):
+        return list(keys) + [key for key in (FILENAMES_KEY, CONTENT_HASH_KEY) if key not in keys]
+
+    @staticmethod
+    def _merge(canonical, duplicate):
+        filenames = source_files(canonical)
+        for filename in source_files(duplicate):
+            if filename not in filenames:
+                filenames.append(filename)
+        if filenames:
+            set_source_files(canonical, filenames)
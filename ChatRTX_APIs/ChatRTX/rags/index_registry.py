@@ -0,0 +1,119 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import threading
+from collections import OrderedDict
+from ChatRTX.logger import ChatRTXLogger
+
+
+class IndexRegistry:
+    """
+    Keeps loaded indexes resident, keyed by dataset id, and evicts the least recently used
+    ones when the number of indexes or their estimated memory exceeds the configured limits.
+    The most recently added index is never evicted, even when it alone exceeds the budget.
+    """
+
+    def __init__(self, max_indexes=None, memory_budget_bytes=None):
+        """
+        Initialize the IndexRegistry.
+
+        :param max_indexes: The maximum number of resident indexes. None for no limit.
+        :param memory_budget_bytes: The maximum estimated memory of resident indexes. None for no limit.
+        """
+        self._max_indexes = max_indexes
+        self._memory_budget_bytes = memory_budget_bytes
+        self._entries = OrderedDict()
+        self._memory_usage = 0
+        self._lock = threading.Lock()
+        self._logger = ChatRTXLogger.get_logger()
+
+    def get(self, dataset_id):
+        """
+        Get a resident index and mark it as most recently used.
+
+        :param dataset_id: The dataset id.
+        :return: The value stored for the dataset, or None if it is not resident.
+        """
+        with self._lock:
+            entry = self._entries.get(dataset_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(dataset_id)
+            return entry[0]
+
+    def put(self, dataset_id, value, size_bytes):
+        """
+        Add or replace a resident index and evict least recently used ones over the limits.
+
+        :param dataset_id: The dataset id.
+        :param value: The value to store, e.g. the index and its BM25 index.
+        :param size_bytes: The estimated memory of the value.
+        :return: The ids of the evicted datasets.
+        """
+        with self._lock:
+            if dataset_id in self._entries:
+                self._memory_usage -= self._entries.pop(dataset_id)[1]
+            self._entries[dataset_id] = (value, size_bytes)
+            self._memory_usage += size_bytes
+
+            evicted = []
+            while len(self._entries) > 1 and (
+                    (self._max_indexes is not None and len(self._entries) > self._max_indexes) or
+                    (self._memory_budget_bytes is not None and self._memory_usage > self._memory_budget_bytes)):
+                evicted_id, (_, evicted_size) = self._entries.popitem(last=False)
+                self._memory_usage -= evicted_size
+                evicted.append(evicted_id)
+        for evicted_id in evicted:
+            self._logger.info("Evicted index of dataset %s from the index registry", evicted_id)
+        return evicted
+
+    def remove(self, dataset_id):
+        """
+        Remove a resident index if present.
+
+        :param dataset_id: The dataset id.
+        """
+        with self._lock:
+            entry = self._entries.pop(dataset_id, None)
+            if entry is not None:
+                self._memory_usage -= entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._memory_usage = 0
+
+    def dataset_ids(self):
+        """
+        :return: The resident dataset ids, from least to most recently used.
+        """
+        with self._lock:
+            return list(self._entries)
+
+    @property
+    def memory_usage(self):
+        return self._memory_usage
+
+    def __contains__(self, dataset_id):
+        return dataset_id in self._entries
+
+    def __len__(self):
+        return len(self._entries)
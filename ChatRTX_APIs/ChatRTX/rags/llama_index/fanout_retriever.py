@@ -0,0 +1,77 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+from typing import Dict, List, Optional
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from ChatRTX.logger import ChatRTXLogger
+
+
+class FanOutRetriever(BaseRetriever):
+    """
+    Retriever that queries the retrievers of several indexes and merges their results into one
+    top-k using reciprocal rank fusion (RRF). Scores of different indexes are not comparable, e.g.
+    L2 distances and fused hybrid scores, so only the ranks are used. The returned node scores
+    are RRF scores, so higher is better.
+    """
+
+    def __init__(
+            self,
+            retrievers: List[BaseRetriever],
+            similarity_top_k: int,
+            rrf_k: int = 60,
+            callback_manager: Optional[CallbackManager] = None
+    ) -> None:
+        """
+        Initialize the FanOutRetriever.
+
+        :param retrievers: The retrievers of the indexes to query.
+        :param similarity_top_k: The number of merged results to return.
+        :param rrf_k: The RRF rank constant.
+        :param callback_manager: Optional callback manager.
+        """
+        self._retrievers = retrievers
+        self._similarity_top_k = similarity_top_k
+        self._rrf_k = rrf_k
+        self._logger = ChatRTXLogger.get_logger()
+        super().__init__(callback_manager=callback_manager)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        merged: Dict[str, NodeWithScore] = {}
+        # The retrievers run one after the other on the same query bundle, so the query is only
+        # embedded by the first vector retriever and reused by the others
+        for retriever in self._retrievers:
+            for rank, result in enumerate(retriever.retrieve(query_bundle)):
+                score = 1.0 / (self._rrf_k + rank + 1)
+                node_id = result.node.node_id
+                if node_id in merged:
+                    merged[node_id].score += score
+                else:
+                    merged[node_id] = NodeWithScore(node=result.node, score=score)
+
+        results = sorted(merged.values(), key=lambda result: result.score, reverse=True)[:self._similarity_top_k]
+        self._logger.debug("Fan-out retrieval over %d indexes: %.1f ms, merged %d nodes",
+                           len(self._retrievers), (time.perf_counter() - start) * 1000, len(results))
+        return results
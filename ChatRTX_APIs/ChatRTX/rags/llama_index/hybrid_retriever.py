@@ -0,0 +1,93 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import time
+from typing import Dict, List, Optional
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.schema import NodeWithScore, QueryBundle
+from llama_index.core.storage.docstore import BaseDocumentStore
+from ChatRTX.rags.bm25_index import BM25Index
+from ChatRTX.logger import ChatRTXLogger
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Retriever that fuses dense vector results with BM25 keyword results using reciprocal rank
+    fusion (RRF). The returned node scores are fused RRF scores, so higher is better.
+    """
+
+    def __init__(
+            self,
+            vector_retriever: BaseRetriever,
+            bm25_index: BM25Index,
+            docstore: BaseDocumentStore,
+            similarity_top_k: int,
+            sparse_top_k: Optional[int] = None,
+            rrf_k: int = 60,
+            callback_manager: Optional[CallbackManager] = None
+    ) -> None:
+        """
+        Initialize the HybridRetriever.
+
+        :param vector_retriever: The dense retriever over the vector index.
+        :param bm25_index: The keyword index built over the same nodes.
+        :param docstore: The document store used to resolve BM25 hits to nodes.
+        :param similarity_top_k: The number of fused results to return.
+        :param sparse_top_k: The number of BM25 candidates to fuse. Defaults to similarity_top_k.
+        :param rrf_k: The RRF rank constant.
+        :param callback_manager: Optional callback manager.
+        """
+        self._vector_retriever = vector_retriever
+        self._bm25_index = bm25_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._sparse_top_k = sparse_top_k or similarity_top_k
+        self._rrf_k = rrf_k
+        self._logger = ChatRTXLogger.get_logger()
+        super().__init__(callback_manager=callback_manager)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        dense_results = self._vector_retriever.retrieve(query_bundle)
+        dense_time = time.perf_counter()
+        sparse_results = self._bm25_index.search(query_bundle.query_str, self._sparse_top_k)
+        sparse_time = time.perf_counter()
+
+        fused: Dict[str, NodeWithScore] = {}
+        for rank, result in enumerate(dense_results):
+            fused[result.node.node_id] = NodeWithScore(node=result.node, score=1.0 / (self._rrf_k + rank + 1))
+
+        for rank, (node_id, _) in enumerate(sparse_results):
+            score = 1.0 / (self._rrf_k + rank + 1)
+            if node_id in fused:
+                fused[node_id].score += score
+                continue
+            node = self._docstore.get_node(node_id, raise_error=False)
+            if node is not None:
+                fused[node_id] = NodeWithScore(node=node, score=score)
+
+        results = sorted(fused.values(), key=lambda result: result.score, reverse=True)[:self._similarity_top_k]
+        self._logger.debug("Hybrid retrieval: dense %.1f ms (%d hits), bm25 %.1f ms (%d hits), fused %d nodes",
+                           (dense_time - start) * 1000, len(dense_results),
+                           (sparse_time - dense_time) * 1000, len(sparse_results), len(results))
+        return results
@@ -0,0 +1,184 @@
+# SPDX-FileCopyrightText: Copyright (c) 2024 NVIDIA CORPORATION & AFFILIATES. All rights reserved.
+# SPDX-License-Identifier: MIT
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL
+# THE AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+import torch
+from transformers import AutoModelForSequenceClassification, AutoTokenizer
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.callbacks import CallbackManager
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+from ChatRTX.logger import ChatRTXLogger
+
+
+# Stage timings of the query being answered in the current context, see collect_stage_timings
+_stage_timings = contextvars.ContextVar("stage_timings", default=None)
+
+
+@contextmanager
+def collect_stage_timings():
+    """
+    Collect the stage timings retrievers report while the block runs. The timings belong to the
+    calling context, so concurrent queries on the same retriever do not see each other's.
+
+    :return: A context manager yielding the dictionary the timings are added to.
+    """
+    timings = {}
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+def record_stage_timings(timings):
+    """
+    Report stage timings to the enclosing collect_stage_timings block, if any.
+
+    :param timings: A dictionary of timings and counts.
+    """
+    collected = _stage_timings.get()
+    if collected is not None:
+        collected.update(timings)
+
+
+class CrossEncoderScorer:
+    """
+    Scores (query, passage) pairs with a small sequence classification cross-encoder.
+    The model runs on the CPU by default so it does not compete with the LLM for GPU memory.
+    """
+
+    def __init__(self, model_name, device="cpu", batch_size=16, max_length=512):
+        """
+        Initialize the CrossEncoderScorer.
+
+        :param model_name: The name or local path of the cross-encoder model.
+        :param device: The device to run the model on. Default is "cpu".
+        :param batch_size: The number of pairs scored per forward pass.
+        :param max_length: The maximum number of tokens per (query, passage) pair.
+        """
+        self.device = device
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self._tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self._model = AutoModelForSequenceClassification.from_pretrained(model_name).to(device)
+        self._model.eval()
+
+    def score(self, query, passages):
+        """
+        Score passages against a query.
+
+        :param query: The query string.
+        :param passages: A list of passage strings.
+        :return: A list of relevance scores, one per passage. Higher is better.
+        """
+        scores = []
+        with torch.inference_mode():
+            for start in range(0, len(passages), self.batch_size):
+                batch = passages[start:start + self.batch_size]
+                inputs = self._tokenizer([query] * len(batch), batch, padding=True, truncation=True,
+                                         max_length=self.max_length, return_tensors="pt").to(self.device)
+                logits = self._model(**inputs).logits
+                # Single logit models output a relevance score, two logit models a (not relevant, relevant) pair
+                batch_scores = logits[:, 0] if logits.shape[-1] == 1 else logits[:, -1]
+                scores.extend(batch_scores.float().cpu().tolist())
+        return scores
+
+
+class CrossEncoderRerankRetriever(BaseRetriever):
+    """
+    Retriever that fetches a larger candidate set from a base retriever, reranks the candidates with a
+    cross-encoder and keeps the best ones that fit into a token budget. The returned node scores are the
+    cross-encoder scores, so higher is better.
+    """
+
+    def __init__(
+            self,
+            base_retriever: BaseRetriever,
+            scorer: CrossEncoderScorer,
+            token_budget: Optional[int] = None,
+            token_counter: Optional[Callable[[str], int]] = None,
+            top_n: Optional[int] = None,
+            callback_manager: Optional[CallbackManager] = None
+    ) -> None:
+        """
+        Initialize the CrossEncoderRerankRetriever.
+
+        :param base_retriever: The retriever producing the candidate set.
+        :param scorer: The cross-encoder scorer.
+        :param token_budget: The maximum number of tokens of query plus context passed on. None disables the budget.
+        :param token_counter: A function returning the number of LLM tokens of a string.
+        :param top_n: The maximum number of nodes passed on. None keeps every node within the budget.
+        :param callback_manager: Optional callback manager.
+        """
+        self._base_retriever = base_retriever
+        self._scorer = scorer
+        self._token_budget = token_budget
+        self._token_counter = token_counter
+        self._top_n = top_n
+        self._logger = ChatRTXLogger.get_logger()
+        super().__init__(callback_manager=callback_manager)
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        start = time.perf_counter()
+        candidates = self._base_retriever.retrieve(query_bundle)
+        retrieve_time = time.perf_counter()
+
+        passages = [candidate.node.get_content(metadata_mode=MetadataMode.LLM) for candidate in candidates]
+        scores = self._scorer.score(query_bundle.query_str, passages) if passages else []
+        rerank_time = time.perf_counter()
+
+        ranked = sorted(zip(scores, passages, candidates), key=lambda item: item[0], reverse=True)
+        results = []
+        used_tokens = self._count_tokens(query_bundle.query_str)
+        for score, passage, candidate in ranked:
+            if self._top_n is not None and len(results) >= self._top_n:
+                break
+            tokens = self._count_tokens(passage)
+            if self._token_budget is not None and results and used_tokens + tokens > self._token_budget:
+                # Smaller chunks further down the ranking may still fit
+                continue
+            used_tokens += tokens
+            results.append(NodeWithScore(node=candidate.node, score=score))
+        budget_time = time.perf_counter()
+
+        timings = {
+            "retrieval_ms": (retrieve_time - start) * 1000,
+            "rerank_ms": (rerank_time - retrieve_time) * 1000,
+            "budget_ms": (budget_time - rerank_time) * 1000,
+            "candidates": len(candidates),
+            "selected": len(results),
+            "context_tokens": used_tokens,
+        }
+        self._logger.info("Rerank stage: retrieval %.1f ms (%d candidates), rerank %.1f ms, "
+                          "budget %.1f ms (%d nodes, %d tokens)",
+                          timings["retrieval_ms"], len(candidates), timings["rerank_ms"],
+                          timings["budget_ms"], len(results), used_tokens)
+        record_stage_timings(timings)
+        return results
+
+    def _count_tokens(self, text):
+        if self._token_counter is None:
+            return 0
+        return self._token_counter(text)
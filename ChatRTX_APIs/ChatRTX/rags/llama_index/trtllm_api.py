@@ -276,6 +276,18 @@ class TrtLlmAPI(CustomLLM):
 
         return gen()
 
+    def count_tokens(self, text: str) -> int:
+        """
+        Count the number of tokens of a text with the model tokenizer.
+
+        Args:
+            text (str): The text to count.
+
+        Returns:
+            int: The number of tokens.
+        """
+        return self._model.count_tokens(text)
+
     def unload_llm(self):
         """
         Unload the model from memory and perform necessary cleanup.
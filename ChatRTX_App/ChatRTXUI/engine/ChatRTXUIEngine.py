@@ -45,6 +45,7 @@ class Events(Enum):
     ACTIVE_MODEL_UPDATE = 'ACTIVE_MODEL_UPDATE'
     ACTIVE_MODEL_UPDATE_ERROR = 'ACTIVE_MODEL_UPDATE_ERROR'
     MODEL_DOWNLOAD_ERROR = 'MODEL_DOWNLOAD_ERROR'
+    MODEL_DOWNLOAD_PROGRESS = 'MODEL_DOWNLOAD_PROGRESS'
     MODEL_INSTALL_ERROR = 'MODEL_INSTALL_ERROR'
     MODEL_DELETE_ERROR = 'MODEL_DELETE_ERROR'
     MODEL_DOWNLOADED = 'MODEL_DOWNLOADED'
@@ -241,7 +242,10 @@ class ChatBot:
     def download_model(self, model_id, session_id):
         assert self.session_id == session_id
         self._logger.info(f"Print the model id {model_id}")
-        return self._handle_with_condition(lambda: self.backend.download_model(model_id), Events.MODEL_DOWNLOADED,
+        def on_progress(stats):
+            self.send_event(Events.MODEL_DOWNLOAD_PROGRESS, json.dumps({"model_id": model_id, **stats}))
+
+        return self._handle_with_condition(lambda: self.backend.download_model(model_id, progress_callback=on_progress), Events.MODEL_DOWNLOADED,
                                     Events.MODEL_DOWNLOAD_ERROR, model_id)
 
     def install_model(self, model_id, session_id):
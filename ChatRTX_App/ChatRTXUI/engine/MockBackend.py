@@ -113,7 +113,7 @@ class Backend:
         success = self._rand_handle()
         return success
 
-    def download_model(self, model_id):
+    def download_model(self, model_id, progress_callback=None):
         self._logger.info(f"download model_id called with model_id={model_id}")
         status = self._rand_handle()
         if status:
@@ -163,7 +163,7 @@ class Backend:
         # initialize transcription model
         return
     
-    def get_text_from_audio(self, audio_path):
+    def get_text_from_audio(self, audio_path, sample_rate=None):
         # Return transcribed text via this function
         self._rand_handle()
         return f'Text generated for audio {audio_path}'
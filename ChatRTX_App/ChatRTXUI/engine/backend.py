@@ -1,6 +1,7 @@
 from configuration import Configuration
 from ChatRTX.chatrtx import ChatRTX
 from ChatRTX.chatrtx_rag import ChatRTXRag
+from ChatRTX.rags.dataset_watcher import DatasetWatcher
 from ChatRTX.logger import ChatRTXLogger
 import logging
 from ChatRTX.model_manager.model_manager import ModelManager
@@ -11,10 +12,11 @@ import time
 import random
 from ResponseUtility import getLocalLinksMarkdown, getImagesMarkdown
 from pynvml import nvmlInit, nvmlDeviceGetHandleByIndex, nvmlDeviceGetMemoryInfo
-from ChatRTX.inference.trtllm.whisper.trt_whisper import WhisperTRTLLM, decode_audio_file
-from ChatRTX.inference.trtllm.whisper.whisper_utils import process_input_audio
+from ChatRTX.inference.trtllm.whisper.asr_service import WhisperASRService
+from ChatRTX.inference.trtllm.whisper.whisper_utils import load_audio
 import time
 import ctypes
+import threading
 
 class Mode(Enum):
     RAG = "RAG"
@@ -35,6 +37,10 @@ class Backend:
         self.chatrtx = None
         self.chatrtx_mode = None
         self.rag_engine = None
+        # Serializes index builds and updates. Queries read self.rag_engine without the lock,
+        # a new engine is swapped in by a single assignment so in-flight queries keep the old one.
+        self._rag_lock = threading.RLock()
+        self._dataset_watcher = None
         self.model_setup_dir = model_setup_dir
         self.model_manager = ModelManager(self.model_setup_dir)
         self._logger.info(f"Model init for dir {model_setup_dir}")
@@ -48,8 +54,7 @@ class Backend:
 
         self.current_data_dir = dataset_dir
         self.selected_ChatGLM= False
-        self.whisper_model_loaded = False
-        self.whisper_model = None
+        self.asr_service = None
         self.enable_asr = False
 
     def init_model(self, model_id: str):
@@ -74,6 +79,7 @@ class Backend:
             status = self.chatrtx.init_clip_model(self.active_model)
             if status:
                 status = self.chatrtx.generate_clip_engine(data_dir)
+            self._update_dataset_watcher()
             return status
         if self.chatrtx_mode == Mode.AI:
             try:
@@ -103,8 +109,10 @@ class Backend:
                 self.chatrtx.set_rag_setting(chunk_size=512, chunk_overlap=200)
 
                 # Generate a query engine for the specified data directory
-                self.rag_engine = self.chatrtx.generate_query_engine(data_dir, streaming=True)
-                self.current_data_dir = data_dir
+                with self._rag_lock:
+                    self.rag_engine = self.chatrtx.generate_query_engine(data_dir, streaming=True)
+                    self.current_data_dir = data_dir
+                self._update_dataset_watcher()
                 return True
             except Exception as e:
                 logging.error(f"Error occurred: {str(e)}")
@@ -128,8 +136,10 @@ class Backend:
             try:
                 self._logger.debug(f"Generate the index with data path {self.current_data_dir}")
                 if self.chatrtx_mode == Mode.RAG:
-                    self.rag_engine = self.chatrtx.generate_query_engine(
-                        self.current_data_dir, streaming=True, force_rewrite=True)
+                    with self._rag_lock:
+                        self.rag_engine = self.chatrtx.generate_query_engine(
+                            self.current_data_dir, streaming=True, force_rewrite=True)
+                    self._update_dataset_watcher()
                     return True
                 else:
                     self._logger.error("Wrong mode selected. Mode should be Mode.RAG")
@@ -150,13 +160,45 @@ class Backend:
         if self.chatrtx_mode == Mode.AI:
             raise ValueError(f"ChatRTX Mode must be set to RAG")
         try:
-            self.rag_engine = self.chatrtx.generate_query_engine(data_dir, streaming=True)
-            self.current_data_dir = data_dir
+            with self._rag_lock:
+                self.rag_engine = self.chatrtx.generate_query_engine(data_dir, streaming=True)
+                self.current_data_dir = data_dir
+            self._update_dataset_watcher()
             return True
         except Exception as e:
             self._logger.error(f"Error in generating engine for path {data_dir}. \n Exception {e}")
             return False
 
+    def _update_dataset_watcher(self):
+        """
+        Watch the current data directory for changes when enabled in the config, so the index is
+        updated incrementally instead of staying frozen until it is regenerated.
+        """
+        watch = (self.config.get_config('dataset/watch_for_changes') and self.chatrtx_mode == Mode.RAG
+                 and self.active_model != self.CLIP_MODEL and isinstance(self.chatrtx, ChatRTXRag)
+                 and self.current_data_dir is not None and os.path.isdir(self.current_data_dir))
+        if self._dataset_watcher is not None:
+            if watch and self._dataset_watcher.folder_path == os.path.abspath(self.current_data_dir):
+                return
+            self._dataset_watcher.stop()
+            self._dataset_watcher = None
+        if watch:
+            self._dataset_watcher = DatasetWatcher(self.current_data_dir, self._on_dataset_changed,
+                                                   extensions=ChatRTXRag.DOCUMENT_EXTENSIONS)
+            self._dataset_watcher.start()
+
+    def _on_dataset_changed(self, changed_files):
+        # Called from the watcher thread
+        with self._rag_lock:
+            data_dir = self.current_data_dir
+            if (self.chatrtx_mode != Mode.RAG or not isinstance(self.chatrtx, ChatRTXRag) or self._dataset_watcher is None
+                    or self._dataset_watcher.folder_path != os.path.abspath(data_dir)):
+                return
+            try:
+                self.rag_engine = self.chatrtx.update_query_engine(data_dir, changed_files, streaming=True)
+            except Exception as e:
+                self._logger.error(f"Error in updating engine for path {data_dir}. \n Exception {e}")
+
     def query(self, query):
         if self.chatrtx_mode == Mode.AI:
             response = self.chatrtx.generate_response(query=query)
@@ -171,9 +213,10 @@ class Backend:
             if os.path.islink(matched_ouput) or self.is_junction(matched_ouput):
                 yield "Invalid image match directory. "
             
+            # The directory only holds links to the matched images, so cleaning and refilling it is cheap
             self.clean_directory(matched_ouput)
             answer  = self.chatrtx.generate_clip_response(input_text=query, top_matches_path=matched_ouput,
-                                            min_clip_score=min_clip_score)
+                                            min_clip_score=min_clip_score, result_mode="link")
 
             top_images = answer[:3]
 
@@ -191,51 +234,31 @@ class Backend:
                 if self.rag_engine is not None:
                     response = self.chatrtx.generate_stream_response(query=query, query_engine=self.rag_engine)
 
-                if len(response.source_nodes) > 0:
-                    for token in response.response_gen:
-                        yield str(token)
-
-                lowest_score_file = None
-                lowest_score = sys.float_info.max
-
-                if len(response.source_nodes) > 0:
-                    for node in response.source_nodes:
-                        if 'filename' in node.metadata:
-                            if node.score < lowest_score:
-                                lowest_score = node.score
-                                lowest_score_file = node.metadata['filename']
-
-                    file_links = []
-                    seen_files = set()
-
-                    if lowest_score_file:
-                        abs_path = Path(os.path.join(os.getcwd(), lowest_score_file.replace('\\', '/')))
-                        file_name = os.path.basename(abs_path)
-                        if file_name not in seen_files:  # Check if file_name is already seen
-                            if self.chatrtx_mode == Mode.RAG:
-                                file_link = abs_path
-                            else:
-                                exit("Wrong data_source type")
-                            file_links.append(file_link)
-                            seen_files.add(file_name)  # Add file_name to the set
-
-                    partial_response = ""
-                    if file_links:
-
-                        partial_response += "<br>Reference files:<br>" + getLocalLinksMarkdown(file_links)
-                    yield partial_response
-
-                elif len(response.source_nodes) == 0:
-                    yield "Problem generating response: Data source may be empty or unsupported – Ensure dataset compatibility with the AI model. Alternatively, try ‘Chat with AI model data’."
-
-                else:
-                    raise ValueError(f"Invalid Node values")
+                file_links = []
+                for event in response:
+                    if event["type"] == ChatRTXRag.STREAM_SOURCES:
+                        if len(event["sources"]) == 0:
+                            yield "Problem generating response: Data source may be empty or unsupported – Ensure dataset compatibility with the AI model. Alternatively, try ‘Chat with AI model data’."
+                            return
+                        # Sources are deduplicated and ordered by rank, so the first one is the best match
+                        top_ranked_file = event["sources"][0]["file"]
+                        file_links.append(Path(os.path.join(os.getcwd(), top_ranked_file.replace('\\', '/'))))
+                    elif event["type"] == ChatRTXRag.STREAM_TOKEN:
+                        yield str(event["text"])
+                    elif event["type"] == ChatRTXRag.STREAM_USAGE:
+                        self._logger.debug(f"RAG response usage {event['usage']} timings {event['timings']}")
+
+                partial_response = ""
+                if file_links:
+                    partial_response += "<br>Reference files:<br>" + getLocalLinksMarkdown(file_links)
+                yield partial_response
 
     def set_chatrtx_mode(self, chat_mode: Mode):
         self.chatrtx.unload_llm()
 
         if chat_mode == Mode.AI:
             status = self.ChatRTX(chat_mode)
+            self._update_dataset_watcher()
         else:
             # get the old value written in the config fileif app value is none
             if self.current_data_dir == None:
@@ -276,11 +299,11 @@ class Backend:
         status = self.model_manager.update_data_directory_path(self.current_data_dir)
         return status
 
-    def download_model(self, model_id):
+    def download_model(self, model_id, progress_callback=None):
         status = False
         if not self.model_manager.is_model_downloaded(model_id):
             # Download the model if it is not already downloaded
-            status = self.model_manager.download_model(model_id)
+            status = self.model_manager.download_model(model_id, progress_callback=progress_callback)
         else:
             status = True
         return status
@@ -289,6 +312,9 @@ class Backend:
         status = False
 
         self.chatrtx.unload_llm()
+        if self.asr_service is not None:
+            # free the video memory for the engine build
+            self.asr_service.unload()
         if not self.model_manager.is_model_installed(model_id):
             self._logger.info(f"Building TRT-LLM engine for model: {model_id}....")
             status = self.model_manager.install_model(model_id)
@@ -379,47 +405,34 @@ class Backend:
         vid_mem_info = nvmlDeviceGetMemoryInfo(nvmlDeviceGetHandleByIndex(0))
         free_vid_mem = vid_mem_info.free / (1024*1024)
         print("free video memory in MB = ", free_vid_mem)
-        if self.whisper_model is not None:
-            self.whisper_model.unload_model()
-            del self.whisper_model
-            self.whisper_model = None
-        self.whisper_model = WhisperTRTLLM(asr_engine_path, assets_dir=asr_assets_path)
-        self.whisper_model_loaded = True
+        if self.asr_service is None:
+            idle_timeout = self.config.get_config('asr/idle_timeout_seconds')
+            self.asr_service = WhisperASRService(asr_engine_path, asr_assets_path,
+                                                 idle_timeout_seconds=300 if idle_timeout is None else idle_timeout)
+        # loads in the background, get_text_from_audio waits for it
+        self.asr_service.load()
         self._logger.info(f"init asr backend done")
         return True
     
-    def get_text_from_audio(self, audio_path):
-        # Return transcribed text via this function
-        asr_assets_path = os.path.join(self.model_setup_dir, 'models','whisper', 'whisper_assets')
+    def get_text_from_audio(self, audio_path, sample_rate=None):
+        # Return transcribed text via this function. audio_path can also be the bytes of a .wav file
+        # or a waveform with its sample_rate, the audio is decoded and resampled in memory
         transcription = ""
-        global whisper_model
-        if not self.enable_asr:
-            return ""
-        
-        # Check and wait until model is loaded before running it.
-        checks_for_model_loading = 40
-        checks_left_for_model_loading = checks_for_model_loading
-        sleep_time = 0.2
-        while checks_left_for_model_loading>0 and not self.whisper_model_loaded:
-            time.sleep(sleep_time)
-            checks_left_for_model_loading -= 1
-        assert checks_left_for_model_loading>0, f"Whisper model loading not finished even after {(checks_for_model_loading*sleep_time)} seconds"
-        if checks_left_for_model_loading == 0:
+        if not self.enable_asr or self.asr_service is None:
             return ""
 
-        new_file_path = process_input_audio(audio_path)
+        audio = load_audio(audio_path, sample_rate)
         language = "english"
         self._logger.info(f"model selected {self.active_model}")
         if self.active_model == "chatglm3_6b_AWQ_int4":
             self._logger.info(f"chinese model selected")
             language = "chinese"
-        transcription = decode_audio_file( new_file_path, self.whisper_model, language=language, mel_filters_dir=asr_assets_path)
-
-        if self.whisper_model is not None:        
-            self.whisper_model.unload_model()
-            del self.whisper_model
-            self.whisper_model = None
-        self.whisper_model_loaded = False
+        try:
+            # the model stays loaded for the next utterance until the service's idle timeout
+            transcription = self.asr_service.transcribe(audio, language=language)
+        except Exception as e:
+            self._logger.error(f"Error in transcribing the audio. Exception {e}")
+            return ""
         self._logger.info(f"asr backend transcription done")
         return transcription
 
@@ -56,6 +56,7 @@ export const MODEL_DOWNLOAD_ERROR = 'MODEL_DOWNLOAD_ERROR'
 export const MODEL_INSTALL_ERROR = 'MODEL_INSTALL_ERROR'
 export const MODEL_DELETE_ERROR = 'MODEL_DELETE_ERROR'
 export const MODEL_DOWNLOADED = 'MODEL_DOWNLOADED'
+export const MODEL_DOWNLOAD_PROGRESS = 'MODEL_DOWNLOAD_PROGRESS'
 export const MODEL_INSTALLED = 'MODEL_INSTALLED'
 export const MODEL_DELETED = 'MODEL_DELETED'
 
@@ -28,6 +28,7 @@ import {
     MODEL_DELETE_ERROR,
     MODEL_DOWNLOADED,
     MODEL_DOWNLOAD_ERROR,
+    MODEL_DOWNLOAD_PROGRESS,
     MODEL_INSTALLED,
     MODEL_INSTALL_ERROR,
     ON_PYTHON_ENGINE_INIT,
@@ -35,7 +36,7 @@ import {
     SUPPORTED_MODEL_UPDATE,
 } from './constants'
 import Equals from './equals'
-import { ModelDetails, ModelId, ModelInfo } from './types'
+import { ModelDetails, ModelDownloadProgress, ModelId, ModelInfo } from './types'
 
 const Events = [
     SUPPORTED_MODEL_UPDATE,
@@ -45,6 +46,7 @@ const Events = [
     MODEL_INSTALL_ERROR,
     MODEL_DELETE_ERROR,
     MODEL_DOWNLOADED,
+    MODEL_DOWNLOAD_PROGRESS,
     MODEL_INSTALLED,
     MODEL_DELETED,
     ON_PYTHON_ENGINE_INIT,
@@ -176,6 +178,9 @@ export default class ModelManager {
                 this.getModelInfo()
                 this.emit(eventName, data as ModelId)
                 break
+            case MODEL_DOWNLOAD_PROGRESS:
+                this.emit(eventName, data as ModelDownloadProgress)
+                break
             case ACTIVE_MODEL_UPDATE_ERROR:
             case MODEL_DOWNLOAD_ERROR:
             case MODEL_INSTALL_ERROR:
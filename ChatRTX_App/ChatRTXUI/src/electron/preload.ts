@@ -28,6 +28,7 @@ import {
     FineTuningProfileConfig,
     HistoryItem,
     ModelDetails,
+    ModelDownloadProgress,
     ModelFineTuningDetails,
     ModelId,
 } from './types'
@@ -38,6 +39,7 @@ import {
     MODEL_DOWNLOAD_ERROR,
     MODEL_INSTALL_ERROR,
     MODEL_DOWNLOADED,
+    MODEL_DOWNLOAD_PROGRESS,
     MODEL_INSTALLED,
     DATASET_INFO_UPDATED,
     ACTIVE_MODEL_UPDATE_ERROR,
@@ -112,6 +114,9 @@ export const ClientAPI = {
     ): (() => void) => makeListener(MODEL_DOWNLOAD_ERROR, callback),
     onModelDownloaded: (callback: (modelId: ModelId) => void): (() => void) =>
         makeListener(MODEL_DOWNLOADED, callback),
+    onModelDownloadProgress: (
+        callback: (progress: ModelDownloadProgress) => void
+    ): (() => void) => makeListener(MODEL_DOWNLOAD_PROGRESS, callback),
     onModelInstallError: (callback: (modelId: ModelId) => void): (() => void) =>
         makeListener(MODEL_INSTALL_ERROR, callback),
     onModelInstalled: (callback: (modelId: ModelId) => void): (() => void) =>
@@ -52,6 +52,18 @@ export interface ModelDetails {
     isEnglishSupported?: boolean
 }
 
+export interface ModelDownloadProgress {
+    model_id: ModelId
+    downloaded_bytes: number
+    total_bytes: number
+    speed_bytes_per_second: number
+    average_speed_bytes_per_second: number
+    eta_seconds: number | null
+    elapsed_seconds: number
+    files_completed: number
+    files_total: number
+}
+
 export interface FineTuningAdvancedParams {
     systemPrompt: string
     loraRank: number